@@ -0,0 +1,78 @@
+"""
+Load benchmark of the book API on a seeded synthetic catalog.
+
+    python -m benchmarks run --books 5000 --users 500 --relations 50000 --output head.json
+    python -m benchmarks run --database postgres ...
+    python -m benchmarks compare base.json head.json
+"""
+import argparse
+import json
+import sys
+
+
+def run(args):
+    from benchmarks.runner import benchmark_database, environment, run_benchmark, setup_django
+
+    setup_django(args.database)
+    from benchmarks.data import generate_catalog
+    from benchmarks.scenarios import SCENARIOS
+
+    scenarios = [scenario for scenario in SCENARIOS if not args.scenario or scenario.name in args.scenario]
+    with benchmark_database():
+        generate_catalog(args.books, args.users, args.relations, seed=args.seed, skew=args.skew)
+        report = {
+            'environment': environment(),
+            'parameters': {name: getattr(args, name) for name in
+                           ('books', 'users', 'relations', 'skew', 'requests', 'seed')},
+            'scenarios': run_benchmark(scenarios, args.requests, seed=args.seed),
+        }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(output + '\n')
+    print(output)
+
+
+def compare(args):
+    from benchmarks.runner import compare as compare_reports
+
+    with open(args.base) as base_file, open(args.head) as head_file:
+        base, head = json.load(base_file), json.load(head_file)
+    if base['parameters'] != head['parameters']:
+        print('warning: the reports were produced with different parameters', file=sys.stderr)
+    rows, regressed = compare_reports(base, head, threshold=args.threshold)
+    print(f'{"scenario":<16}{"metric":<22}{"base":>12}{"head":>12}{"change %":>10}')
+    for name, metric, old, new, change in rows:
+        print(f'{name:<16}{metric:<22}{old:>12}{new:>12}{change:>+10.1f}')
+    return 1 if regressed else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='Seed a test database and run the scenarios.')
+    run_parser.add_argument('--books', type=int, default=2000)
+    run_parser.add_argument('--users', type=int, default=300)
+    run_parser.add_argument('--relations', type=int, default=20000)
+    run_parser.add_argument('--skew', type=float, default=1.1)
+    run_parser.add_argument('--requests', type=int, default=200, help='Requests per scenario.')
+    run_parser.add_argument('--seed', type=int, default=0)
+    run_parser.add_argument('--scenario', action='append', help='Run only this scenario, can be repeated.')
+    run_parser.add_argument('--database', choices=('sqlite', 'postgres'), default='sqlite')
+    run_parser.add_argument('--output', help='Also write the JSON report to this file.')
+    run_parser.set_defaults(handler=run)
+
+    compare_parser = commands.add_parser('compare', help='Compare two JSON reports, exit 1 on a regression.')
+    compare_parser.add_argument('base')
+    compare_parser.add_argument('head')
+    compare_parser.add_argument('--threshold', type=float, default=10.0,
+                                help='Allowed p95 latency / peak memory growth in percent.')
+    compare_parser.set_defaults(handler=compare)
+
+    args = parser.parse_args()
+    sys.exit(args.handler(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""
+Concurrent throughput of the sync (WSGI) book API against its async (ASGI) read path.
+
+Both paths run in-process against a seeded test database (see `benchmarks.data`): the sync views
+through the WSGI test client in a thread pool, the async views through the ASGI test client on one
+event loop.
+
+    python -m benchmarks.asgi_vs_wsgi --books 1000 --requests 500 --concurrency 16
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+def request_paths(prefix, book_ids, count, rng):
+    paths = []
+    for _ in range(count):
+        kind = rng.choice(('list', 'search', 'ordering', 'detail'))
+        if kind == 'list':
+            paths.append(f'{prefix}book/')
+        elif kind == 'search':
+            paths.append(f'{prefix}book/?search=Author {rng.randrange(50)}')
+        elif kind == 'ordering':
+            paths.append(f'{prefix}book/?ordering=-price')
+        else:
+            paths.append(f'{prefix}book/{rng.choice(book_ids)}/')
+    return paths
+
+
+def run_wsgi(paths, concurrency):
+    from django.db import connections
+    from django.test import Client
+
+    def get(path):
+        response = Client().get(path)
+        connections.close_all()
+        return response.status_code
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        statuses = list(executor.map(get, paths))
+    return time.perf_counter() - started, statuses
+
+
+def run_asgi(paths, concurrency):
+    from django.test import AsyncClient
+
+    async def main():
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def get(path):
+            async with semaphore:
+                response = await AsyncClient().get(path)
+                return response.status_code
+
+        return await asyncio.gather(*(get(path) for path in paths))
+
+    started = time.perf_counter()
+    statuses = asyncio.run(main())
+    return time.perf_counter() - started, statuses
+
+
+def result(name, elapsed, statuses):
+    return {
+        'path': name,
+        'requests': len(statuses),
+        'errors': sum(status != 200 for status in statuses),
+        'seconds': round(elapsed, 3),
+        'requests_per_second': round(len(statuses) / elapsed, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--books', type=int, default=1000)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--relations', type=int, default=5000)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--database', choices=('sqlite', 'postgres'), default='sqlite')
+    args = parser.parse_args()
+
+    from benchmarks.runner import benchmark_database, setup_django
+    setup_django(args.database)
+    from benchmarks.data import generate_catalog
+
+    with benchmark_database():
+        books, users = generate_catalog(args.books, args.users, args.relations, seed=args.seed)
+        book_ids = [book.pk for book in books]
+        wsgi = run_wsgi(request_paths('/', book_ids, args.requests, random.Random(args.seed)), args.concurrency)
+        asgi = run_asgi(request_paths('/async/', book_ids, args.requests, random.Random(args.seed)),
+                        args.concurrency)
+
+    report = {
+        'concurrency': args.concurrency,
+        'results': [result('wsgi', *wsgi), result('asgi', *asgi)],
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""Seeded synthetic catalog: books, users and relations with a Zipf-like popularity skew."""
+import itertools
+import random
+
+WORDS = ('war', 'peace', 'night', 'garden', 'river', 'shadow', 'winter', 'city', 'stone', 'letters',
+         'island', 'glass', 'storm', 'silence', 'crown', 'empire', 'road', 'fire', 'mirror', 'ocean')
+RATE_WEIGHTS = (None, 1, 2, 3, 4, 5), (20, 4, 8, 16, 28, 24)
+
+
+def zipf_cum_weights(size, skew):
+    """Cumulative weights of ranks 1..size for `random.choices`, rank r is drawn with p ~ 1 / r^skew."""
+    return list(itertools.accumulate(1 / rank ** skew for rank in range(1, size + 1)))
+
+
+def generate_catalog(books, users, relations, seed=0, skew=1.1, batch_size=1000):
+    """
+    Create `users` users, `books` books and up to `relations` unique (user, book) relations.
+    A few books collect most readers and a few users rate most books; the same seed always
+    produces the same catalog. Returns the created books and users.
+    """
+    from django.contrib.auth.models import User
+    from store.logic import rebuild_counters
+    from store.models import Book, UserBookRelation
+
+    rng = random.Random(seed)
+    user_objs = User.objects.bulk_create(
+        (User(username=f'bench_user_{i}', first_name=f'First{i}', last_name=f'Last{i}') for i in range(users)),
+        batch_size=batch_size)
+    authors = [f'{rng.choice(WORDS).title()} Author {i}' for i in range(max(books // 20, 1))]
+    author_weights = zipf_cum_weights(len(authors), skew)
+    book_objs = Book.objects.bulk_create(
+        (Book(name=f'{rng.choice(WORDS).title()} of {rng.choice(WORDS)} {i}',
+              price=min(int(rng.lognormvariate(6, 0.6)), 100000),
+              author_name=rng.choices(authors, cum_weights=author_weights)[0],
+              owner=rng.choice(user_objs) if user_objs and rng.random() < 0.9 else None)
+         for i in range(books)),
+        batch_size=batch_size)
+
+    relations = min(relations, books * users)
+    # Popularity ranks are shuffled so that the hot books are not simply the lowest pks
+    book_ranks = rng.sample(range(books), books)
+    user_ranks = rng.sample(range(users), users)
+    book_weights, user_weights = zipf_cum_weights(books, skew), zipf_cum_weights(users, skew)
+    pairs, draws = {}, 0
+    while len(pairs) < relations and draws < relations * 20:
+        draws += batch_size
+        for pair in zip(rng.choices(user_ranks, cum_weights=user_weights, k=batch_size),
+                        rng.choices(book_ranks, cum_weights=book_weights, k=batch_size)):
+            pairs.setdefault(pair)
+            if len(pairs) == relations:
+                break
+    # Fill up uniformly when the skewed draws keep hitting the same hot pairs
+    while len(pairs) < relations:
+        pairs.setdefault((rng.randrange(users), rng.randrange(books)))
+    UserBookRelation.objects.bulk_create(
+        (UserBookRelation(user=user_objs[user], book=book_objs[book], like=rng.random() < 0.3,
+                          in_bookmarks=rng.random() < 0.1, rate=rng.choices(*RATE_WEIGHTS)[0])
+         for user, book in pairs),
+        batch_size=batch_size)
+    rebuild_counters()
+    return book_objs, user_objs
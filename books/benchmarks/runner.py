@@ -0,0 +1,154 @@
+"""Run scenarios through the test client and report latency, queries and memory per request."""
+import contextlib
+import json
+import math
+import os
+import platform
+import subprocess
+import time
+import tracemalloc
+
+
+class QueryCounter:
+    """`connection.execute_wrapper` hook counting the executed queries."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def setup_django(database='sqlite'):
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'benchmarks.settings'
+    os.environ['BENCH_DATABASE'] = database
+    import django
+    django.setup()
+
+
+@contextlib.contextmanager
+def benchmark_database():
+    """A freshly created (and afterwards destroyed) test database."""
+    from django.test.utils import setup_databases, setup_test_environment, teardown_databases, \
+        teardown_test_environment
+
+    setup_test_environment()
+    old_config = setup_databases(verbosity=0, interactive=False)
+    try:
+        yield
+    finally:
+        teardown_databases(old_config, verbosity=0)
+        teardown_test_environment()
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a non-empty list."""
+    values = sorted(values)
+    return values[max(math.ceil(fraction * len(values)) - 1, 0)]
+
+
+def send(client, method, path, data):
+    if method == 'get':
+        return client.get(path, data)
+    return getattr(client, method)(path, json.dumps(data), content_type='application/json')
+
+
+def run_scenario(scenario, catalog, count, seed=0, user=None, warmup=5, memory_requests=20):
+    """
+    Latencies are measured without tracing, the peak memory of a request is measured on a
+    separate pass over the first `memory_requests` requests with tracemalloc running.
+    """
+    from django.db import connection
+    from django.test import Client
+    from store.cache import fragment_stats
+
+    client = Client()
+    if scenario.login:
+        client.force_login(user)
+    requests = scenario.requests(catalog, count, seed)
+    for request in requests[:warmup]:
+        send(client, *request)
+
+    latencies, errors, counter = [], 0, QueryCounter()
+    fragments_before = fragment_stats()
+    with connection.execute_wrapper(counter):
+        for request in requests:
+            started = time.perf_counter()
+            response = send(client, *request)
+            latencies.append(time.perf_counter() - started)
+            errors += response.status_code >= 400
+    fragments = {key: value - fragments_before[key] for key, value in fragment_stats().items()}
+    lookups = fragments['hits'] + fragments['misses']
+
+    peak = 0
+    tracemalloc.start()
+    try:
+        for request in requests[:memory_requests]:
+            tracemalloc.reset_peak()
+            send(client, *request)
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'requests': len(requests),
+        'errors': errors,
+        'p50_ms': round(percentile(latencies, 0.5) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3),
+        'queries_per_request': round(counter.count / len(requests), 2),
+        'peak_memory_kb': round(peak / 1024, 1),
+        # Share of the listed books served from the per-book fragment cache, None without lists
+        'fragment_hit_ratio': round(fragments['hits'] / lookups, 3) if lookups else None,
+    }
+
+
+def run_benchmark(scenarios, count, seed=0):
+    from django.contrib.auth.models import User
+    from benchmarks.scenarios import Catalog
+
+    catalog = Catalog()
+    user = User.objects.order_by('pk').first()
+    return {scenario.name: run_scenario(scenario, catalog, count, seed, user) for scenario in scenarios}
+
+
+def environment():
+    from django import get_version
+    from django.db import connection
+
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'django': get_version(),
+        'database': connection.vendor,
+    }
+
+
+def compare(base, head, threshold=10.0):
+    """
+    Rows of `(scenario, metric, base, head, change %)` and whether `head` regressed: more queries
+    per request, or a p95 latency / peak memory more than `threshold` percent above `base`.
+    The fragment hit ratio is listed when both reports have one, it never fails the comparison.
+    """
+    rows, regressed = [], False
+    for name, head_result in head['scenarios'].items():
+        base_result = base['scenarios'].get(name)
+        if base_result is None:
+            continue
+        for metric in ('p50_ms', 'p95_ms', 'queries_per_request', 'peak_memory_kb', 'fragment_hit_ratio'):
+            old, new = base_result.get(metric), head_result.get(metric)
+            if old is None or new is None:
+                continue
+            change = (new - old) / old * 100 if old else 0.0
+            rows.append((name, metric, old, new, round(change, 1)))
+            if metric == 'queries_per_request' and new > old:
+                regressed = True
+            elif metric in ('p95_ms', 'peak_memory_kb') and change > threshold:
+                regressed = True
+    return rows, regressed
@@ -0,0 +1,61 @@
+"""Request scenarios of the book API, each one a seeded stream of test client requests."""
+import random
+
+from benchmarks.data import WORDS
+
+
+class Scenario:
+    """`make_request(rng, catalog)` returns the `(method, path, data)` of one request."""
+
+    def __init__(self, name, make_request, login=False):
+        self.name = name
+        self.make_request = make_request
+        self.login = login
+
+    def requests(self, catalog, count, seed):
+        rng = random.Random(f'{self.name}:{seed}')
+        return [self.make_request(rng, catalog) for _ in range(count)]
+
+
+class Catalog:
+    """The pks the scenarios draw from, read back from the database."""
+
+    def __init__(self):
+        from store.models import Book
+        self.book_ids = list(Book.objects.order_by('pk').values_list('pk', flat=True))
+        self.prices = sorted(set(Book.objects.values_list('price', flat=True)))
+
+
+def list_books(rng, catalog):
+    return 'get', '/book/', {}
+
+
+def filter_price(rng, catalog):
+    return 'get', '/book/', {'price': rng.choice(catalog.prices)}
+
+
+def search(rng, catalog):
+    return 'get', '/book/', {'search': rng.choice(WORDS)}
+
+
+def ordering(rng, catalog):
+    return 'get', '/book/', {'ordering': rng.choice(('price', '-price', 'author_name', '-author_name'))}
+
+
+def detail(rng, catalog):
+    return 'get', f'/book/{rng.choice(catalog.book_ids)}/', {}
+
+
+def relation_patch(rng, catalog):
+    data = {'like': rng.random() < 0.5, 'rate': rng.randint(1, 5)}
+    return 'patch', f'/book_relation/{rng.choice(catalog.book_ids)}/', data
+
+
+SCENARIOS = [
+    Scenario('list', list_books),
+    Scenario('filter_price', filter_price),
+    Scenario('search', search),
+    Scenario('ordering', ordering),
+    Scenario('detail', detail),
+    Scenario('relation_patch', relation_patch, login=True),
+]
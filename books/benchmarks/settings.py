@@ -0,0 +1,22 @@
+"""
+Benchmark profile: the test profile with cached responses expiring immediately, so every request
+reaches the database; the per-book list fragments stay cached and their hit ratio is reported.
+BENCH_DATABASE=postgres runs against the PostgreSQL configured by the DB_* variables.
+"""
+from books.settings.test import *  # noqa: F401,F403
+
+BOOKS_CACHE_TIMEOUT = 0
+
+if env('BENCH_DATABASE', 'sqlite') == 'postgres':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql_psycopg2',
+            'NAME': env('DB_NAME', 'dbname'),
+            'USER': env('DB_USER', 'db_user'),
+            'PASSWORD': env('DB_PASS', 'pass'),
+            'HOST': env('DB_HOST', 'localhost'),
+            'PORT': env('DB_PORT', '5432'),
+        }
+    }
+
+BOOKS_QUERY_BUDGET_STRICT = False
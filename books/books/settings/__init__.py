@@ -0,0 +1,18 @@
+"""
+Settings profile selected by the BOOKS_ENV environment variable: `dev` (default), `test` or `prod`.
+A profile can also be selected directly with DJANGO_SETTINGS_MODULE=books.settings.<profile>.
+"""
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+BOOKS_ENV = os.environ.get('BOOKS_ENV', 'dev')
+
+if BOOKS_ENV == 'dev':
+    from books.settings.dev import *  # noqa: F401,F403
+elif BOOKS_ENV == 'test':
+    from books.settings.test import *  # noqa: F401,F403
+elif BOOKS_ENV == 'prod':
+    from books.settings.prod import *  # noqa: F401,F403
+else:
+    raise ImproperlyConfigured(f'Unknown BOOKS_ENV {BOOKS_ENV!r}, expected one of: dev, test, prod.')
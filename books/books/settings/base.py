@@ -1,5 +1,5 @@
 """
-Django settings for books project.
+Django settings shared by the dev, test and prod profiles of the books project.
 
 Generated by 'django-admin startproject' using Django 4.1.7.
 
@@ -10,19 +10,30 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
-BASE_DIR = Path(__file__).resolve().parent.parent
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+
+
+def env(name, default=None, required=False):
+    value = os.environ.get(name, default)
+    if required and not value:
+        raise ImproperlyConfigured(f'The {name} environment variable is required.')
+    return value
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/4.1/howto/deployment/checklist/
 
 # SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = 'django-insecure-ek1yifcw_a1$^e9(kl5ja5fh+c5g$k^k&nsa9k(ihn@e7_(*1+'
+SECRET_KEY = env('DJANGO_SECRET_KEY', 'django-insecure-ek1yifcw_a1$^e9(kl5ja5fh+c5g$k^k&nsa9k(ihn@e7_(*1+')
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = False
 
 ALLOWED_HOSTS = ['localhost', '127.0.0.1', '0.0.0.0']
 
@@ -37,12 +48,13 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
 
     'social_django',
-    'debug_toolbar',  # Django Debug Toolbar
 
     'store',
 ]
 
 MIDDLEWARE = [
+    'store.metrics.request_metrics_middleware',
+    'store.replicas.replica_routing_middleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -50,9 +62,6 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'debug_toolbar.middleware.DebugToolbarMiddleware',  # Django Debug Toolbar
-    'debug_toolbar_force.middleware.ForceDebugToolbarMiddleware',  # django-debug-toolbar-force
-
 ]
 
 ROOT_URLCONF = 'books.urls'
@@ -60,7 +69,7 @@ ROOT_URLCONF = 'books.urls'
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
-        'DIRS': ['templates'],
+        'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
@@ -81,14 +90,71 @@ WSGI_APPLICATION = 'books.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql_psycopg2',
-        'NAME': 'dbname',
-        'USER': 'db_user',
-        'PASSWORD': 'pass',
-        'HOST': 'database',
-        'PORT': '5432',
+        'NAME': env('DB_NAME', 'dbname'),
+        'USER': env('DB_USER', 'db_user'),
+        'PASSWORD': env('DB_PASS', 'pass'),
+        'HOST': env('DB_HOST', 'database'),
+        'PORT': env('DB_PORT', '5432'),
+    }
+}
+
+# Read replicas: {alias: weight} of DATABASES entries serving the safe-method requests of the
+# book API; a client that wrote is pinned to the primary for BOOKS_REPLICA_STICKY_SECONDS
+
+DATABASE_ROUTERS = ['store.replicas.ReplicaRouter']
+BOOKS_DB_REPLICAS = {}
+BOOKS_REPLICA_STICKY_SECONDS = 10
+
+# Cache
+# https://docs.djangoproject.com/en/4.1/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'books',
     }
 }
 
+BOOKS_CACHE_TIMEOUT = 300
+# Per-book list fragments, keyed on the book version so they need no invalidation
+BOOKS_FRAGMENT_TIMEOUT = 3600
+
+# Leaderboards
+# A book enters the rating board with BOOKS_TOP_MIN_VOTES rates and is ranked by its Bayesian
+# average, the rates plus BOOKS_TOP_MIN_VOTES votes of BOOKS_TOP_PRIOR_RATING; run
+# `manage.py rebuild_leaderboards` after changing either
+
+BOOKS_TOP_MIN_VOTES = 5
+BOOKS_TOP_PRIOR_RATING = 3.0
+
+# Admin
+# Unfiltered changelists of tables with more rows than this show PostgreSQL's row estimate
+# instead of running COUNT(*)
+
+BOOKS_ADMIN_ESTIMATED_COUNT_ABOVE = 100000
+
+# Request metrics
+# Queries allowed per request by URL name, session and user lookups included; requests over
+# budget are logged to `store.requests`, or fail when BOOKS_QUERY_BUDGET_STRICT is set
+
+BOOKS_QUERY_BUDGETS = {
+    'book-list': 5,
+    'book-detail': 6,
+    'book-readers': 4,
+    'book-export': 4,
+    'book-top': 4,
+    'userbookrelation-detail': 11,
+    'userbookrelation-bulk': 11,
+    'me-likes': 4,
+    'me-bookmarks': 4,
+    'async-book-list': 5,
+    'async-book-detail': 4,
+    'async-book-readers': 2,
+    'async-book-relation-detail': 3,
+}
+BOOKS_QUERY_BUDGET_DEFAULT = None
+BOOKS_QUERY_BUDGET_STRICT = False
+
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
 
@@ -133,7 +199,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_RENDERER_CLASSES': (
-        'rest_framework.renderers.JSONRenderer',
+        'store.metrics.TimedJSONRenderer',
     ),
     'DEFAULT_PARSER_CLASSES': (
         'rest_framework.parsers.JSONParser',
@@ -148,11 +214,5 @@ AUTHENTICATION_BACKENDS = (
     'social_core.backends.github.GithubOAuth2',
     'django.contrib.auth.backends.ModelBackend',
 )
-SOCIAL_AUTH_GITHUB_KEY = 'Iv1.d809e674ea0b6ef2'
-SOCIAL_AUTH_GITHUB_SECRET = '1ba00403bea1336d81b27c87fc59229e7ff1c078'
-
-# Django Debug Toolbar
-# https://django-debug-toolbar.readthedocs.io/en/latest/index.html
-INTERNAL_IPS = [
-    "127.0.0.1",
-]
+SOCIAL_AUTH_GITHUB_KEY = env('SOCIAL_AUTH_GITHUB_KEY', 'Iv1.d809e674ea0b6ef2')
+SOCIAL_AUTH_GITHUB_SECRET = env('SOCIAL_AUTH_GITHUB_SECRET', '1ba00403bea1336d81b27c87fc59229e7ff1c078')
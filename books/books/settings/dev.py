@@ -0,0 +1,21 @@
+"""Local development against the docker compose PostgreSQL, with the debug toolbar."""
+from books.settings.base import *  # noqa: F401,F403
+
+BOOKS_ENV = 'dev'
+
+DEBUG = True
+
+INSTALLED_APPS = INSTALLED_APPS + [
+    'debug_toolbar',  # Django Debug Toolbar
+]
+
+MIDDLEWARE = MIDDLEWARE + [
+    'debug_toolbar.middleware.DebugToolbarMiddleware',  # Django Debug Toolbar
+    'debug_toolbar_force.middleware.ForceDebugToolbarMiddleware',  # django-debug-toolbar-force
+]
+
+# Django Debug Toolbar
+# https://django-debug-toolbar.readthedocs.io/en/latest/index.html
+INTERNAL_IPS = [
+    "127.0.0.1",
+]
@@ -0,0 +1,90 @@
+"""
+Production profile: no debug tooling, persistent health-checked database connections, cached
+templates and a shared cache, with credentials and hosts taken from the environment.
+"""
+from books.settings.base import *  # noqa: F401,F403
+
+BOOKS_ENV = 'prod'
+
+DEBUG = False
+
+SECRET_KEY = env('DJANGO_SECRET_KEY', required=True)
+
+ALLOWED_HOSTS = env('DJANGO_ALLOWED_HOSTS', required=True).split(',')
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.postgresql_psycopg2',
+        'NAME': env('DB_NAME', required=True),
+        'USER': env('DB_USER', required=True),
+        'PASSWORD': env('DB_PASS', required=True),
+        'HOST': env('DB_HOST', required=True),
+        'PORT': env('DB_PORT', '5432'),
+        'CONN_MAX_AGE': int(env('DB_CONN_MAX_AGE', '600')),
+        'CONN_HEALTH_CHECKS': True,
+    }
+}
+
+# DB_POOL_MAX_SIZE switches to pooled connections, returned to the pool at the end of every request
+if env('DB_POOL_MAX_SIZE', ''):
+    DATABASES['default'].update({
+        'ENGINE': 'store.backends.postgresql_pool',
+        'CONN_MAX_AGE': 0,
+        'OPTIONS': {'pool': {
+            'min_size': int(env('DB_POOL_MIN_SIZE', '0')),
+            'max_size': int(env('DB_POOL_MAX_SIZE')),
+            'max_lifetime': int(env('DB_POOL_MAX_LIFETIME', '1800')),
+            'timeout': float(env('DB_POOL_TIMEOUT', '10')),
+        }},
+    })
+
+# DB_REPLICA_HOSTS=host1,host2 with optional DB_REPLICA_WEIGHTS=3,1, same credentials as the primary
+_replica_hosts = [host for host in env('DB_REPLICA_HOSTS', '').split(',') if host]
+_replica_weights = [int(weight) for weight in env('DB_REPLICA_WEIGHTS', '').split(',') if weight]
+BOOKS_DB_REPLICAS = {}
+for _index, _host in enumerate(_replica_hosts):
+    DATABASES[f'replica_{_index}'] = {**DATABASES['default'], 'HOST': _host}
+    BOOKS_DB_REPLICAS[f'replica_{_index}'] = _replica_weights[_index] if _index < len(_replica_weights) else 1
+
+TEMPLATES = [{
+    **TEMPLATES[0],
+    'APP_DIRS': False,
+    'OPTIONS': {
+        **TEMPLATES[0]['OPTIONS'],
+        'loaders': [
+            ('django.template.loaders.cached.Loader', [
+                'django.template.loaders.filesystem.Loader',
+                'django.template.loaders.app_directories.Loader',
+            ]),
+        ],
+    },
+}]
+
+# The books cache generation must be shared by all workers, a per-process cache would
+# keep serving stale responses after a write handled by another worker
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': env('REDIS_URL', required=True),
+    }
+}
+
+SOCIAL_AUTH_GITHUB_KEY = env('SOCIAL_AUTH_GITHUB_KEY', required=True)
+SOCIAL_AUTH_GITHUB_SECRET = env('SOCIAL_AUTH_GITHUB_SECRET', required=True)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'store.requests': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
@@ -0,0 +1,23 @@
+"""Test suite profile: SQLite, so `python manage.py test .` runs without Docker."""
+from books.settings.base import *  # noqa: F401,F403
+
+BOOKS_ENV = 'test'
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'test.sqlite3',
+    },
+    # A second database for the replica routing tests, not used unless BOOKS_DB_REPLICAS names it
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'test_replica.sqlite3',
+    },
+}
+
+PASSWORD_HASHERS = [
+    'django.contrib.auth.hashers.MD5PasswordHasher',
+]
+
+# A request over its query budget fails the test instead of only logging a warning
+BOOKS_QUERY_BUDGET_STRICT = True
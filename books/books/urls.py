@@ -13,11 +13,13 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include, re_path
 from rest_framework.routers import SimpleRouter
 
-from store.views import BookViewSet, UserBookRelationView, auth
+from store import async_views
+from store.views import BookViewSet, UserBookListView, UserBookRelationView, auth
 
 router = SimpleRouter()
 router.register(r'book', BookViewSet)
@@ -26,8 +28,17 @@ router.register(r'book_relation', UserBookRelationView)
 urlpatterns = [
     path('admin/', admin.site.urls),
     re_path('', include('social_django.urls', namespace='social')),
-    path('__debug__/', include('debug_toolbar.urls')),
     path('auth/', auth),
+    path('me/likes/', UserBookListView.as_view({'get': 'list'}, relation_flag='like'), name='me-likes'),
+    path('me/bookmarks/', UserBookListView.as_view({'get': 'list'}, relation_flag='in_bookmarks'),
+         name='me-bookmarks'),
+    path('async/book/', async_views.book_list, name='async-book-list'),
+    path('async/book/<str:pk>/', async_views.book_detail, name='async-book-detail'),
+    path('async/book/<str:pk>/readers/', async_views.book_readers, name='async-book-readers'),
+    path('async/book_relation/<str:book>/', async_views.book_relation_detail, name='async-book-relation-detail'),
 ]
 
 urlpatterns += router.urls
+
+if 'debug_toolbar' in settings.INSTALLED_APPS:
+    urlpatterns += [path('__debug__/', include('debug_toolbar.urls'))]
@@ -7,6 +7,8 @@ import sys
 def main():
     """Run administrative tasks."""
     os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'books.settings')
+    if sys.argv[1:2] == ['test']:
+        os.environ.setdefault('BOOKS_ENV', 'test')
     try:
         from django.core.management import execute_from_command_line
     except ImportError as exc:
@@ -1,12 +1,70 @@
+from django.conf import settings
 from django.contrib import admin
-from store.models import Book, UserBookRelation
+from django.core.paginator import Paginator
+from django.utils.functional import cached_property
+
+from store.cache import invalidate_books
+from store.logic import estimated_count, rebuild_counters
+from store.models import COUNTER_FIELDS, Book, UserBookRelation
+
+
+class EstimatedCountPaginator(Paginator):
+    """Takes PostgreSQL's row estimate for the count of a large unfiltered changelist instead of COUNT(*)."""
+
+    @cached_property
+    def count(self):
+        estimate = estimated_count(self.object_list)
+        if estimate is not None and estimate > settings.BOOKS_ADMIN_ESTIMATED_COUNT_ABOVE:
+            return estimate
+        return super().count
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    # The "N total" link runs a second COUNT(*) of the whole table
+    show_full_result_count = False
 
 
 @admin.register(Book)
-class AdminBooks(admin.ModelAdmin):
-    pass
+class AdminBooks(LargeTableAdmin):
+    list_display = ('id', 'name', 'author_name', 'price', 'owner', 'rating', 'likes_count', 'readers_count',
+                    'updated_at')
+    list_select_related = ('owner',)
+    list_filter = ('updated_at',)
+    search_fields = ('=id', '^name')
+    raw_id_fields = ('owner',)
+    readonly_fields = (*COUNTER_FIELDS, 'updated_at')
+    actions = ('recompute_counters',)
+
+    @admin.action(description='Recompute ratings and counters of selected books')
+    def recompute_counters(self, request, queryset):
+        updated = rebuild_counters(Book.objects.filter(pk__in=queryset.values('pk')))
+        self.message_user(request, f'Recomputed the counters of {updated} books.')
+
+    def delete_queryset(self, request, queryset):
+        super().delete_queryset(request, queryset)
+        invalidate_books()
 
 
 @admin.register(UserBookRelation)
-class AdminUserBookRelation(admin.ModelAdmin):
-    pass
+class AdminUserBookRelation(LargeTableAdmin):
+    list_display = ('id', 'user', 'book', 'like', 'in_bookmarks', 'rate')
+    list_select_related = ('user', 'book')
+    raw_id_fields = ('user',)
+    autocomplete_fields = ('book',)
+    actions = ('recompute_book_counters',)
+
+    def get_queryset(self, request):
+        # __str__ of a relation shows its user and book, also on the change form and the delete confirmation
+        return super().get_queryset(request).select_related('user', 'book')
+
+    @admin.action(description='Recompute ratings and counters of the books of selected relations')
+    def recompute_book_counters(self, request, queryset):
+        updated = rebuild_counters(Book.objects.filter(pk__in=queryset.values('book_id')))
+        self.message_user(request, f'Recomputed the counters of {updated} books.')
+
+    def delete_queryset(self, request, queryset):
+        # A bulk delete skips UserBookRelation.delete(), the counters are rebuilt in one UPDATE instead
+        book_ids = list(queryset.values_list('book_id', flat=True).distinct())
+        super().delete_queryset(request, queryset)
+        rebuild_counters(Book.objects.filter(pk__in=book_ids))
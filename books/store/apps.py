@@ -4,3 +4,16 @@ from django.apps import AppConfig
 class StoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'store'
+
+    def ready(self):
+        from django.contrib.auth.models import User
+        from django.db.backends.signals import connection_created
+        from django.db.models.signals import post_save, pre_delete, pre_save
+        from store.checks import check_production_settings
+        from store.logic import check_user_renamed, delete_user_relations, touch_renamed_user_books
+        from store.metrics import install_query_recorder
+        check_production_settings()
+        connection_created.connect(install_query_recorder)
+        pre_save.connect(check_user_renamed, sender=User)
+        post_save.connect(touch_renamed_user_books, sender=User)
+        pre_delete.connect(delete_user_relations, sender=User)
@@ -0,0 +1,142 @@
+"""
+Async read path of the book API, mounted under `/async/` and served by the ASGI entry point.
+
+The views reuse the DRF view classes for everything that does not touch the database (filter
+backends, pagination, permissions, serializers, exception handling), only the fetching goes
+through the async queryset API. The book list keeps the response cache, conditional GET and
+fragment layers of the sync list; their cache calls run in a worker thread.
+"""
+import functools
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.http import Http404, HttpResponse
+from rest_framework.exceptions import MethodNotAllowed
+from rest_framework.response import Response
+from store.cache import response_cache_key
+from store.conditional import is_conditional, not_modified_response
+from store.models import Book
+from store.pagination import ReaderCursorPagination
+from store.serializers import BookReaderSerializer
+from store.views import BookViewSet, UserBookRelationView
+
+
+def async_read_view(view_class, action, authenticate=False):
+    """
+    Run `handler(view, request, **kwargs)` through the request cycle of a `view_class` instance.
+    Authentication stays lazy unless `authenticate` is set, so anonymous reads never load the
+    session in the event loop; views that need `request.user` authenticate in a worker thread.
+    """
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def view_func(request, *args, **kwargs):
+            view = view_class(action_map={'get': action, 'head': action}, args=args, kwargs=kwargs, format_kwarg=None)
+            view.request = request = view.initialize_request(request, *args, **kwargs)
+            view.headers = view.default_response_headers
+            try:
+                if request.method.lower() not in view.action_map:
+                    raise MethodNotAllowed(request.method)
+                request.accepted_renderer, request.accepted_media_type = view.perform_content_negotiation(request)
+                if authenticate:
+                    await sync_to_async(view.perform_authentication)(request)
+                view.check_permissions(request)
+                view.check_throttles(request)
+                response = await handler(view, request, *args, **kwargs)
+            except Exception as exc:
+                response = view.handle_exception(exc)
+            response = view.finalize_response(request, response, *args, **kwargs)
+            # A plain HttpResponse saves the handler a thread hop for deferred rendering
+            response.render()
+            return HttpResponse(response.content, status=response.status_code, headers=dict(response.items()))
+
+        view_func.csrf_exempt = True
+        return view_func
+    return decorator
+
+
+async def aget_object_or_404(queryset, **filter_kwargs):
+    try:
+        return await queryset.aget(**filter_kwargs)
+    except (queryset.model.DoesNotExist, TypeError, ValueError, ValidationError):
+        raise Http404
+
+
+async def apaginate(paginator, queryset, request, view):
+    page_queryset = paginator.get_page_queryset(queryset, request, view=view)
+    if page_queryset is None:
+        return None
+    return paginator.set_page([row async for row in page_queryset])
+
+
+@async_read_view(BookViewSet, 'list', authenticate=True)
+async def book_list(view, request):
+    """
+    The layers of the sync `BookViewSet.list`: the anonymous response cache, conditional GET and
+    the per-book fragments. Their cache calls run in a worker thread, the rows are fetched async.
+    """
+    if not view.is_cacheable(request):
+        return await book_list_page(view, request)
+
+    def get_cached_response():
+        key = response_cache_key(request, view.action, {})
+        return key, view.get_cached_response(request, key)
+
+    key, response = await sync_to_async(get_cached_response)()
+    if response is None:
+        response = await sync_to_async(view.cache_response)(key, await book_list_page(view, request))
+    return response
+
+
+def with_headers(response, headers):
+    for header, value in headers.items():
+        response[header] = value
+    return response
+
+
+async def book_list_page(view, request):
+    row_serializer = view.get_row_serializer()
+    queryset = view.filter_queryset(view.get_queryset())
+    conditional = is_conditional(request)
+
+    if view.fragment_timeout or conditional:
+        rows = await apaginate(view.paginator, view.get_version_rows(queryset), request, view)
+        if rows is not None:
+            headers = view.page_headers(request, [view.row_version(row) for row in rows])
+            response = conditional and not_modified_response(request, headers, use_last_modified=False)
+            if response:
+                return response
+            if view.fragment_timeout:
+                data = await sync_to_async(view.stitch_fragments)(row_serializer, rows)
+                return with_headers(view.get_paginated_response(data), headers)
+
+    ordering = view.paginator.get_ordering(request, queryset, view) if view.paginator else ()
+    queryset = queryset.values(*view.get_row_columns(row_serializer, queryset, ordering))
+    page = await apaginate(view.paginator, queryset, request, view)
+    if page is not None:
+        headers = view.page_headers(request, [view.row_version(row) for row in page])
+        return with_headers(view.get_paginated_response(await row_serializer.ato_representation(page)), headers)
+    rows = [row async for row in queryset.aiterator()]
+    return Response(await row_serializer.ato_representation(rows))
+
+
+@async_read_view(BookViewSet, 'retrieve', authenticate=True)
+async def book_detail(view, request, pk):
+    book = await aget_object_or_404(view.filter_queryset(view.get_queryset()), pk=pk)
+    view.check_object_permissions(request, book)
+    return Response(view.get_serializer(book).data)
+
+
+@async_read_view(BookViewSet, 'readers')
+async def book_readers(view, request, pk):
+    book = await aget_object_or_404(Book.objects.only('pk'), pk=pk)
+    paginator = ReaderCursorPagination()
+    readers = User.objects.filter(userbookrelation__book=book).only('first_name', 'last_name')
+    page = await apaginate(paginator, readers, request, view)
+    return paginator.get_paginated_response(BookReaderSerializer(page, many=True).data)
+
+
+@async_read_view(UserBookRelationView, 'retrieve', authenticate=True)
+async def book_relation_detail(view, request, book):
+    relation = await aget_object_or_404(view.get_queryset(), user=request.user, book_id=book)
+    return Response(view.get_serializer(relation).data)
@@ -0,0 +1,191 @@
+"""
+A thread-safe pool of DB-API connections, independent of the driver: the pooling PostgreSQL
+backend plugs in the psycopg2 connect / check / reset functions, tests plug in test doubles.
+"""
+import collections
+import threading
+import time
+
+from store.metrics import current_metrics
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class PooledConnection:
+    __slots__ = ('connection', 'created', 'returned')
+
+    def __init__(self, connection, created):
+        self.connection = connection
+        self.created = created
+        self.returned = created
+
+
+class ConnectionPool:
+    """
+    Between `min_size` and `max_size` connections made by `connect()`. A checkout reuses the most
+    recently returned connection that is younger than `max_lifetime`, checks it with `check(conn)`
+    when it has been idle for `check_idle` seconds or more (0 checks every checkout) and otherwise
+    opens a new one, or waits up to `timeout` seconds for a connection to be returned.
+    `reset(conn)` cleans a returned connection up and reports whether it can be reused.
+    """
+
+    def __init__(self, connect, close, check=None, reset=None, min_size=0, max_size=10, max_lifetime=3600,
+                 timeout=30, check_idle=0, clock=time.monotonic):
+        if not 0 <= min_size <= max_size or max_size < 1:
+            raise ValueError('Expected 0 <= min_size <= max_size and max_size >= 1.')
+        self.connect, self.close_connection, self.check, self.reset = connect, close, check, reset
+        self.min_size, self.max_size = min_size, max_size
+        self.max_lifetime, self.timeout, self.check_idle = max_lifetime, timeout, check_idle
+        self.clock = clock
+        self.condition = threading.Condition()
+        self.idle = collections.deque()
+        self.in_use = {}
+        self.size = 0
+        self.counters = collections.Counter()
+        self.wait_time = 0.0
+        self.max_wait_time = 0.0
+
+    def getconn(self):
+        started = self.clock()
+        waited = discarded = False
+        with self.condition:
+            while True:
+                while self.idle:
+                    pooled = self.idle.pop()
+                    if self.expired(pooled):
+                        self._discard(pooled, 'expired')
+                        discarded = True
+                        continue
+                    break
+                else:
+                    pooled = None
+                if pooled is not None or self.size < self.max_size:
+                    if pooled is None:
+                        self.size += 1
+                    break
+                remaining = self.timeout - (self.clock() - started)
+                if remaining <= 0:
+                    self.counters['timeouts'] += 1
+                    self._record_wait(started)
+                    raise PoolTimeout(f'No connection available within {self.timeout} seconds '
+                                      f'({self.max_size} in use).')
+                waited = True
+                self.condition.wait(remaining)
+            if waited:
+                self.counters['waits'] += 1
+                self._record_wait(started)
+
+        if pooled is not None and not self._healthy(pooled):
+            with self.condition:
+                self._discard(pooled, 'failed_checks')
+                # The slot of the broken connection is reused for a new one
+                self.size += 1
+            pooled = None
+            discarded = True
+        if pooled is None:
+            pooled = self._connect()
+        with self.condition:
+            self.in_use[id(pooled.connection)] = pooled
+            self.counters['checkouts'] += 1
+        if discarded:
+            self._refill()
+        return pooled.connection
+
+    def putconn(self, connection, discard=False):
+        with self.condition:
+            pooled = self.in_use.pop(id(connection))
+        reusable = not discard and not self.expired(pooled)
+        if reusable and self.reset is not None:
+            try:
+                reusable = self.reset(connection)
+            except Exception:
+                reusable = False
+        with self.condition:
+            if reusable:
+                pooled.returned = self.clock()
+                self.idle.append(pooled)
+            else:
+                self._discard(pooled, 'discarded')
+            self.condition.notify()
+        if not reusable:
+            self._refill()
+
+    def fill(self):
+        """Open idle connections up to `min_size`, run on creation and after connections are discarded."""
+        while True:
+            with self.condition:
+                if self.size >= self.min_size:
+                    return
+                self.size += 1
+            pooled = self._connect()
+            with self.condition:
+                self.idle.appendleft(pooled)
+                self.condition.notify()
+
+    def close(self):
+        """Close the idle connections, the ones in use are closed when they are returned."""
+        with self.condition:
+            while self.idle:
+                self._discard(self.idle.pop(), 'closed')
+            self.condition.notify_all()
+
+    def expired(self, pooled):
+        return self.max_lifetime is not None and self.clock() - pooled.created >= self.max_lifetime
+
+    def stats(self):
+        with self.condition:
+            return {
+                'size': self.size,
+                'idle': len(self.idle),
+                'in_use': len(self.in_use),
+                'wait_ms': round(self.wait_time * 1000, 2),
+                'max_wait_ms': round(self.max_wait_time * 1000, 2),
+                **{name: self.counters[name] for name in (
+                    'checkouts', 'connects', 'waits', 'timeouts', 'expired', 'failed_checks', 'discarded')},
+            }
+
+    def _connect(self):
+        try:
+            connection = self.connect()
+        except Exception:
+            with self.condition:
+                self.size -= 1
+                self.condition.notify()
+            raise
+        with self.condition:
+            self.counters['connects'] += 1
+        return PooledConnection(connection, self.clock())
+
+    def _refill(self):
+        try:
+            self.fill()
+        except Exception:
+            # Not the caller's problem, a later checkout opens the connection it needs
+            pass
+
+    def _healthy(self, pooled):
+        if self.check is None or self.clock() - pooled.returned < self.check_idle:
+            return True
+        try:
+            return self.check(pooled.connection)
+        except Exception:
+            return False
+
+    def _discard(self, pooled, reason):
+        """Drop a connection that is not idle any more, with the condition held."""
+        self.size -= 1
+        self.counters[reason] += 1
+        try:
+            self.close_connection(pooled.connection)
+        except Exception:
+            pass
+
+    def _record_wait(self, started):
+        waited = self.clock() - started
+        self.wait_time += waited
+        self.max_wait_time = max(self.max_wait_time, waited)
+        metrics = current_metrics()
+        if metrics is not None:
+            metrics.pool_wait_time += waited
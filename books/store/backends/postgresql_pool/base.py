@@ -0,0 +1,114 @@
+"""
+PostgreSQL backend handing out connections from a per-process `ConnectionPool` instead of opening
+one per request. Use it with CONN_MAX_AGE = 0, so that every request returns its connection:
+
+    'ENGINE': 'store.backends.postgresql_pool',
+    'CONN_MAX_AGE': 0,
+    'OPTIONS': {'pool': {'min_size': 2, 'max_size': 20, 'max_lifetime': 1800, 'timeout': 10}},
+
+Session state a request changes with plain `SET` survives the checkout, use `SET LOCAL`.
+"""
+import threading
+
+from django.db.backends.postgresql import base, creation
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_UNKNOWN
+
+from store.backends.pool import ConnectionPool
+
+POOL_OPTIONS = ('min_size', 'max_size', 'max_lifetime', 'timeout', 'check_idle')
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def check_connection(connection):
+    if connection.closed:
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1')
+    if connection.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+        connection.rollback()
+    return True
+
+
+def reset_connection(connection):
+    if connection.closed:
+        return False
+    status = connection.get_transaction_status()
+    if status == TRANSACTION_STATUS_UNKNOWN:
+        return False
+    if status != TRANSACTION_STATUS_IDLE:
+        connection.rollback()
+    return True
+
+
+def get_pool(alias, conn_params, options, connect):
+    """The pool of `alias` for these connection parameters, created on first use."""
+    key = (alias, tuple(sorted((name, str(value)) for name, value in conn_params.items())))
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ConnectionPool(
+                connect, close=lambda connection: connection.close(), check=check_connection,
+                reset=reset_connection, **options)
+            created = True
+        else:
+            created = False
+    if created:
+        pool.fill()
+    return pool
+
+
+def close_pools(database=None):
+    """Close the idle connections of every pool, or of the pools connected to `database`."""
+    with _pools_lock:
+        pools = [pool for (alias, params), pool in _pools.items()
+                 if database is None or ('database', database) in params]
+    for pool in pools:
+        pool.close()
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # Idle pooled connections would keep the test database in use
+        close_pools(test_database_name)
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+    pool = None
+
+    def get_connection_params(self):
+        # The settings dict is shared by the connections of every thread, hide the pool options without changing it
+        settings_dict = self.settings_dict
+        options = {name: value for name, value in settings_dict['OPTIONS'].items() if name != 'pool'}
+        self.settings_dict = {**settings_dict, 'OPTIONS': options}
+        try:
+            return super().get_connection_params()
+        finally:
+            self.settings_dict = settings_dict
+
+    def get_pool_options(self):
+        options = self.settings_dict['OPTIONS'].get('pool', {})
+        unknown = set(options) - set(POOL_OPTIONS)
+        if unknown:
+            raise ValueError(f'Unknown pool options: {", ".join(sorted(unknown))}.')
+        return options
+
+    def get_new_connection(self, conn_params):
+        connect = super().get_new_connection
+        self.pool = get_pool(self.alias, conn_params, self.get_pool_options(), lambda: connect(conn_params))
+        connection = self.pool.getconn()
+        # What super().get_new_connection() sets on a new connection, for a reused one
+        self.isolation_level = self.settings_dict['OPTIONS'].get('isolation_level', connection.isolation_level)
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                # A connection closed inside an atomic block stays referenced by this wrapper
+                self.pool.putconn(self.connection, discard=self.in_atomic_block)
+
+    def pool_stats(self):
+        return self.pool.stats() if self.pool is not None else None
@@ -0,0 +1,206 @@
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework.response import Response
+from store.conditional import VALIDATOR_HEADERS, not_modified_response
+from store.metrics import time_serialization
+from store.replicas import current_replica
+
+GENERATION_KEY = 'store:books:generation'
+HITS_KEY = 'store:books:cache:hits'
+MISSES_KEY = 'store:books:cache:misses'
+FRAGMENT_HITS_KEY = 'store:books:fragments:hits'
+FRAGMENT_MISSES_KEY = 'store:books:fragments:misses'
+
+
+def get_cache():
+    return caches[getattr(settings, 'BOOKS_CACHE_ALIAS', 'default')]
+
+
+def get_generation():
+    cache = get_cache()
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        # Start from a timestamp, so an evicted counter never reuses the keys of older entries
+        cache.add(GENERATION_KEY, int(time.time() * 1000), timeout=None)
+        generation = cache.get(GENERATION_KEY)
+    return generation
+
+
+def bump_generation():
+    cache = get_cache()
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        get_generation()
+        cache.incr(GENERATION_KEY)
+
+
+def invalidate_books():
+    """
+    Drop every cached book response. The generation is bumped immediately and once more
+    after commit, so a response cached from pre-commit data does not outlive the transaction.
+    """
+    bump_generation()
+    transaction.on_commit(bump_generation)
+
+
+def _increment(key, delta=1):
+    cache = get_cache()
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        if not cache.add(key, delta, timeout=None):
+            cache.incr(key, delta)
+
+
+def cache_stats():
+    values = get_cache().get_many([HITS_KEY, MISSES_KEY])
+    return {'hits': values.get(HITS_KEY, 0), 'misses': values.get(MISSES_KEY, 0)}
+
+
+def fragment_stats():
+    values = get_cache().get_many([FRAGMENT_HITS_KEY, FRAGMENT_MISSES_KEY])
+    return {'hits': values.get(FRAGMENT_HITS_KEY, 0), 'misses': values.get(FRAGMENT_MISSES_KEY, 0)}
+
+
+def fragment_key(pk, version, fields=None):
+    variant = 'all' if fields is None else hashlib.md5(','.join(fields).encode()).hexdigest()
+    return f'store:book:{pk}:{version.isoformat()}:{variant}'
+
+
+def response_cache_key(request, action, kwargs):
+    params = urlencode(sorted(request.query_params.lists()), doseq=True)
+    lookup = urlencode(sorted(kwargs.items()))
+    raw = f'{request.get_host()}|{request.path}|{action}|{lookup}|{params}'
+    return f'store:books:{get_generation()}:{hashlib.md5(raw.encode()).hexdigest()}'
+
+
+class CachedResponseMixin:
+    """
+    Serve `list` and `retrieve` for anonymous users from the cache, keyed on the normalized
+    query parameters and the current books generation. The ETag / Last-Modified validators are
+    cached with the data, so a conditional request hitting the cache is answered without queries.
+    """
+
+    @property
+    def cache_timeout(self):
+        return getattr(settings, 'BOOKS_CACHE_TIMEOUT', 300)
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
+
+    def is_cacheable(self, request):
+        return request.user.is_anonymous
+
+    def get_response_timeout(self):
+        timeout = self.cache_timeout
+        if current_replica() is not None:
+            # A lagging replica can serve data older than the generation it is cached under, keep
+            # it no longer than a client that wrote reads from the primary
+            sticky = settings.BOOKS_REPLICA_STICKY_SECONDS
+            timeout = sticky if timeout is None else min(timeout, sticky)
+        return timeout
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if not self.is_cacheable(request):
+            return handler(request, *args, **kwargs)
+
+        key = response_cache_key(request, self.action, kwargs)
+        response = self.get_cached_response(request, key)
+        if response is None:
+            response = self.cache_response(key, handler(request, *args, **kwargs))
+        return response
+
+    def get_cached_response(self, request, key):
+        """The cached response under `key`, or a 304 for a matching conditional request; None on a miss."""
+        cached = get_cache().get(key)
+        if cached is None:
+            _increment(MISSES_KEY)
+            return None
+        _increment(HITS_KEY)
+        data, validators = cached
+        response = not_modified_response(request, validators, use_last_modified=self.action != 'list')
+        if response is None:
+            response = Response(data, headers=validators)
+        response['X-Cache'] = 'HIT'
+        return response
+
+    def cache_response(self, key, response):
+        if response.status_code == 200:
+            validators = {header: response[header] for header in VALIDATOR_HEADERS if header in response}
+            get_cache().set(key, (response.data, validators), self.get_response_timeout())
+        response['X-Cache'] = 'MISS'
+        return response
+
+
+class FragmentCachedListMixin:
+    """
+    Assemble `list` pages from per-book fragments. The page is fetched as narrow rows (pk,
+    `fragment_version_field`, ordering keys and the per-request annotations), the representation
+    of every book is read with one `get_many` keyed on the book's version, and only the missing
+    books are fetched in full, serialized and cached. A write to one book moves only that book's
+    version, the fragments of the other books stay valid.
+
+    Annotation-sourced fields, such as the caller's own relation, are never cached, they are
+    rendered from the narrow rows and laid over the fragments. When the narrow rows are also the
+    version rows of ConditionalResponseMixin, a conditional request fetches the page only once.
+    """
+
+    @property
+    def fragment_timeout(self):
+        return getattr(settings, 'BOOKS_FRAGMENT_TIMEOUT', 3600)
+    fragment_version_field = 'updated_at'
+
+    def get_fragment_rows(self, queryset):
+        ordering = self.paginator.get_ordering(self.request, queryset, self) if self.paginator else ()
+        keys = [order.lstrip('-') for order in ordering]
+        return queryset.values(*dict.fromkeys(['pk', self.fragment_version_field, *queryset.query.annotations, *keys]))
+
+    def list(self, request, *args, **kwargs):
+        if not self.fragment_timeout:
+            return super().list(request, *args, **kwargs)
+
+        rows = getattr(self, 'version_page', None)
+        paginated = rows is not None
+        if rows is None:
+            queryset = self.get_fragment_rows(self.filter_queryset(self.get_queryset()))
+            rows = self.paginate_queryset(queryset)
+            paginated = rows is not None
+            if rows is None:
+                rows = list(queryset)
+        data = self.stitch_fragments(self.get_row_serializer(), rows)
+        if paginated:
+            return self.get_paginated_response(data)
+        return Response(data)
+
+    def stitch_fragments(self, row_serializer, rows):
+        cache = get_cache()
+        keys = {row['pk']: fragment_key(row['pk'], row[self.fragment_version_field], row_serializer.fields)
+                for row in rows}
+        cached = cache.get_many(keys.values())
+        fragments = {pk: cached[key] for pk, key in keys.items() if key in cached}
+
+        missing = [pk for pk in keys if pk not in fragments]
+        if missing:
+            fetched = list(self.queryset.filter(pk__in=missing).values(*row_serializer.columns))
+            fresh = {}
+            for row, item in zip(fetched, row_serializer.to_representation(fetched)):
+                fresh[row['pk']] = {name: value for name, value in item.items()
+                                    if name not in row_serializer.annotated_fields}
+            cache.set_many({keys[pk]: fragment for pk, fragment in fresh.items()}, self.fragment_timeout)
+            fragments.update(fresh)
+            _increment(FRAGMENT_MISSES_KEY, len(missing))
+        if len(fragments) > len(missing):
+            _increment(FRAGMENT_HITS_KEY, len(fragments) - len(missing))
+
+        annotations_to_dict = row_serializer.annotations_to_dict
+        with time_serialization():
+            return [{**fragments[row['pk']], **annotations_to_dict(row)} for row in rows if row['pk'] in fragments]
@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+DEBUG_APPS = ('debug_toolbar', 'debug_toolbar_force')
+
+
+def check_production_settings():
+    """Refuse to boot the prod profile with debug mode or debug tooling enabled."""
+    if getattr(settings, 'BOOKS_ENV', None) != 'prod':
+        return
+    problems = []
+    if settings.DEBUG:
+        problems.append('DEBUG is on')
+    problems += [f'{name} is installed' for name in settings.INSTALLED_APPS if name.split('.')[0] in DEBUG_APPS]
+    problems += [f'{name} is in MIDDLEWARE' for name in settings.MIDDLEWARE if name.split('.')[0] in DEBUG_APPS]
+    if problems:
+        raise ImproperlyConfigured('Refusing to start the prod profile: ' + ', '.join(problems) + '.')
@@ -0,0 +1,113 @@
+import hashlib
+
+from django.core.exceptions import ValidationError
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+from rest_framework.response import Response
+
+VALIDATOR_HEADERS = ('ETag', 'Last-Modified')
+CONDITIONAL_HEADERS = ('HTTP_IF_NONE_MATCH', 'HTTP_IF_MODIFIED_SINCE', 'HTTP_IF_MATCH', 'HTTP_IF_UNMODIFIED_SINCE')
+
+
+def is_conditional(request):
+    return any(header in request.META for header in CONDITIONAL_HEADERS)
+
+
+def validator_headers(request, versions, *extra):
+    """
+    Weak ETag and Last-Modified of a representation built from rows with the given
+    `(pk, updated_at, *other version values)` versions, for the requested URL.
+    """
+    versions = list(versions)
+    raw = '|'.join([request.get_host(), request.get_full_path(), *map(str, extra),
+                    *(':'.join(map(str, version)) for version in versions)])
+    headers = {'ETag': f'W/"{hashlib.md5(raw.encode()).hexdigest()}"'}
+    if versions:
+        headers['Last-Modified'] = http_date(max(version[1] for version in versions).timestamp())
+    return headers
+
+
+def not_modified_response(request, headers, use_last_modified=True):
+    """A 304 (or 412) response when the request preconditions match the validator `headers`, else None."""
+    last_modified = headers.get('Last-Modified') if use_last_modified else None
+    response = get_conditional_response(
+        request, etag=headers.get('ETag'), last_modified=last_modified and parse_http_date_safe(last_modified))
+    if response is None:
+        return None
+    return Response(status=response.status_code, headers=headers)
+
+
+class ConditionalResponseMixin:
+    """
+    Conditional GET for `list` and `retrieve`. A conditional request is first checked against the
+    `(pk, *version_fields)` versions of the page or object, fetched without loading or serializing
+    the rows, and answered with 304 when nothing changed. Full responses carry the same validators,
+    taken from the rows they were built from. The first version field is the modification time.
+
+    A list page only honours If-None-Match: the ETag also covers deletions and the page boundaries,
+    a Last-Modified date cannot.
+    """
+    version_fields = ('updated_at',)
+
+    def list(self, request, *args, **kwargs):
+        if is_conditional(request):
+            headers = self.get_page_validators(request)
+            response = headers and not_modified_response(request, headers, use_last_modified=False)
+            if response:
+                return response
+
+        response = super().list(request, *args, **kwargs)
+        page = getattr(self.paginator, 'page', None)
+        if response.status_code == 200 and page is not None:
+            versions = [self.row_version(row) for row in page]
+            for header, value in self.page_headers(request, versions).items():
+                response[header] = value
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        if is_conditional(request):
+            headers = self.get_object_validators(request, kwargs)
+            response = headers and not_modified_response(request, headers)
+            if response:
+                return response
+
+        response = super().retrieve(request, *args, **kwargs)
+        if response.status_code == 200:
+            obj = self.conditional_object
+            versions = [(obj.pk, *(getattr(obj, field) for field in self.version_fields))]
+            for header, value in validator_headers(request, versions).items():
+                response[header] = value
+        return response
+
+    def get_object(self):
+        self.conditional_object = super().get_object()
+        return self.conditional_object
+
+    def row_version(self, row):
+        return (row['pk'], *(row[field] for field in self.version_fields))
+
+    def page_headers(self, request, versions):
+        return validator_headers(request, versions, self.paginator.has_previous, self.paginator.has_next)
+
+    def get_version_rows(self, queryset):
+        """The `values()` rows the validators of a list page are computed from."""
+        return queryset.values('pk', *self.version_fields)
+
+    def get_page_validators(self, request):
+        queryset = self.get_version_rows(self.filter_queryset(self.get_queryset()))
+        page_queryset = self.paginator.get_page_queryset(queryset, request, view=self) if self.paginator else None
+        if page_queryset is None:
+            return None
+        # Kept for a `list` that can build the page from these rows
+        self.version_page = self.paginator.set_page(list(page_queryset))
+        return self.page_headers(request, [self.row_version(row) for row in self.version_page])
+
+    def get_object_validators(self, request, kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        queryset = self.filter_queryset(self.get_queryset())
+        try:
+            versions = list(queryset.filter(**{self.lookup_field: kwargs[lookup_url_kwarg]})
+                            .values_list('pk', *self.version_fields)[:1])
+        except (TypeError, ValueError, ValidationError):
+            return None
+        return validator_headers(request, versions) if versions else None
@@ -0,0 +1,98 @@
+import csv
+import datetime
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from store.models import Book
+
+EXPORT_FIELDS = (
+    ('pk', 'pk'),
+    ('name', 'name'),
+    ('price', 'price'),
+    ('author_name', 'author_name'),
+    ('likes', 'likes_count'),
+    ('rating', 'rating'),
+    ('readers_count', 'readers_count'),
+    ('owner', 'owner__username'),
+    ('updated_at', 'updated_at'),
+)
+EXPORT_FORMATS = ('ndjson', 'csv')
+CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def parse_since(value):
+    """Parse an ISO 8601 watermark, naive values are taken as UTC. Raises ValueError."""
+    since = parse_datetime(value)
+    if since is None:
+        raise ValueError(f'Invalid timestamp: {value}')
+    if timezone.is_naive(since):
+        since = timezone.make_aware(since, datetime.timezone.utc)
+    return since
+
+
+def export_queryset(since=None, after_pk=None):
+    """
+    Books to export in a stable order. With `since` only books changed after that moment are
+    returned, ordered by (updated_at, pk); `since` and `after_pk` together resume after the
+    (updated_at, pk) of the last exported row, including the books updated at the same moment.
+    """
+    queryset = Book.objects.all()
+    ordering = ('pk',)
+    if since is not None:
+        changed = Q(updated_at__gt=since)
+        if after_pk is not None:
+            changed |= Q(updated_at=since, pk__gt=after_pk)
+        queryset = queryset.filter(changed)
+        ordering = ('updated_at', 'pk')
+    elif after_pk is not None:
+        queryset = queryset.filter(pk__gt=after_pk)
+    return queryset.order_by(*ordering).values_list(*(lookup for _, lookup in EXPORT_FIELDS))
+
+
+class ExportJSONEncoder(DjangoJSONEncoder):
+    """Keeps the microseconds DjangoJSONEncoder drops, an exported `updated_at` must be usable as a watermark."""
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def iter_ndjson(queryset, chunk_size=2000):
+    headers = [header for header, _ in EXPORT_FIELDS]
+    encoder = ExportJSONEncoder(ensure_ascii=False)
+    for row in queryset.iterator(chunk_size=chunk_size):
+        yield encoder.encode(dict(zip(headers, row))) + '\n'
+
+
+def _csv_value(value, encoder):
+    if value is None:
+        return ''
+    if isinstance(value, datetime.datetime):
+        return encoder.default(value)
+    return value
+
+
+def iter_csv(queryset, chunk_size=2000):
+    writer = csv.writer(_Echo())
+    encoder = ExportJSONEncoder()
+    yield writer.writerow([header for header, _ in EXPORT_FIELDS])
+    for row in queryset.iterator(chunk_size=chunk_size):
+        yield writer.writerow([_csv_value(value, encoder) for value in row])
+
+
+def iter_export(export_format, queryset, chunk_size=2000):
+    if export_format == 'csv':
+        return iter_csv(queryset, chunk_size)
+    return iter_ndjson(queryset, chunk_size)
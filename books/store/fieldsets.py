@@ -0,0 +1,45 @@
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import SAFE_METHODS
+
+
+def split_names(value):
+    return [name.strip() for name in value.split(',') if name.strip()]
+
+
+class SparseFieldsetMixin:
+    """
+    `?fields=a,b` and `?exclude=c` on reads. The fieldset trims the serializer and the row
+    serializer; the view's `get_queryset` can consult `get_fieldset()` to leave out the joins,
+    annotations and prefetches only the dropped fields need.
+    """
+    fields_param = 'fields'
+    exclude_param = 'exclude'
+
+    def get_fieldset(self):
+        """The requested field names in serializer order, None for the full representation."""
+        if not hasattr(self, '_fieldset'):
+            self._fieldset = self.parse_fieldset(self.request)
+        return self._fieldset
+
+    def parse_fieldset(self, request):
+        params = request.query_params
+        if request.method not in SAFE_METHODS or not (self.fields_param in params or self.exclude_param in params):
+            return None
+        available = self.get_serializer_class().Meta.fields
+        fields = split_names(params[self.fields_param]) if self.fields_param in params else available
+        exclude = split_names(params.get(self.exclude_param, ''))
+        errors = {}
+        for param, names in ((self.fields_param, fields), (self.exclude_param, exclude)):
+            unknown = [name for name in names if name not in available]
+            if unknown:
+                errors[param] = [f'Unknown fields: {", ".join(unknown)}.']
+        if errors:
+            raise ValidationError(errors)
+        return tuple(name for name in available if name in fields and name not in exclude)
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.setdefault('fields', self.get_fieldset())
+        return super().get_serializer(*args, **kwargs)
+
+    def get_row_serializer(self):
+        return self.row_serializer_class(fields=self.get_fieldset())
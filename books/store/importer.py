@@ -0,0 +1,126 @@
+import csv
+import io
+import json
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import connections
+
+from store.models import Book, UserBookRelation
+
+TRUE_VALUES = {'1', 'true', 't', 'yes', 'y'}
+FALSE_VALUES = {'', '0', 'false', 'f', 'no', 'n'}
+
+
+class RecordError(ValueError):
+    pass
+
+
+def read_records(path, input_format=None):
+    """Yield one dict per CSV row or JSON line without loading the whole file."""
+    if input_format is None:
+        input_format = 'csv' if str(path).endswith('.csv') else 'jsonl'
+    with open(path, encoding='utf-8', newline='') as source:
+        if input_format == 'csv':
+            yield from csv.DictReader(source)
+        else:
+            for line in source:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    value = '' if value is None else str(value).strip().lower()
+    if value in TRUE_VALUES:
+        return True
+    if value in FALSE_VALUES:
+        return False
+    raise RecordError(f'Invalid boolean: {value!r}')
+
+
+def required(record, field):
+    value = record.get(field)
+    if value in (None, ''):
+        raise RecordError(f'Missing {field}')
+    return value
+
+
+def parse_int(value, field, allow_null=False):
+    if allow_null and value in (None, ''):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise RecordError(f'Invalid {field}: {value!r}')
+
+
+def user_ids(usernames):
+    return dict(User.objects.filter(username__in=set(usernames)).values_list('username', 'pk'))
+
+
+def build_books(records):
+    owners = user_ids(record['owner'] for record in records if record.get('owner'))
+    books = []
+    for record in records:
+        books.append(Book(
+            name=required(record, 'name'),
+            price=parse_int(required(record, 'price'), 'price'),
+            author_name=required(record, 'author_name'),
+            owner_id=owners.get(record.get('owner')),
+        ))
+    return books
+
+
+def build_relations(records):
+    """Relations for known users and books that do not exist yet, the rest is skipped."""
+    users = user_ids(required(record, 'user') for record in records)
+    book_ids = [parse_int(required(record, 'book'), 'book') for record in records]
+    books = set(Book.objects.filter(pk__in=book_ids).values_list('pk', flat=True))
+    existing = set(
+        UserBookRelation.objects.filter(user_id__in=users.values(), book_id__in=books).values_list('user_id', 'book_id')
+    )
+    relations = []
+    for record, book_id in zip(records, book_ids):
+        user_id = users.get(record['user'])
+        rate = parse_int(record.get('rate'), 'rate', allow_null=True)
+        if rate is not None and rate not in dict(UserBookRelation.RATE_CHOICES):
+            raise RecordError(f'Invalid rate: {rate!r}')
+        if user_id is None or book_id not in books or (user_id, book_id) in existing:
+            continue
+        existing.add((user_id, book_id))
+        relations.append(UserBookRelation(
+            user_id=user_id,
+            book_id=book_id,
+            like=parse_bool(record.get('like')),
+            in_bookmarks=parse_bool(record.get('in_bookmarks')),
+            rate=rate,
+        ))
+    return relations
+
+
+def copy_field(value):
+    """One field of a COPY CSV row: NULL is an empty unquoted field, strings are always quoted."""
+    if value is None:
+        return ''
+    if isinstance(value, (bool, int, float, Decimal)):
+        return str(value)
+    value = str(value)
+    return '"' + value.replace('"', '""') + '"'
+
+
+def copy_objects(model, objs, using='default'):
+    """Insert `objs` with PostgreSQL COPY, skipping save() like bulk_create does."""
+    connection = connections[using]
+    fields = [field for field in model._meta.concrete_fields if not field.primary_key]
+    buffer = io.StringIO()
+    for obj in objs:
+        buffer.write(','.join(copy_field(field.get_db_prep_save(field.pre_save(obj, True), connection))
+                              for field in fields))
+        buffer.write('\n')
+    buffer.seek(0)
+    columns = ', '.join(connection.ops.quote_name(field.column) for field in fields)
+    table = connection.ops.quote_name(model._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.copy_expert(f'COPY {table} ({columns}) FROM STDIN WITH (FORMAT csv)', buffer)
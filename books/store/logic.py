@@ -1,8 +1,212 @@
-from django.db.models import Avg
-from store.models import UserBookRelation
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import IntegrityError, connections, transaction
+from django.db.models import Avg, Case, Count, F, FloatField, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce
+from django.db.models.lookups import GreaterThanOrEqual
+from django.utils import timezone
+from store.cache import invalidate_books
+from store.models import Book, UserBookRelation
+
+# User fields shown in book representations, as `owner_name` and in the readers preview
+USER_DISPLAY_FIELDS = ('username', 'first_name', 'last_name')
+
+# /book/top/?by=<name> -> (qualifying books, ordering), both served by the partial indexes of Book
+LEADERBOARDS = {
+    'rating': (Q(top_rating__isnull=False), ('-top_rating', 'pk')),
+    'likes': (Q(likes_count__gt=0), ('-likes_count', 'pk')),
+}
+
+
+def bayesian_average(rating_sum, rating_count):
+    """The `top_rating` of a book with the given counters, None below BOOKS_TOP_MIN_VOTES rates."""
+    min_votes, prior = settings.BOOKS_TOP_MIN_VOTES, settings.BOOKS_TOP_PRIOR_RATING
+    if rating_count < min_votes:
+        return None
+    return (rating_sum + min_votes * prior) / (rating_count + min_votes)
+
+
+def bayesian_average_expression(rating_sum, rating_count):
+    """`bayesian_average` of two counter expressions, evaluated by the database."""
+    min_votes, prior = settings.BOOKS_TOP_MIN_VOTES, settings.BOOKS_TOP_PRIOR_RATING
+    return Case(
+        When(GreaterThanOrEqual(rating_count, min_votes),
+             then=(Cast(rating_sum, FloatField()) + Value(min_votes * prior)) / (rating_count + min_votes)),
+        default=None,
+        output_field=FloatField(),
+    )
 
 
 def set_rating(book):
-    rating = UserBookRelation.objects.filter(book=book).aggregate(rating=Avg('rate')).get('rating')
-    book.rating = rating
-    book.save()
+    """Recompute the rating counters of a single book from its relations."""
+    aggregates = UserBookRelation.objects.filter(book=book).aggregate(
+        rating_sum=Sum('rate'), rating_count=Count('rate'), rating=Avg('rate'))
+    book.rating_sum = aggregates['rating_sum'] or 0
+    book.rating_count = aggregates['rating_count']
+    book.rating = aggregates['rating']
+    book.top_rating = bayesian_average(book.rating_sum, book.rating_count)
+    Book.objects.filter(pk=book.pk).update(
+        rating_sum=book.rating_sum, rating_count=book.rating_count, rating=book.rating, top_rating=book.top_rating,
+        updated_at=timezone.now())
+    invalidate_books()
+
+
+def update_counters(book_id, old_rate, new_rate, likes_delta=0, readers_delta=0):
+    """
+    Apply a single relation change to the book counters in one atomic UPDATE,
+    all right-hand sides see the row as it was before the statement.
+    """
+    counters = {}
+    if old_rate != new_rate:
+        sum_delta = (new_rate or 0) - (old_rate or 0)
+        count_delta = (new_rate is not None) - (old_rate is not None)
+        rating_sum = F('rating_sum') + sum_delta
+        rating_count = F('rating_count') + count_delta
+        counters.update(
+            rating_sum=rating_sum,
+            rating_count=rating_count,
+            rating=Case(
+                When(rating_count__gt=-count_delta, then=Cast(rating_sum, FloatField()) / rating_count),
+                default=None,
+            ),
+            top_rating=bayesian_average_expression(rating_sum, rating_count),
+        )
+    if likes_delta:
+        counters['likes_count'] = F('likes_count') + likes_delta
+    if readers_delta:
+        counters['readers_count'] = F('readers_count') + readers_delta
+    if counters:
+        Book.objects.filter(pk=book_id).update(**counters, updated_at=timezone.now())
+
+
+def rebuild_counters(queryset=None):
+    """
+    Recompute rating, likes and readers counters and `top_rating` of all (or the given) books
+    with one UPDATE.
+    """
+    if queryset is None:
+        queryset = Book.objects.all()
+    relations = UserBookRelation.objects.filter(book=OuterRef('pk')).order_by().values('book')
+    rating_sum = Coalesce(Subquery(relations.annotate(value=Sum('rate')).values('value')), 0)
+    rating_count = Coalesce(Subquery(relations.annotate(value=Count('rate')).values('value')), 0)
+    updated = queryset.update(
+        rating_sum=rating_sum,
+        rating_count=rating_count,
+        top_rating=bayesian_average_expression(rating_sum, rating_count),
+        rating=Subquery(relations.annotate(value=Avg('rate')).values('value')),
+        likes_count=Coalesce(Subquery(relations.filter(like=True).annotate(value=Count('pk')).values('value')), 0),
+        readers_count=Coalesce(Subquery(relations.annotate(value=Count('pk')).values('value')), 0),
+        updated_at=timezone.now(),
+    )
+    invalidate_books()
+    return updated
+
+
+def touch_user_books(user):
+    """
+    Move `updated_at` of the books `user` owns or reads: their cached fragments and validators
+    are versioned on it and hold the user's names.
+    """
+    books = Book.objects.filter(Q(owner=user) | Q(pk__in=UserBookRelation.objects.filter(user=user).values('book')))
+    if books.update(updated_at=timezone.now()):
+        invalidate_books()
+
+
+def check_user_renamed(sender, instance, raw=False, update_fields=None, **kwargs):
+    """`pre_save` receiver of User, marks a save that changes USER_DISPLAY_FIELDS for `touch_renamed_user_books`."""
+    instance._books_display_changed = False
+    if raw or instance.pk is None or (update_fields is not None and not set(update_fields) & set(USER_DISPLAY_FIELDS)):
+        return
+    stored = User.objects.filter(pk=instance.pk).values(*USER_DISPLAY_FIELDS).first()
+    instance._books_display_changed = stored is not None and any(
+        stored[field] != getattr(instance, field) for field in USER_DISPLAY_FIELDS)
+
+
+def touch_renamed_user_books(sender, instance, **kwargs):
+    """`post_save` receiver of User, runs after the new names are written so no fragment caches the old ones."""
+    if getattr(instance, '_books_display_changed', False):
+        touch_user_books(instance)
+        instance._books_display_changed = False
+
+
+def delete_user_relations(sender, instance, **kwargs):
+    """
+    `pre_delete` receiver of User. The cascade would delete the user's relations in SQL, bypassing
+    UserBookRelation.delete(), so they are deleted here first and the counters of their books rebuilt.
+    The owned books, whose owner is set to NULL in SQL as well, are touched.
+    """
+    touch_user_books(instance)
+    relations = UserBookRelation.objects.filter(user=instance)
+    book_ids = list(relations.values_list('book_id', flat=True))
+    if book_ids:
+        relations.delete()
+        rebuild_counters(Book.objects.filter(pk__in=book_ids))
+
+
+def estimated_count(queryset):
+    """
+    The planner's row estimate (`pg_class.reltuples`) of an unfiltered queryset on PostgreSQL,
+    None when there is none.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql' or queryset.query.where or queryset.query.is_sliced:
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT reltuples FROM pg_class WHERE oid = %s::regclass', [queryset.model._meta.db_table])
+        row = cursor.fetchone()
+    # -1 until the table is first vacuumed or analyzed
+    return int(row[0]) if row and row[0] >= 0 else None
+
+
+def rebuild_leaderboards():
+    """Recompute `top_rating` of every book from its stored counters, e.g. after a threshold change."""
+    updated = Book.objects.update(
+        top_rating=bayesian_average_expression(F('rating_sum'), F('rating_count')), updated_at=timezone.now())
+    invalidate_books()
+    return updated
+
+
+def bulk_update_relations(user, items):
+    """
+    Upsert the relations of `user` described by already validated `items`
+    (dicts with `book` and any of like/in_bookmarks/rate) in one transaction.
+    Returns the saved relations, `None` in place of items whose book does not exist.
+    """
+    book_ids = {item['book'] for item in items}
+    with transaction.atomic():
+        existing_books = set(Book.objects.filter(pk__in=book_ids).values_list('pk', flat=True))
+        try:
+            with transaction.atomic():
+                return _write_relations(user, items, existing_books)
+        except IntegrityError:
+            # A concurrent request inserted some of the pairs after they were locked, its rows are
+            # locked and updated with the fields the items sent now
+            return _write_relations(user, items, existing_books)
+
+
+def _write_relations(user, items, existing_books):
+    relations = {
+        relation.book_id: relation
+        for relation in UserBookRelation.objects.select_for_update().filter(user=user, book_id__in=existing_books)
+    }
+    created, updated, results = {}, {}, []
+    for item in items:
+        if item['book'] not in existing_books:
+            results.append(None)
+            continue
+        relation = relations.get(item['book'])
+        if relation is None:
+            relation = relations[item['book']] = UserBookRelation(user=user, book_id=item['book'])
+            created[item['book']] = relation
+        for field in ('like', 'in_bookmarks', 'rate'):
+            if field in item and getattr(relation, field) != item[field]:
+                setattr(relation, field, item[field])
+                if relation.book_id not in created:
+                    updated[relation.book_id] = relation
+        results.append(relation)
+
+    UserBookRelation.objects.bulk_create(created.values())
+    UserBookRelation.objects.bulk_update(updated.values(), ('like', 'in_bookmarks', 'rate'))
+    if created or updated:
+        rebuild_counters(Book.objects.filter(pk__in=created.keys() | updated.keys()))
+    return results
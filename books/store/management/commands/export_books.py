@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from store.export import EXPORT_FORMATS, export_queryset, iter_export, parse_since
+
+
+class Command(BaseCommand):
+    help = 'Stream the book catalog as NDJSON or CSV, optionally only rows changed after a watermark'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=EXPORT_FORMATS, default='ndjson')
+        parser.add_argument('--since', help='Only books updated after this ISO 8601 timestamp')
+        parser.add_argument('--after-pk', type=int,
+                            help='Only books with a greater primary key, with --since: resume after the last '
+                                 'exported (updated_at, pk)')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument('--output', help='Write to this file instead of stdout')
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            try:
+                since = parse_since(options['since'])
+            except ValueError as exc:
+                raise CommandError(exc)
+
+        queryset = export_queryset(since=since, after_pk=options['after_pk'])
+        lines = iter_export(options['format'], queryset, options['chunk_size'])
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+                output.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
@@ -0,0 +1,83 @@
+import time
+from itertools import islice
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from store.cache import invalidate_books
+from store.importer import build_books, build_relations, copy_objects, read_records
+from store.logic import rebuild_counters
+from store.models import Book, UserBookRelation
+
+MODELS = {
+    'books': (Book, build_books),
+    'relations': (UserBookRelation, build_relations),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Import books (name, price, author_name, owner) or relations (user, book, like, in_bookmarks, rate) '
+        'from CSV or JSON Lines in batches, bypassing per-row save hooks'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--model', choices=MODELS, default='books')
+        parser.add_argument('--format', choices=('csv', 'jsonl'), help='Defaults to the file extension')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--no-copy', action='store_true', help='Use bulk_create even on PostgreSQL')
+        parser.add_argument('--checkpoint', help='Progress file, defaults to <path>.checkpoint')
+        parser.add_argument('--resume', action='store_true', help='Skip the records committed by a failed run')
+
+    def handle(self, *args, **options):
+        model, build = MODELS[options['model']]
+        checkpoint = Path(options['checkpoint'] or f'{options["path"]}.checkpoint')
+        use_copy = connection.vendor == 'postgresql' and not options['no_copy']
+        skip = int(checkpoint.read_text()) if options['resume'] and checkpoint.exists() else 0
+
+        records = islice(read_records(options['path'], options['format']), skip, None)
+        done, imported, book_ids = skip, 0, set()
+        started = time.monotonic()
+        while True:
+            try:
+                batch = list(islice(records, options['batch_size']))
+                if not batch:
+                    break
+                with transaction.atomic():
+                    objs = build(batch)
+                    if use_copy:
+                        copy_objects(model, objs)
+                    else:
+                        model.objects.bulk_create(objs, batch_size=options['batch_size'])
+            except ValueError as exc:
+                raise CommandError(f'Batch after record {done}: {exc}. '
+                                   f'Fix the input and rerun with --resume to continue from there.')
+            done += len(batch)
+            imported += len(objs)
+            if model is UserBookRelation:
+                book_ids.update(obj.book_id for obj in objs)
+            checkpoint.write_text(str(done))
+            self.stdout.write(self.summary(done, imported, started))
+
+        if model is UserBookRelation:
+            self.rebuild_counters(book_ids, resumed=bool(skip))
+        invalidate_books()
+        checkpoint.unlink(missing_ok=True)
+        self.stdout.write(self.style.SUCCESS(self.summary(done, imported, started)))
+
+    @staticmethod
+    def rebuild_counters(book_ids, resumed, chunk_size=10000):
+        if resumed:
+            # The failed run may have touched any book, recount all of them in one statement
+            rebuild_counters()
+            return
+        book_ids = sorted(book_ids)
+        for start in range(0, len(book_ids), chunk_size):
+            rebuild_counters(Book.objects.filter(pk__in=book_ids[start:start + chunk_size]))
+
+    @staticmethod
+    def summary(done, imported, started):
+        elapsed = max(time.monotonic() - started, 1e-6)
+        return f'{done} records read, {imported} rows imported, {imported / elapsed:.0f} rows/s'
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from store.logic import rebuild_counters
+
+
+class Command(BaseCommand):
+    help = 'Rebuild rating, likes and readers counters of every book from UserBookRelation'
+
+    def handle(self, *args, **options):
+        updated = rebuild_counters()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt counters for {updated} books'))
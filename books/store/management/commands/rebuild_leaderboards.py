@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from store.logic import rebuild_counters, rebuild_leaderboards
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the /book/top/ leaderboard scores of every book'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--counters', action='store_true',
+                            help='Recompute the rating and likes counters from UserBookRelation first')
+
+    def handle(self, *args, **options):
+        if options['counters']:
+            updated = rebuild_counters()
+        else:
+            updated = rebuild_leaderboards()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt leaderboards for {updated} books'))
@@ -0,0 +1,163 @@
+"""
+Per-request SQL and timing metrics, cheap enough to stay enabled in production: queries are
+counted by an execute wrapper installed on every connection, not the debug cursor, and reported
+in the `Server-Timing` header and a structured `store.requests` log line.
+"""
+import asyncio
+import contextlib
+import json
+import logging
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.utils.decorators import sync_and_async_middleware
+from rest_framework.renderers import JSONRenderer
+
+logger = logging.getLogger('store.requests')
+
+_current_metrics = ContextVar('store_request_metrics', default=None)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class RequestMetrics:
+    """
+    `total` is the time spent below the middleware, `serialize` the time spent turning objects and
+    rows into the response data and rendering it, and `view` the rest of it, database time included.
+    Queries run while serializing, such as lazily fetched relations, count as view and db time.
+    `pool_wait` is the time spent waiting for a pooled database connection.
+    """
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serialize_time = 0.0
+        self.serializing = False
+        self.pool_wait_time = 0.0
+        self.started = time.perf_counter()
+        self.total_time = None
+
+    @contextlib.contextmanager
+    def capture(self):
+        token = _current_metrics.set(self)
+        try:
+            yield self
+        finally:
+            _current_metrics.reset(token)
+            self.total_time = time.perf_counter() - self.started
+
+    def as_dict(self):
+        return {
+            'queries': self.queries,
+            'db_ms': round(self.db_time * 1000, 2),
+            'view_ms': round((self.total_time - self.serialize_time) * 1000, 2),
+            'serialize_ms': round(self.serialize_time * 1000, 2),
+            'pool_wait_ms': round(self.pool_wait_time * 1000, 2),
+            'total_ms': round(self.total_time * 1000, 2),
+        }
+
+    def server_timing(self):
+        return ', '.join((
+            f'db;dur={self.db_time * 1000:.2f};desc="{self.queries} queries"',
+            f'view;dur={(self.total_time - self.serialize_time) * 1000:.2f}',
+            f'serialize;dur={self.serialize_time * 1000:.2f}',
+            f'total;dur={self.total_time * 1000:.2f}',
+        ))
+
+
+def current_metrics():
+    """The metrics of the request being handled, None outside of RequestMetricsMiddleware."""
+    return _current_metrics.get()
+
+
+def record_query(execute, sql, params, many, context):
+    metrics = current_metrics()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.db_time += time.perf_counter() - started
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    """
+    `connection_created` receiver. The recorder stays installed on the connection object and finds
+    the request through a context variable, so queries run by `sync_to_async` in a worker thread
+    are attributed to the async request that awaited them.
+    """
+    if record_query not in connection.execute_wrappers:
+        # First in the list, so the LIFO `execute_wrapper()` blocks of other code keep popping their own
+        connection.execute_wrappers.insert(0, record_query)
+
+
+@contextlib.contextmanager
+def time_serialization():
+    """Count the block as serialization time of the current request, blocks nested in it only once."""
+    metrics = current_metrics()
+    if metrics is None or metrics.serializing:
+        yield
+        return
+    metrics.serializing = True
+    started, db_time = time.perf_counter(), metrics.db_time
+    try:
+        yield
+    finally:
+        metrics.serializing = False
+        metrics.serialize_time += time.perf_counter() - started - (metrics.db_time - db_time)
+
+
+class TimedSerializerMixin:
+    """Serializer mixin counting `to_representation` as serialization time, nested serializers included."""
+
+    def to_representation(self, instance):
+        with time_serialization():
+            return super().to_representation(instance)
+
+
+class TimedJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with time_serialization():
+            return super().render(data, accepted_media_type, renderer_context)
+
+
+def report(request, response, metrics):
+    match = request.resolver_match
+    endpoint = match.view_name if match else None
+    response['Server-Timing'] = metrics.server_timing()
+
+    record = {'method': request.method, 'path': request.path, 'endpoint': endpoint,
+              'status': response.status_code, **metrics.as_dict()}
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(json.dumps(record, separators=(',', ':')), extra={'request_metrics': record})
+
+    budgets = getattr(settings, 'BOOKS_QUERY_BUDGETS', {})
+    budget = budgets.get(endpoint, getattr(settings, 'BOOKS_QUERY_BUDGET_DEFAULT', None))
+    if budget is not None and metrics.queries > budget:
+        message = f'{request.method} {request.path} ({endpoint}) ran {metrics.queries} queries, the budget is {budget}'
+        logger.warning(message, extra={'request_metrics': record})
+        if getattr(settings, 'BOOKS_QUERY_BUDGET_STRICT', False):
+            raise QueryBudgetExceeded(message)
+    return response
+
+
+@sync_and_async_middleware
+def request_metrics_middleware(get_response):
+    if asyncio.iscoroutinefunction(get_response):
+        async def middleware(request):
+            metrics = RequestMetrics()
+            with metrics.capture():
+                response = await get_response(request)
+            return report(request, response, metrics)
+    else:
+        def middleware(request):
+            metrics = RequestMetrics()
+            with metrics.capture():
+                response = get_response(request)
+            return report(request, response, metrics)
+    return middleware
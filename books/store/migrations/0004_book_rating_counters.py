@@ -0,0 +1,52 @@
+# Generated by Django 4.1.7 on 2026-10-18 06:46
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('store', '0003_alter_book_price'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='owner',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='my_books', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='rating',
+            field=models.DecimalField(decimal_places=2, default=None, max_digits=3, null=True),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='UserBookRelation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('like', models.BooleanField(default=False)),
+                ('in_bookmarks', models.BooleanField(default=False)),
+                ('rate', models.PositiveSmallIntegerField(choices=[(1, 'Ok'), (2, 'Fine'), (3, 'Good'), (4, 'Amazing'), (5, 'Incredible')], null=True)),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='store.book')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='readers',
+            field=models.ManyToManyField(related_name='books', through='store.UserBookRelation', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.1.7 on 2026-10-18 06:47
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_likes_count(apps, schema_editor):
+    Book = apps.get_model('store', 'Book')
+    UserBookRelation = apps.get_model('store', 'UserBookRelation')
+    likes = UserBookRelation.objects.filter(book=OuterRef('pk'), like=True).order_by().values('book')
+    Book.objects.update(likes_count=Coalesce(Subquery(likes.annotate(value=Count('pk')).values('value')), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0004_book_rating_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='likes_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_likes_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+from django.db import migrations
+
+SEARCH_FIELDS = ('name', 'author_name')
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for field in SEARCH_FIELDS:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS store_book_{field}_trgm '
+            f'ON store_book USING gin (UPPER({field}::text) gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for field in SEARCH_FIELDS:
+        schema_editor.execute(f'DROP INDEX IF EXISTS store_book_{field}_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0005_book_likes_count'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.1.7 on 2026-10-18 07:02
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_readers_count(apps, schema_editor):
+    Book = apps.get_model('store', 'Book')
+    UserBookRelation = apps.get_model('store', 'UserBookRelation')
+    readers = UserBookRelation.objects.filter(book=OuterRef('pk')).order_by().values('book')
+    Book.objects.update(readers_count=Coalesce(Subquery(readers.annotate(value=Count('pk')).values('value')), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0006_book_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='readers_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_readers_count, migrations.RunPython.noop),
+    ]
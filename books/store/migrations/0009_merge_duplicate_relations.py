@@ -0,0 +1,48 @@
+from django.db import migrations
+from django.db.models import Avg, Count, IntegerField, Max, Min, OuterRef, Subquery, Sum
+from django.db.models.functions import Cast, Coalesce
+
+
+def merge_duplicate_relations(apps, schema_editor):
+    """
+    Fold every duplicated (user, book) group into its oldest row: like and in_bookmarks are
+    kept if any row had them set, rate is taken from the newest rated row.
+    """
+    Book = apps.get_model('store', 'Book')
+    UserBookRelation = apps.get_model('store', 'UserBookRelation')
+    duplicates = UserBookRelation.objects.values('user', 'book').annotate(
+        keep=Min('pk'),
+        rows=Count('pk'),
+        any_like=Max(Cast('like', IntegerField())),
+        any_bookmark=Max(Cast('in_bookmarks', IntegerField())),
+    ).filter(rows__gt=1).order_by()
+
+    book_ids = set()
+    for group in duplicates.iterator():
+        relations = UserBookRelation.objects.filter(user=group['user'], book=group['book'])
+        rated = relations.exclude(rate=None).order_by('-pk').values_list('rate', flat=True).first()
+        relations.filter(pk=group['keep']).update(
+            like=bool(group['any_like']), in_bookmarks=bool(group['any_bookmark']), rate=rated)
+        relations.exclude(pk=group['keep']).delete()
+        book_ids.add(group['book'])
+
+    if book_ids:
+        relations = UserBookRelation.objects.filter(book=OuterRef('pk')).order_by().values('book')
+        Book.objects.filter(pk__in=book_ids).update(
+            rating_sum=Coalesce(Subquery(relations.annotate(value=Sum('rate')).values('value')), 0),
+            rating_count=Coalesce(Subquery(relations.annotate(value=Count('rate')).values('value')), 0),
+            rating=Subquery(relations.annotate(value=Avg('rate')).values('value')),
+            likes_count=Coalesce(Subquery(relations.filter(like=True).annotate(value=Count('pk')).values('value')), 0),
+            readers_count=Coalesce(Subquery(relations.annotate(value=Count('pk')).values('value')), 0),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0008_book_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_relations, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.1.7 on 2026-10-18 06:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0009_merge_duplicate_relations'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='userbookrelation',
+            constraint=models.UniqueConstraint(fields=('user', 'book'), name='store_userbookrelation_unique_user_book'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.1.7 on 2026-10-18 07:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0010_userbookrelation_unique_user_book'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='userbookrelation',
+            index=models.Index(condition=models.Q(('like', True)), fields=['user', 'book'], name='store_ubr_user_likes_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userbookrelation',
+            index=models.Index(condition=models.Q(('in_bookmarks', True)), fields=['user', 'book'], name='store_ubr_user_bookmarks_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.1.7 on 2026-10-18 07:17
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F, FloatField, Value
+from django.db.models.functions import Cast
+
+
+def fill_top_rating(apps, schema_editor):
+    Book = apps.get_model('store', 'Book')
+    min_votes, prior = settings.BOOKS_TOP_MIN_VOTES, settings.BOOKS_TOP_PRIOR_RATING
+    Book.objects.filter(rating_count__gte=min_votes).update(
+        top_rating=(Cast('rating_sum', FloatField()) + Value(min_votes * prior)) / (F('rating_count') + min_votes))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0011_userbookrelation_flag_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='top_rating',
+            field=models.FloatField(default=None, null=True),
+        ),
+        migrations.RunPython(fill_top_rating, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(condition=models.Q(('top_rating__isnull', False)), fields=['-top_rating', 'id'], name='store_book_top_rating_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(condition=models.Q(('likes_count__gt', 0)), fields=['-likes_count', 'id'], name='store_book_top_likes_idx'),
+        ),
+    ]
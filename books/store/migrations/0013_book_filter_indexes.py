@@ -0,0 +1,42 @@
+# Generated by Django 4.1.7 on 2026-10-18 07:30
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('store', '0012_book_leaderboards'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['price', 'id'], name='store_book_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['author_name', 'id'], name='store_book_author_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['author_name'], name='store_book_author_prefix_idx', opclasses=('varchar_pattern_ops',)),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['rating', 'id'], name='store_book_rating_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['owner', 'id'], name='store_book_owner_idx'),
+        ),
+        # After store_book_owner_idx, which replaces the index of the foreign key
+        migrations.AlterField(
+            model_name='book',
+            name='owner',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='my_books', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
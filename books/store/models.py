@@ -1,20 +1,136 @@
+from collections import defaultdict
+
 from django.db import models
+from django.db.models import F, FilteredRelation, Q, Value, Window
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import RowNumber
 from django.contrib.auth.models import User
 
+from store.cache import invalidate_books
+
+READERS_PREVIEW_SIZE = 10
+
+# Book columns maintained from the relations by store.logic with F() updates, never written back by Book.save()
+COUNTER_FIELDS = ('rating', 'rating_sum', 'rating_count', 'likes_count', 'readers_count', 'top_rating')
+
+# Book annotation -> UserBookRelation field of the requesting user
+USER_RELATION_FIELDS = {'my_like': 'like', 'my_in_bookmarks': 'in_bookmarks', 'my_rate': 'rate'}
+
+
+class BookQuerySet(models.QuerySet):
+    _readers_preview = None
+
+    def with_readers_preview(self, limit=READERS_PREVIEW_SIZE):
+        """
+        Attach the first `limit` readers of every fetched book with one window-function query,
+        `None` turns the preview off.
+        """
+        clone = self._chain()
+        clone._readers_preview = limit
+        return clone
+
+    def with_user_relation(self, user):
+        """
+        Annotate `my_like`, `my_in_bookmarks` and `my_rate` of `user` through one LEFT JOIN on the
+        (user, book) unique relation; anonymous users get NULL literals without a join.
+        """
+        if user is None or not user.is_authenticated:
+            return self.annotate(**{name: Value(None, output_field=UserBookRelation._meta.get_field(field))
+                                    for name, field in USER_RELATION_FIELDS.items()})
+        return self.annotate(
+            my_relation=FilteredRelation('userbookrelation', condition=Q(userbookrelation__user=user)),
+            **{name: F('my_relation__' + field) for name, field in USER_RELATION_FIELDS.items()},
+        )
+
+    def _clone(self):
+        clone = super()._clone()
+        clone._readers_preview = self._readers_preview
+        return clone
+
+    def _fetch_all(self):
+        fetching = self._result_cache is None
+        super()._fetch_all()
+        if fetching and self._readers_preview and issubclass(self._iterable_class, models.query.ModelIterable):
+            prefetch_readers_preview(self._result_cache, self._readers_preview)
+
+
+def readers_preview_relations(book_ids, limit):
+    """Relations of the first `limit` readers of every book, ranked with ROW_NUMBER() per book."""
+    ranked = UserBookRelation.objects.filter(book_id__in=book_ids).annotate(
+        reader_position=Window(RowNumber(), partition_by=[F('book_id')], order_by=F('pk').asc()),
+    ).values('pk', 'reader_position')
+    sql, params = ranked.query.sql_with_params()
+    return UserBookRelation.objects.filter(
+        pk__in=RawSQL(f'SELECT ranked.id FROM ({sql}) ranked WHERE ranked.reader_position <= %s', (*params, limit)),
+    ).order_by('pk')
+
+
+def prefetch_readers_preview(books, limit):
+    books = {book.pk: book for book in books}
+    previews = defaultdict(list)
+    if books:
+        for relation in readers_preview_relations(books, limit).select_related('user'):
+            previews[relation.book_id].append(relation.user)
+    for pk, book in books.items():
+        book._readers_preview = previews[pk]
 
 
 class Book(models.Model):
     name = models.CharField(max_length=255)
     price = models.IntegerField()
     author_name = models.CharField(max_length=255)
-    owner = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='my_books')
+    # Indexed together with id in Meta.indexes
+    owner = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='my_books', db_index=False)
     readers = models.ManyToManyField(User, through='UserBookRelation', related_name='books')
     rating = models.DecimalField(max_digits=3, decimal_places=2, default=None, null=True)
-    objects = models.Manager()
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+    likes_count = models.PositiveIntegerField(default=0)
+    readers_count = models.PositiveIntegerField(default=0)
+    # Bayesian average of the rates, NULL until the book has enough of them to enter /book/top/
+    top_rating = models.FloatField(default=None, null=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    objects = BookQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Leaderboards of /book/top/, a page is a range scan over the qualifying books only
+            models.Index(fields=('-top_rating', 'id'), condition=Q(top_rating__isnull=False),
+                         name='store_book_top_rating_idx'),
+            models.Index(fields=('-likes_count', 'id'), condition=Q(likes_count__gt=0), name='store_book_top_likes_idx'),
+            # BookFilterSet filters, each followed by the pk tie-breaker of the cursor pagination
+            models.Index(fields=('price', 'id'), name='store_book_price_idx'),
+            models.Index(fields=('author_name', 'id'), name='store_book_author_idx'),
+            models.Index(fields=('author_name',), opclasses=('varchar_pattern_ops',),
+                         name='store_book_author_prefix_idx'),
+            models.Index(fields=('rating', 'id'), name='store_book_rating_idx'),
+            models.Index(fields=('owner', 'id'), name='store_book_owner_idx'),
+        ]
 
     def __str__(self):
         return f'id {self.pk}: {self.name}'
 
+    @property
+    def readers_preview(self):
+        if not hasattr(self, '_readers_preview'):
+            self._readers_preview = list(self.readers.order_by('userbookrelation__pk')[:READERS_PREVIEW_SIZE])
+        return self._readers_preview
+
+    def save(self, force_insert=False, force_update=False, using=None, update_fields=None):
+        if update_fields is None and not force_insert and not self._state.adding:
+            # Counters loaded with this instance may be stale, a rate or like written since must survive
+            deferred = self.get_deferred_fields()
+            update_fields = [field.attname for field in self._meta.concrete_fields
+                             if not field.primary_key and field.name not in COUNTER_FIELDS
+                             and field.attname not in deferred]
+        super().save(force_insert, force_update, using, update_fields)
+        invalidate_books()
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        invalidate_books()
+        return result
+
 
 class UserBookRelation(models.Model):
     RATE_CHOICES = [
@@ -31,15 +147,57 @@ class UserBookRelation(models.Model):
     rate = models.PositiveSmallIntegerField(choices=RATE_CHOICES, null=True)
     objects = models.Manager()
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=('user', 'book'), name='store_userbookrelation_unique_user_book'),
+        ]
+        # Partial indexes behind /me/likes/ and /me/bookmarks/: only flagged rows are indexed
+        indexes = [
+            models.Index(fields=('user', 'book'), condition=Q(like=True), name='store_ubr_user_likes_idx'),
+            models.Index(fields=('user', 'book'), condition=Q(in_bookmarks=True), name='store_ubr_user_bookmarks_idx'),
+        ]
+
     def __str__(self):
         return f'{self.user.username} -- {self.book.name} -- {self.rate}'
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._track_counted_fields()
+
+    def refresh_from_db(self, using=None, fields=None):
+        super().refresh_from_db(using, fields)
+        # The counters delta is taken from the values just read, not from the ones loaded before
+        self._track_counted_fields(fields)
+
+    def _track_counted_fields(self, fields=None):
+        if fields is None or 'rate' in fields:
+            self._old_rate = self.__dict__.get('rate', models.DEFERRED)
+        if fields is None or 'like' in fields:
+            self._old_like = self.__dict__.get('like', models.DEFERRED)
+
     def save(self, *args, **kwargs):
-        from store.logic import set_rating
+        from store.logic import rebuild_counters, update_counters
         creating = not self.pk
 
-        old_rating = self.rate
+        old_rating = None if creating else self._old_rate
+        old_like = False if creating else self._old_like
         super().save(*args, **kwargs)
         new_rating = self.rate
-        if old_rating != new_rating or creating:
-            set_rating(self.book)
+        if old_rating is models.DEFERRED or old_like is models.DEFERRED:
+            rebuild_counters(Book.objects.filter(pk=self.book_id))
+        elif creating or old_rating != new_rating or old_like != self.like:
+            update_counters(self.book_id, old_rating, new_rating, self.like - old_like, readers_delta=int(creating))
+            invalidate_books()
+        self._old_rate = new_rating
+        self._old_like = self.like
+
+    def delete(self, *args, **kwargs):
+        from store.logic import rebuild_counters, update_counters
+        old_rating, old_like = self._old_rate, self._old_like
+        result = super().delete(*args, **kwargs)
+        if old_rating is models.DEFERRED or old_like is models.DEFERRED:
+            rebuild_counters(Book.objects.filter(pk=self.book_id))
+        else:
+            update_counters(self.book_id, old_rating, None, -old_like, readers_delta=-1)
+        invalidate_books()
+        return result
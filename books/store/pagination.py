@@ -0,0 +1,150 @@
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, Cursor
+
+
+class BookCursorPagination(CursorPagination):
+    """
+    Keyset pagination: the cursor stores the values of every ordering column of the
+    boundary row, `pk` is always appended as a tie-breaker, so a page is a single
+    `WHERE (...) > (...) ORDER BY ... LIMIT n` query without OFFSET or COUNT(*).
+    """
+    ordering = ('pk',)
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    tie_breaker = 'pk'
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if not any(order.lstrip('-') in (self.tie_breaker, 'id') for order in ordering):
+            ordering += (self.tie_breaker,)
+        return ordering
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page_queryset = self.get_page_queryset(queryset, request, view)
+        if page_queryset is None:
+            return None
+        return self.set_page(list(page_queryset))
+
+    def get_page_queryset(self, queryset, request, view=None):
+        """The sliced queryset of the requested page plus one look-ahead row, nothing is fetched yet."""
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        self.reverse = bool(self.cursor and self.cursor.reverse)
+        self.position = self.cursor.position if self.cursor else None
+
+        if self.reverse:
+            queryset = queryset.order_by(*_reverse_ordering(self.ordering))
+            ordering = _reverse_ordering(self.ordering)
+        else:
+            queryset = queryset.order_by(*self.ordering)
+            ordering = self.ordering
+        if self.position is not None:
+            try:
+                queryset = queryset.filter(self._keyset_filter(ordering, self.position))
+            except (TypeError, ValueError, ValidationError):
+                raise NotFound(self.invalid_cursor_message)
+        return queryset[:self.page_size + 1]
+
+    def set_page(self, results):
+        """Turn the rows fetched from `get_page_queryset` into the page."""
+        self.page = results[:self.page_size]
+        has_more = len(results) > len(self.page)
+        if self.reverse:
+            self.page = list(reversed(self.page))
+            self.has_next = self.position is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = self.position is not None
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if self.page:
+            position = self._get_position_from_instance(self.page[-1], self.ordering)
+        else:
+            position = self.cursor.position
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=position))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if self.page:
+            position = self._get_position_from_instance(self.page[0], self.ordering)
+        else:
+            position = self.cursor.position
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=position))
+
+    def decode_cursor(self, request):
+        cursor = super().decode_cursor(request)
+        if cursor is None or cursor.position is None:
+            return cursor
+        try:
+            position = json.loads(cursor.position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return Cursor(offset=0, reverse=cursor.reverse, position=position)
+
+    def encode_cursor(self, cursor):
+        if cursor.position is not None:
+            cursor = cursor._replace(position=json.dumps(cursor.position, separators=(',', ':')))
+        return super().encode_cursor(cursor)
+
+    def _get_position_from_instance(self, instance, ordering):
+        position = []
+        for order in ordering:
+            field_name = order.lstrip('-')
+            if isinstance(instance, dict):
+                position.append(instance[field_name])
+            else:
+                position.append(getattr(instance, field_name))
+        return position
+
+    @staticmethod
+    def _keyset_filter(ordering, position):
+        """
+        Row-value comparison `(a, b, pk) > (x, y, z)` spelled as an OR of prefixes,
+        so that mixed ASC/DESC orderings are supported.
+        """
+        condition = Q()
+        equal = {}
+        for order, value in zip(ordering, position):
+            field_name = order.lstrip('-')
+            lookup = '__lt' if order.startswith('-') else '__gt'
+            condition |= Q(**equal, **{field_name + lookup: value})
+            equal[field_name] = value
+        return condition
+
+
+class ReaderCursorPagination(BookCursorPagination):
+    """Keyset pagination over a fixed `pk` ordering, ignoring the book ordering filters of the view."""
+
+    def get_ordering(self, request, queryset, view):
+        return self.ordering
+
+
+class LeaderboardCursorPagination(ReaderCursorPagination):
+    """Keyset pagination over the fixed ordering of a leaderboard."""
+
+    def __init__(self, ordering):
+        self.ordering = ordering
+
+
+def _reverse_ordering(ordering):
+    return tuple(order[1:] if order.startswith('-') else '-' + order for order in ordering)
@@ -0,0 +1,121 @@
+"""
+Read replicas: `replica_routing_middleware` opens a routing state for every request, views with
+`ReplicaReadMixin` send the reads of their safe-method requests to a replica from
+BOOKS_DB_REPLICAS, and `ReplicaRouter` applies that choice. Writes always go to the primary, and so
+do the session and user lookups that authenticate the request.
+
+A client that has just written is pinned to the primary for BOOKS_REPLICA_STICKY_SECONDS by a
+cookie, so it reads its own writes even while the replicas lag behind.
+"""
+import asyncio
+import itertools
+import threading
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.decorators import sync_and_async_middleware
+from rest_framework.permissions import SAFE_METHODS
+
+PRIMARY_COOKIE = 'books_primary'
+
+# Apps always read from the primary: a session or user just written is missing on a lagging replica,
+# which would serve a logged in client as anonymous
+PRIMARY_APP_LABELS = ('auth', 'sessions')
+
+_routing = ContextVar('store_replica_routing', default=None)
+
+
+class RoutingState:
+    def __init__(self, pinned):
+        self.pinned = pinned
+        self.replica = None
+
+
+class ReplicaChooser:
+    """Weighted round-robin over `{alias: weight}`, rebuilt when the setting changes."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.replicas = None
+        self.cycle = None
+
+    def __call__(self, replicas):
+        with self.lock:
+            if replicas != self.replicas:
+                self.replicas = dict(replicas)
+                self.cycle = itertools.cycle([alias for alias, weight in replicas.items() for _ in range(weight)])
+            return next(self.cycle)
+
+
+choose_replica = ReplicaChooser()
+
+
+def get_replicas():
+    return {alias: weight for alias, weight in getattr(settings, 'BOOKS_DB_REPLICAS', {}).items() if weight > 0}
+
+
+def route_reads_to_replica():
+    """Serve the remaining reads of the current request from a replica, unless it is pinned to the primary."""
+    state = _routing.get()
+    replicas = get_replicas()
+    if state is not None and not state.pinned and replicas and state.replica is None:
+        state.replica = choose_replica(replicas)
+    return state and state.replica
+
+
+def current_replica():
+    """The replica serving the reads of the current request, None when they go to the primary."""
+    state = _routing.get()
+    return state and state.replica
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in PRIMARY_APP_LABELS:
+            return DEFAULT_DB_ALIAS
+        return current_replica() or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Every database is the primary or one of its replicas, they hold the same rows
+        return True
+
+
+class ReplicaReadMixin:
+    """Read safe-method requests of the view from a replica."""
+
+    def initialize_request(self, request, *args, **kwargs):
+        if request.method in SAFE_METHODS:
+            route_reads_to_replica()
+        return super().initialize_request(request, *args, **kwargs)
+
+
+def pin_to_primary(request, response):
+    if request.method not in SAFE_METHODS and response.status_code < 400 and get_replicas():
+        response.set_cookie(PRIMARY_COOKIE, '1', max_age=settings.BOOKS_REPLICA_STICKY_SECONDS,
+                            httponly=True, samesite='Lax')
+    return response
+
+
+@sync_and_async_middleware
+def replica_routing_middleware(get_response):
+    if asyncio.iscoroutinefunction(get_response):
+        async def middleware(request):
+            token = _routing.set(RoutingState(pinned=PRIMARY_COOKIE in request.COOKIES))
+            try:
+                response = await get_response(request)
+            finally:
+                _routing.reset(token)
+            return pin_to_primary(request, response)
+    else:
+        def middleware(request):
+            token = _routing.set(RoutingState(pinned=PRIMARY_COOKIE in request.COOKIES))
+            try:
+                response = get_response(request)
+            finally:
+                _routing.reset(token)
+            return pin_to_primary(request, response)
+    return middleware
@@ -1,27 +1,156 @@
+from collections import defaultdict
+
 from django.contrib.auth.models import User
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework.fields import empty
 from rest_framework.serializers import ModelSerializer
-from store.models import Book, UserBookRelation
+from store.metrics import TimedSerializerMixin, time_serialization
+from store.models import READERS_PREVIEW_SIZE, Book, UserBookRelation, readers_preview_relations
 from rest_framework import serializers
 
 
-class BookReaderSerializer(ModelSerializer):
+class BookReaderSerializer(TimedSerializerMixin, ModelSerializer):
     class Meta:
         model = User
         fields = ('first_name', 'last_name',)
 
 
-class BooksSerializer(ModelSerializer):
-    annotated_likes = serializers.IntegerField(read_only=True)
+class BooksSerializer(TimedSerializerMixin, ModelSerializer):
+    annotated_likes = serializers.IntegerField(source='likes_count', read_only=True)
     rating = serializers.DecimalField(max_digits=3, decimal_places=2, read_only=True)
     owner_name = serializers.CharField(source='owner.username', default='', read_only=True)
-    readers = BookReaderSerializer(many=True, read_only=True)
+    readers = BookReaderSerializer(source='readers_preview', many=True, read_only=True)
+    readers_count = serializers.IntegerField(read_only=True)
+    # The requesting user's relation, annotated by BookQuerySet.with_user_relation
+    my_like = serializers.BooleanField(default=None, read_only=True)
+    my_in_bookmarks = serializers.BooleanField(default=None, read_only=True)
+    my_rate = serializers.IntegerField(default=None, read_only=True)
 
     class Meta:
         model = Book
-        fields = ('pk', 'name', 'price', 'author_name', 'annotated_likes', 'rating', 'owner_name', 'readers', )
+        fields = ('pk', 'name', 'price', 'author_name', 'annotated_likes', 'rating', 'owner_name', 'readers',
+                  'readers_count', 'my_like', 'my_in_bookmarks', 'my_rate', )
+
+    def __init__(self, *args, fields=None, **kwargs):
+        """`fields` keeps only the named fields, as requested through `?fields=` / `?exclude=`."""
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class BookRowSerializer:
+    """
+    Read-only twin of BooksSerializer for `values()` rows: the row-to-dict function is generated
+    once from the BooksSerializer fields, so no model instances or field objects are touched per row.
+    Fields sourced from annotations are only fetched when the queryset carries the annotation.
+    `fields` limits the representation, and so the fetched columns, to a sparse fieldset; one
+    function is compiled per fieldset. `annotations_to_dict` renders only the annotation-sourced
+    fields, the per-request part that is laid over a cached book fragment.
+    """
+    serializer_class = BooksSerializer
+    nested_field = 'readers'
+    passthrough_fields = (serializers.IntegerField, serializers.CharField, serializers.ReadOnlyField)
+    # Fetched along with the fields, but not part of the representation
+    extra_columns = ('updated_at',)
+
+    _compiled = {}
+
+    def __init__(self, fields=None):
+        key = (type(self), None if fields is None else tuple(fields))
+        if key not in self._compiled:
+            self._compiled[key] = self.compile(fields)
+        self.fields = fields
+        (self.columns, self.reader_columns, self.reader_keys, self.annotated_fields,
+         self.row_to_dict, self.annotations_to_dict) = self._compiled[key]
+
+    def compile(self, fields=None):
+        fields = self.serializer_class(fields=fields).fields
+        columns = ['pk', *self.extra_columns]
+        reader_columns, reader_fields = [], {}
+        if self.nested_field in fields:
+            reader_fields = fields[self.nested_field].child.fields
+            reader_columns = ['user__' + field.source for field in reader_fields.values()]
+        namespace, items, annotated_fields, annotated_items = {}, [], [], []
+        for name, field in fields.items():
+            if name == self.nested_field:
+                items.append(f"{name!r}: readers.get(row['pk'], [])")
+                continue
+            column = field.source.replace('.', '__')
+            annotated = not self.is_model_column(column)
+            if annotated:
+                value = f'row.get({column!r})'
+            else:
+                value = f'row[{column!r}]'
+                if column not in columns:
+                    columns.append(column)
+            fallback = 'None' if field.default is empty else repr(field.default)
+            if isinstance(field, self.passthrough_fields):
+                converted = value
+            else:
+                namespace[f'_{name}'] = field.to_representation
+                converted = f'_{name}({value})'
+            items.append(f'{name!r}: {fallback} if {value} is None else {converted}')
+            if annotated:
+                annotated_fields.append(name)
+                annotated_items.append(items[-1])
+        source = (
+            'def row_to_dict(row, readers):\n    return {' + ', '.join(items) + '}\n'
+            'def annotations_to_dict(row):\n    return {' + ', '.join(annotated_items) + '}\n'
+        )
+        exec(compile(source, f'<{type(self).__name__}>', 'exec'), namespace)
+        return (columns, reader_columns, list(reader_fields), tuple(annotated_fields),
+                namespace['row_to_dict'], namespace['annotations_to_dict'])
+
+    def is_model_column(self, column):
+        try:
+            self.serializer_class.Meta.model._meta.get_field(column.split('__')[0])
+        except FieldDoesNotExist:
+            return column == 'pk'
+        return True
+
+    def get_columns(self, queryset):
+        annotations = [name for name in queryset.query.annotations if name not in self.columns]
+        return (*self.columns, *annotations)
+
+    def readers_queryset(self, rows):
+        relations = readers_preview_relations([row['pk'] for row in rows], READERS_PREVIEW_SIZE)
+        return relations.values_list('book_id', *self.reader_columns)
+
+    def group_readers(self, relations):
+        readers = defaultdict(list)
+        for book_id, *values in relations:
+            readers[book_id].append(dict(zip(self.reader_keys, values)))
+        return readers
+
+    def get_readers(self, rows):
+        return self.group_readers(self.readers_queryset(rows))
+
+    async def aget_readers(self, rows):
+        return self.group_readers([relation async for relation in self.readers_queryset(rows)])
+
+    def to_representation(self, rows):
+        rows = list(rows)
+        readers = self.get_readers(rows) if rows and self.reader_columns else {}
+        row_to_dict = self.row_to_dict
+        with time_serialization():
+            return [row_to_dict(row, readers) for row in rows]
+
+    async def ato_representation(self, rows):
+        readers = await self.aget_readers(rows) if rows and self.reader_columns else {}
+        row_to_dict = self.row_to_dict
+        with time_serialization():
+            return [row_to_dict(row, readers) for row in rows]
+
+class UserBookRelationSerializer(TimedSerializerMixin, ModelSerializer):
+    class Meta:
+        model = UserBookRelation
+        fields = ('book', 'like', 'in_bookmarks', 'rate')
+
 
+class UserBookRelationBulkItemSerializer(ModelSerializer):
+    book = serializers.IntegerField()
 
-class UserBookRelationSerializer(ModelSerializer):
     class Meta:
         model = UserBookRelation
         fields = ('book', 'like', 'in_bookmarks', 'rate')
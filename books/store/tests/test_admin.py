@@ -0,0 +1,108 @@
+from unittest import mock
+
+from django.contrib.admin.helpers import ACTION_CHECKBOX_NAME
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from store.admin import EstimatedCountPaginator
+from store.logic import estimated_count
+from store.models import Book, UserBookRelation
+
+
+class AdminTestCase(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(self.admin)
+        self.users = [User.objects.create(username=f'user{index}') for index in range(3)]
+        self.books = [Book.objects.create(name=f'Test book {index}', price=25, author_name='Author', owner=user)
+                      for index, user in enumerate(self.users)]
+
+    def relate(self):
+        for user in self.users:
+            for book in self.books:
+                UserBookRelation.objects.create(user=user, book=book, like=True, rate=4)
+
+    def changelist_queries(self, model, **params):
+        url = reverse(f'admin:store_{model}_changelist')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(200, response.status_code)
+        return len(queries)
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        self.relate()
+        book_queries = self.changelist_queries('book')
+        relation_queries = self.changelist_queries('userbookrelation')
+
+        for index in range(3, 6):
+            user = User.objects.create(username=f'user{index}')
+            book = Book.objects.create(name=f'Test book {index}', price=25, author_name='Author', owner=user)
+            UserBookRelation.objects.create(user=user, book=book, rate=3)
+        self.assertEqual(book_queries, self.changelist_queries('book'))
+        self.assertEqual(relation_queries, self.changelist_queries('userbookrelation'))
+
+    def test_no_full_result_count(self):
+        url = reverse('admin:store_book_changelist')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {'updated_at__gte': '2000-01-01'})
+        self.assertEqual(3, response.context['cl'].result_count)
+        self.assertEqual(1, sum('COUNT(*)' in query['sql'] for query in queries))
+
+    def test_change_forms_do_not_list_rows(self):
+        self.relate()
+        relation = UserBookRelation.objects.first()
+        response = self.client.get(reverse('admin:store_userbookrelation_change', args=(relation.pk,)))
+        self.assertEqual(200, response.status_code)
+        self.assertNotContains(response, '<select name="user"')
+        self.assertNotContains(response, f'>{self.books[1]}</option>')
+        self.assertContains(response, 'vForeignKeyRawIdAdminField')
+        self.assertContains(response, 'admin-autocomplete')
+
+        response = self.client.get(reverse('admin:store_book_change', args=(self.books[0].pk,)))
+        self.assertNotContains(response, '<select name="owner"')
+
+    def test_recompute_counters_action(self):
+        self.relate()
+        Book.objects.update(rating=None, rating_sum=0, rating_count=0, likes_count=0, readers_count=0)
+        response = self.client.post(reverse('admin:store_book_changelist'), {
+            'action': 'recompute_counters', ACTION_CHECKBOX_NAME: [self.books[0].pk]})
+        self.assertEqual(302, response.status_code)
+        self.assertEqual([(12, 3, 3, 3), (0, 0, 0, 0), (0, 0, 0, 0)],
+                         list(Book.objects.order_by('pk').values_list(
+                             'rating_sum', 'rating_count', 'likes_count', 'readers_count')))
+
+    def test_delete_selected_relations_updates_counters(self):
+        self.relate()
+        relations = UserBookRelation.objects.filter(book=self.books[0], user__in=self.users[:2])
+        response = self.client.post(reverse('admin:store_userbookrelation_changelist'), {
+            'action': 'delete_selected', 'post': 'yes',
+            ACTION_CHECKBOX_NAME: list(relations.values_list('pk', flat=True))})
+        self.assertEqual(302, response.status_code)
+        self.assertEqual((4, 1, 1, 1), Book.objects.filter(pk=self.books[0].pk).values_list(
+            'rating_sum', 'rating_count', 'likes_count', 'readers_count').get())
+
+
+class EstimatedCountTestCase(TestCase):
+    def setUp(self):
+        for index in range(3):
+            Book.objects.create(name=f'Test book {index}', price=25, author_name='Author')
+
+    def test_exact_count_without_estimate(self):
+        if connection.vendor != 'postgresql':
+            self.assertIsNone(estimated_count(Book.objects.all()))
+        self.assertIsNone(estimated_count(Book.objects.filter(price=25)))
+        self.assertEqual(3, EstimatedCountPaginator(Book.objects.order_by('pk'), 2).count)
+
+    @override_settings(BOOKS_ADMIN_ESTIMATED_COUNT_ABOVE=1000)
+    def test_large_table_estimate(self):
+        with mock.patch('store.admin.estimated_count', return_value=5000):
+            with CaptureQueriesContext(connection) as queries:
+                paginator = EstimatedCountPaginator(Book.objects.order_by('pk'), 2)
+                self.assertEqual(5000, paginator.count)
+                self.assertEqual(2500, paginator.num_pages)
+            self.assertEqual(0, len(queries))
+        with mock.patch('store.admin.estimated_count', return_value=500):
+            self.assertEqual(3, EstimatedCountPaginator(Book.objects.order_by('pk'), 2).count)
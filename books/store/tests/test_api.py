@@ -1,14 +1,21 @@
 import json
+from unittest import mock, skipUnless
+
 from django.db.models import Count, Case, When, Avg
 from rest_framework.exceptions import ErrorDetail
-from rest_framework.test import APITestCase
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APITestCase
 from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
-from store.models import Book, UserBookRelation
+from store.cache import get_cache
+from store.models import READERS_PREVIEW_SIZE, Book, UserBookRelation
 from store.serializers import BooksSerializer
+from store.views import UserBookRelationView
 from django.contrib.auth.models import User
-from django.db import connection
+from django.db import IntegrityError, connection, connections, transaction
+from django.test import TransactionTestCase, override_settings, skipUnlessDBFeature
+from threading import Barrier, Thread
 
 
 class BookApiTestCase(APITestCase):
@@ -25,13 +32,17 @@ class BookApiTestCase(APITestCase):
         url = reverse('book-list')
         with CaptureQueriesContext(connection) as queries:
             response = self.client.get(url)
-            self.assertEqual(2, len(queries))
+            # page, missing fragments, readers preview
+            self.assertEqual(3, len(queries))
+            self.assertNotIn('GROUP BY', queries.captured_queries[1]['sql'])
         self.assertEqual(status.HTTP_200_OK, response.status_code)
         books = Book.objects.all().annotate(
             annotated_likes=Count(Case(When(userbookrelation__like=True, then=1)))
         ).order_by('pk')
         serializer_data = BooksSerializer(books, many=True).data
-        self.assertEqual(serializer_data, response.data)
+        self.assertEqual(serializer_data, response.data['results'])
+        self.assertEqual(JSONRenderer().render({'next': None, 'previous': None, 'results': serializer_data}),
+                         response.content)
         self.assertEqual(serializer_data[0]['rating'], '5.00')
         self.assertEqual(serializer_data[0]['annotated_likes'], 1)
 
@@ -43,7 +54,7 @@ class BookApiTestCase(APITestCase):
         response = self.client.get(url, data={'price': 22})
         serializer_data = BooksSerializer(books, many=True).data
         self.assertEqual(status.HTTP_200_OK, response.status_code)
-        self.assertEqual(serializer_data, response.data)
+        self.assertEqual(serializer_data, response.data['results'])
 
     def test_get_search(self):
         url = reverse('book-list')
@@ -53,7 +64,23 @@ class BookApiTestCase(APITestCase):
         response = self.client.get(url, data={'search': 'Book1'})
         self.assertEqual(status.HTTP_200_OK, response.status_code)
         serializer_data = BooksSerializer(books, many=True).data
-        self.assertEqual(serializer_data, response.data)
+        self.assertEqual(serializer_data, response.data['results'])
+
+    def test_get_search_with_ordering(self):
+        url = reverse('book-list')
+        response = self.client.get(url, data={'search': 'author1', 'ordering': '-price'})
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual([self.book2.pk, self.book1.pk], [book['pk'] for book in response.data['results']])
+
+    @skipUnless(connection.vendor == 'postgresql', 'Trigram ranking requires PostgreSQL')
+    def test_get_search_ranked(self):
+        url = reverse('book-list')
+        Book.objects.create(name='Another', price=1, author_name='Book1')
+        response = self.client.get(url, data={'search': 'Book1'})
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        pks = [book['pk'] for book in response.data['results']]
+        self.assertEqual(self.book1.pk, pks[0])
+        self.assertEqual(3, len(pks))
 
     def test_create(self):
         self.assertEqual(3, Book.objects.all().count())
@@ -128,6 +155,440 @@ class BookApiTestCase(APITestCase):
         self.assertEqual(2, Book.objects.all().count())
 
 
+class BookPaginationTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='test_username')
+        self.books = [
+            Book.objects.create(name=f'Book{i}', price=i % 4, author_name=f'author{i % 3}', owner=self.user)
+            for i in range(11)
+        ]
+
+    def walk_pages(self, data):
+        url = reverse('book-list')
+        pages = []
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url, data=data)
+            self.assertEqual(status.HTTP_200_OK, response.status_code)
+            self.assertEqual(3, len(queries))
+            for query in queries.captured_queries:
+                self.assertNotIn('OFFSET', query['sql'])
+                self.assertNotIn('COUNT(*)', query['sql'])
+            pages.append(response.data)
+            url, data = response.data['next'], None
+        return pages
+
+    def test_pages_by_pk(self):
+        pages = self.walk_pages({'page_size': 4})
+        self.assertEqual(3, len(pages))
+        self.assertIsNone(pages[0]['previous'])
+        pks = [book['pk'] for page in pages for book in page['results']]
+        self.assertEqual([book.pk for book in self.books], pks)
+
+    def test_pages_by_price_tie_breaking(self):
+        pages = self.walk_pages({'page_size': 3, 'ordering': '-price'})
+        pks = [book['pk'] for page in pages for book in page['results']]
+        expected = sorted(self.books, key=lambda book: (-book.price, book.pk))
+        self.assertEqual([book.pk for book in expected], pks)
+
+    def test_pages_by_author_name(self):
+        pages = self.walk_pages({'page_size': 2, 'ordering': 'author_name'})
+        pks = [book['pk'] for page in pages for book in page['results']]
+        expected = sorted(self.books, key=lambda book: (book.author_name, book.pk))
+        self.assertEqual([book.pk for book in expected], pks)
+
+    def test_previous(self):
+        url = reverse('book-list')
+        first = self.client.get(url, data={'page_size': 4, 'ordering': 'price'}).data
+        second = self.client.get(first['next']).data
+        back = self.client.get(second['previous']).data
+        self.assertEqual(first['results'], back['results'])
+        self.assertIsNone(back['previous'])
+
+    def test_invalid_cursor(self):
+        url = reverse('book-list')
+        response = self.client.get(url, data={'cursor': 'garbage'})
+        self.assertEqual(status.HTTP_404_NOT_FOUND, response.status_code)
+
+
+class BookFilterTestCase(APITestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.owner = User.objects.create(username='owner')
+        self.books = [
+            Book.objects.create(name='Book1', price=10, author_name='Tolkien', owner=self.owner),
+            Book.objects.create(name='Book2', price=20, author_name='Tolstoy', owner=self.owner),
+            Book.objects.create(name='Book3', price=30, author_name='Tolstoy'),
+            Book.objects.create(name='Book4', price=40, author_name='Pratchett'),
+        ]
+        Book.objects.filter(pk=self.books[1].pk).update(rating='4.50')
+        Book.objects.filter(pk=self.books[3].pk).update(rating='3.00')
+
+    def names(self, **params):
+        response = self.client.get(reverse('book-list'), data=params)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        return [book['name'] for book in response.data['results']]
+
+    def test_price_range(self):
+        self.assertEqual(['Book2', 'Book3'], self.names(price__gte=20, price__lte=30))
+        self.assertEqual(['Book4', 'Book3'], self.names(price__gte=30, ordering='-price'))
+        self.assertEqual(['Book2'], self.names(price=20))
+
+    def test_author(self):
+        self.assertEqual(['Book2', 'Book3'], self.names(author_name='Tolstoy'))
+        self.assertEqual(['Book1', 'Book2', 'Book3'], self.names(author_name__startswith='Tol', ordering='author_name'))
+        self.assertEqual([], self.names(author_name='Tol'))
+
+    def test_rating_and_owner(self):
+        self.assertEqual(['Book2', 'Book4'], self.names(rating__gte=3))
+        self.assertEqual(['Book2'], self.names(rating__gte=4, owner=self.owner.pk))
+        self.assertEqual(['Book1', 'Book2'], self.names(owner=self.owner.pk))
+
+    def test_invalid_value(self):
+        response = self.client.get(reverse('book-list'), data={'price__gte': 'cheap'})
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+        self.assertIn('price__gte', response.data)
+
+    def test_owner_filter_runs_no_user_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.names(owner=self.owner.pk)
+        self.assertFalse([query for query in queries if 'FROM "auth_user"' in query['sql']])
+
+    def test_indexes(self):
+        constraints = connection.introspection.get_constraints(connection.cursor(), Book._meta.db_table)
+        for name, columns in (('store_book_price_idx', ['price', 'id']),
+                              ('store_book_author_idx', ['author_name', 'id']),
+                              ('store_book_author_prefix_idx', ['author_name']),
+                              ('store_book_rating_idx', ['rating', 'id']),
+                              ('store_book_owner_idx', ['owner_id', 'id'])):
+            self.assertEqual(columns, constraints[name]['columns'])
+        # The composite owner index replaces the one of the foreign key
+        self.assertEqual(['store_book_owner_idx'], [name for name, constraint in constraints.items()
+                                                    if constraint['index'] and constraint['columns'][0] == 'owner_id'])
+
+    @skipUnless(connection.vendor == 'sqlite', 'SQLite query plans')
+    def test_sqlite_query_shape(self):
+        for params, index in (({'price__gte': 20, 'price__lte': 30, 'ordering': 'price'}, 'store_book_price_idx'),
+                              ({'price': 20}, 'store_book_price_idx'),
+                              ({'owner': self.owner.pk}, 'store_book_owner_idx')):
+            with CaptureQueriesContext(connection) as queries:
+                self.names(**params)
+            page_sql = queries.captured_queries[0]['sql']
+            self.assertNotIn('JOIN', page_sql)
+            with connection.cursor() as cursor:
+                cursor.execute('EXPLAIN QUERY PLAN ' + page_sql)
+                plan = ' '.join(row[-1] for row in cursor.fetchall())
+            self.assertIn(f'USING INDEX {index}', plan)
+            self.assertNotIn('TEMP B-TREE', plan)
+
+    @skipUnless(connection.vendor == 'postgresql', 'Index scans require PostgreSQL')
+    def test_postgres_index_scans(self):
+        from store.filters import BookFilterSet
+
+        for params, ordering, index in (
+                ({'price__gte': 20, 'price__lte': 30}, ('price', 'pk'), 'store_book_price_idx'),
+                ({'author_name': 'Tolstoy'}, ('author_name', 'pk'), 'store_book_author_idx'),
+                ({'author_name__startswith': 'Tol'}, (), 'store_book_author_prefix_idx'),
+                ({'rating__gte': 4}, (), 'store_book_rating_idx'),
+                ({'owner': self.owner.pk}, ('pk',), 'store_book_owner_idx')):
+            queryset = BookFilterSet(params, queryset=Book.objects.all()).qs.order_by(*ordering).values('pk')
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+                plan = queryset.explain()
+            self.assertIn(index, plan)
+            self.assertNotIn('Sort', plan)
+
+
+class BookReadersTestCase(APITestCase):
+    def setUp(self):
+        self.users = [User.objects.create(username=f'user{i}', first_name=f'first{i}') for i in range(15)]
+        self.book = Book.objects.create(name='Book1', price=11, author_name='author1')
+        for user in self.users:
+            UserBookRelation.objects.create(user=user, book=self.book)
+
+    def test_preview_is_capped(self):
+        response = self.client.get(reverse('book-detail', args=(self.book.pk,)))
+        self.assertEqual(15, response.data['readers_count'])
+        self.assertEqual([f'first{i}' for i in range(READERS_PREVIEW_SIZE)],
+                         [reader['first_name'] for reader in response.data['readers']])
+
+    def test_readers_pages(self):
+        url = reverse('book-readers', args=(self.book.pk,))
+        names = []
+        while url:
+            response = self.client.get(url, data={'page_size': 4} if not names else None)
+            self.assertEqual(status.HTTP_200_OK, response.status_code)
+            names += [reader['first_name'] for reader in response.data['results']]
+            url = response.data['next']
+        self.assertEqual([user.first_name for user in self.users], names)
+
+    def test_readers_not_found(self):
+        response = self.client.get(reverse('book-readers', args=(0,)))
+        self.assertEqual(status.HTTP_404_NOT_FOUND, response.status_code)
+
+
+class BookUserRelationFieldsTestCase(APITestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.user = User.objects.create(username='test_username')
+        self.other = User.objects.create(username='other_username')
+        self.books = [Book.objects.create(name=f'Book{i}', price=i, author_name='author') for i in range(3)]
+        UserBookRelation.objects.create(user=self.user, book=self.books[0], like=True, rate=4)
+        UserBookRelation.objects.create(user=self.user, book=self.books[1], in_bookmarks=True)
+        UserBookRelation.objects.create(user=self.other, book=self.books[2], like=True, rate=1)
+
+    def own_fields(self, book):
+        return book['my_like'], book['my_in_bookmarks'], book['my_rate']
+
+    def test_list(self):
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('book-list'))
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual([(True, False, 4), (False, True, None), (None, None, None)],
+                         [self.own_fields(book) for book in response.data['results']])
+        # session, user, page, missing fragments, readers preview
+        self.assertEqual(5, len(queries))
+
+    def test_query_count_independent_of_page_size(self):
+        for i in range(3, 10):
+            book = Book.objects.create(name=f'Book{i}', price=i, author_name='author')
+            UserBookRelation.objects.create(user=self.user, book=book, rate=3)
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('book-list'))
+        self.assertEqual(10, len(response.data['results']))
+        self.assertEqual(5, len(queries))
+
+    def test_detail(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('book-detail', args=(self.books[0].pk,)))
+        self.assertEqual((True, False, 4), self.own_fields(response.data))
+        list_response = self.client.get(reverse('book-list'))
+        self.assertEqual(response.data, list_response.data['results'][0])
+
+    def test_anonymous(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('book-list'))
+        self.assertEqual([(None, None, None)] * 3, [self.own_fields(book) for book in response.data['results']])
+        self.assertEqual(3, len(queries))
+        self.assertNotIn('store_userbookrelation', queries[0]['sql'])
+
+    def test_anonymous_cache_not_shared(self):
+        self.client.force_login(self.user)
+        self.client.get(reverse('book-list'))
+        self.client.logout()
+        response = self.client.get(reverse('book-list'))
+        self.assertEqual([(None, None, None)] * 3, [self.own_fields(book) for book in response.data['results']])
+
+
+class BookSparseFieldsetTestCase(APITestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.user = User.objects.create(username='test_username')
+        self.books = [Book.objects.create(name=f'Book{i}', price=10 - i, author_name='author', owner=self.user)
+                      for i in range(3)]
+        UserBookRelation.objects.create(user=self.user, book=self.books[0], like=True, rate=4)
+
+    def test_fields(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('book-list'), data={'fields': 'pk,name,price'})
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual([{'pk': book.pk, 'name': book.name, 'price': book.price} for book in self.books],
+                         response.data['results'])
+        # Page and missing fragments, no owner join and no readers preview query
+        self.assertEqual(2, len(queries))
+        for query in queries.captured_queries:
+            self.assertNotIn('JOIN', query['sql'])
+
+    def test_payload_size(self):
+        full = self.client.get(reverse('book-list'))
+        sparse = self.client.get(reverse('book-list'), data={'fields': 'pk,name,price'})
+        self.assertLess(len(sparse.content) * 3, len(full.content))
+
+    def test_exclude(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('book-list'), data={'exclude': 'readers,owner_name'})
+        book = response.data['results'][0]
+        self.assertNotIn('readers', book)
+        self.assertNotIn('owner_name', book)
+        self.assertEqual(1, book['annotated_likes'])
+        self.assertEqual(2, len(queries))
+
+    def test_fields_and_exclude(self):
+        response = self.client.get(reverse('book-list'), data={'fields': 'name,pk,price', 'exclude': 'price'})
+        self.assertEqual(['pk', 'name'], list(response.data['results'][0]))
+
+    def test_user_relation_join(self):
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('book-list'), data={'fields': 'pk,name'})
+        self.assertNotIn('store_userbookrelation', queries[2]['sql'])
+        self.assertEqual(4, len(queries))
+
+        response = self.client.get(reverse('book-list'), data={'fields': 'pk,my_rate'})
+        self.assertEqual({'pk': self.books[0].pk, 'my_rate': 4}, response.data['results'][0])
+
+    def test_detail(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('book-detail', args=(self.books[0].pk,)), data={'fields': 'pk,name'})
+        self.assertEqual({'pk': self.books[0].pk, 'name': 'Book0'}, response.data)
+        self.assertEqual(1, len(queries))
+        self.assertNotIn('JOIN', queries[0]['sql'])
+
+    def test_ordering_by_left_out_field(self):
+        pks, url = [], reverse('book-list') + '?fields=name&ordering=price&page_size=1'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(['name'], list(response.data['results'][0]))
+            pks.append(response.data['results'][0]['name'])
+            url = response.data['next']
+        self.assertEqual(['Book2', 'Book1', 'Book0'], pks)
+
+    def test_top(self):
+        response = self.client.get(reverse('book-top'), data={'by': 'likes', 'fields': 'name'})
+        self.assertEqual([{'name': 'Book0'}], response.data['results'])
+
+    def test_unknown_field(self):
+        response = self.client.get(reverse('book-list'), data={'fields': 'pk,secret', 'exclude': 'nope'})
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+        self.assertEqual({'fields': ['Unknown fields: secret.'], 'exclude': ['Unknown fields: nope.']},
+                         response.data)
+
+    def test_writes_keep_full_representation(self):
+        self.client.force_login(self.user)
+        url = reverse('book-detail', args=(self.books[0].pk,)) + '?fields=pk'
+        response = self.client.patch(url, data={'price': 5}, format='json')
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual(5, response.data['price'])
+
+
+@override_settings(BOOKS_TOP_MIN_VOTES=2, BOOKS_TOP_PRIOR_RATING=3.0)
+class BookTopTestCase(APITestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.users = [User.objects.create(username=f'user{i}') for i in range(3)]
+        self.books = [Book.objects.create(name=f'Book{i}', price=i, author_name='author') for i in range(4)]
+        # Two fives rank below three fours, a single five does not qualify
+        for user in self.users[:2]:
+            UserBookRelation.objects.create(user=user, book=self.books[0], rate=5, like=True)
+        for user in self.users:
+            UserBookRelation.objects.create(user=user, book=self.books[1], rate=5)
+        UserBookRelation.objects.create(user=self.users[0], book=self.books[2], rate=5, like=True)
+
+    def top(self, **params):
+        return self.client.get(reverse('book-top'), data=params)
+
+    def test_rating(self):
+        response = self.top(by='rating')
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual([self.books[1].pk, self.books[0].pk], [book['pk'] for book in response.data['results']])
+
+    def test_rating_is_default(self):
+        self.assertEqual(self.top(by='rating').data, self.top().data)
+
+    def test_likes(self):
+        response = self.top(by='likes')
+        self.assertEqual([self.books[0].pk, self.books[2].pk], [book['pk'] for book in response.data['results']])
+        self.assertEqual([2, 1], [book['annotated_likes'] for book in response.data['results']])
+
+    def test_follows_updates(self):
+        UserBookRelation.objects.create(user=self.users[1], book=self.books[2], rate=5)
+        UserBookRelation.objects.filter(book=self.books[0]).first().delete()
+        self.assertEqual([self.books[1].pk, self.books[2].pk],
+                         [book['pk'] for book in self.top(by='rating').data['results']])
+        self.assertEqual([self.books[0].pk, self.books[2].pk],
+                         [book['pk'] for book in self.top(by='likes').data['results']])
+
+    def test_pages(self):
+        for book in self.books:
+            for user in self.users[:2]:
+                UserBookRelation.objects.update_or_create(user=user, book=book, defaults={'like': True})
+        pks, url = [], reverse('book-top') + '?by=likes&page_size=1'
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            # page, readers preview
+            self.assertEqual(2, len(queries))
+            self.assertNotIn('OFFSET', queries[0]['sql'])
+            pks += [book['pk'] for book in response.data['results']]
+            url = response.data['next']
+        self.assertEqual([book.pk for book in self.books], pks)
+
+    def test_invalid(self):
+        response = self.top(by='price')
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+        self.assertIn('by', response.data)
+
+
+class UserBookListTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='test_username')
+        self.other = User.objects.create(username='other_username')
+        self.books = [Book.objects.create(name=f'Book{i}', price=i, author_name='author') for i in range(4)]
+        UserBookRelation.objects.create(user=self.user, book=self.books[0], like=True, rate=4)
+        UserBookRelation.objects.create(user=self.user, book=self.books[1], in_bookmarks=True)
+        UserBookRelation.objects.create(user=self.user, book=self.books[2], like=True, in_bookmarks=True)
+        UserBookRelation.objects.create(user=self.user, book=self.books[3], rate=2)
+        UserBookRelation.objects.create(user=self.other, book=self.books[1], like=True)
+
+    def test_likes(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('me-likes'))
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual([self.books[0].pk, self.books[2].pk], [book['pk'] for book in response.data['results']])
+        self.assertEqual([True, True], [book['my_like'] for book in response.data['results']])
+
+    def test_bookmarks(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('me-bookmarks'))
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual([self.books[1].pk, self.books[2].pk], [book['pk'] for book in response.data['results']])
+        self.assertEqual(2, response.data['results'][0]['readers_count'])
+
+    def test_same_representation_as_book_list(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('me-likes'))
+        books = self.client.get(reverse('book-list')).data['results']
+        self.assertEqual([books[0], books[2]], response.data['results'])
+
+    def test_pages(self):
+        for i in range(4, 9):
+            book = Book.objects.create(name=f'Book{i}', price=i, author_name='author')
+            UserBookRelation.objects.create(user=self.user, book=book, like=True)
+        self.client.force_login(self.user)
+        pks = []
+        url = reverse('me-likes') + '?page_size=3'
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            # session, user, page, readers preview
+            self.assertEqual(4, len(queries))
+            self.assertNotIn('OFFSET', queries[2]['sql'])
+            self.assertNotIn('COUNT(', queries[2]['sql'])
+            pks += [book['pk'] for book in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(sorted(pks), pks)
+        self.assertEqual(7, len(pks))
+
+    def test_partial_indexes(self):
+        constraints = connection.introspection.get_constraints(connection.cursor(), UserBookRelation._meta.db_table)
+        for name in ('store_ubr_user_likes_idx', 'store_ubr_user_bookmarks_idx'):
+            self.assertEqual(['user_id', 'book_id'], constraints[name]['columns'])
+
+    @skipUnless(connection.vendor == 'postgresql', 'Partial index plans require PostgreSQL')
+    def test_uses_partial_index(self):
+        queryset = UserBookRelation.objects.filter(user=self.user, in_bookmarks=True).values('book_id')
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            self.assertIn('store_ubr_user_bookmarks_idx', queryset.explain())
+
+    def test_anonymous(self):
+        for name in ('me-likes', 'me-bookmarks'):
+            response = self.client.get(reverse(name))
+            self.assertEqual(status.HTTP_403_FORBIDDEN, response.status_code)
+
+
 class UserBookRelationViewTestCase(APITestCase):
     def setUp(self):
         self.user = User.objects.create(username='test_username')
@@ -149,6 +610,8 @@ class UserBookRelationViewTestCase(APITestCase):
         self.assertEqual(status.HTTP_200_OK, response.status_code)
         relation = UserBookRelation.objects.get(user=self.user, book=self.book1)
         self.assertTrue(relation.like)
+        self.book1.refresh_from_db()
+        self.assertEqual(1, self.book1.likes_count)
 
     def test_in_bookmarks(self):
         url = reverse('userbookrelation-detail', args=(self.book1.id,))
@@ -189,5 +652,192 @@ class UserBookRelationViewTestCase(APITestCase):
 
         response = self.client.patch(url, data=json_data, content_type='application/json')
         self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code, response.data)
+        # The relation is only inserted together with valid values
+        self.assertFalse(UserBookRelation.objects.filter(user=self.user, book=self.book1).exists())
+
+    def test_first_patch_inserts_once(self):
+        url = reverse('userbookrelation-detail', args=(self.book1.id,))
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(url, data=json.dumps({'like': True, 'rate': 4}),
+                                         content_type='application/json')
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual(self.book1.pk, response.data['book'])
+        writes = [query['sql'].split(' ', 2)[:2] for query in queries
+                  if query['sql'].startswith(('INSERT', 'UPDATE'))]
+        self.assertEqual([['INSERT', 'INTO'], ['UPDATE', '"store_book"']], writes)
+        self.book1.refresh_from_db()
+        self.assertEqual((1, 1, 4), (self.book1.readers_count, self.book1.likes_count, self.book1.rating_sum))
+
+    # The competing insert and the retry run on top of the budgeted queries
+    @override_settings(BOOKS_QUERY_BUDGET_STRICT=False)
+    def test_lost_insert_race_is_retried(self):
+        url = reverse('userbookrelation-detail', args=(self.book1.id,))
+        get_object = UserBookRelationView.get_object
+        calls = []
+
+        def racing_get_object(view):
+            # The first lookup ran before another request inserted the relation
+            obj = get_object(view) if calls else UserBookRelation(user=self.user, book=self.book1)
+            calls.append(obj.pk)
+            return obj
+
+        UserBookRelation.objects.create(user=self.user, book=self.book1, like=True, rate=2)
+        self.client.force_login(self.user)
+        with mock.patch.object(UserBookRelationView, 'get_object', racing_get_object):
+            response = self.client.patch(url, data=json.dumps({'rate': 5}), content_type='application/json')
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertIsNone(calls[0])
+        self.assertIsNotNone(calls[1])
         relation = UserBookRelation.objects.get(user=self.user, book=self.book1)
-        self.assertEqual(None, relation.rate)
+        self.assertEqual((True, 5), (relation.like, relation.rate))
+        self.book1.refresh_from_db()
+        self.assertEqual((1, 1, 5), (self.book1.readers_count, self.book1.likes_count, self.book1.rating_sum))
+
+    def test_unknown_book(self):
+        self.client.force_login(self.user)
+        response = self.client.patch(reverse('userbookrelation-detail', args=('abc',)), data=json.dumps({'like': True}),
+                                     content_type='application/json')
+        self.assertEqual(status.HTTP_404_NOT_FOUND, response.status_code)
+
+    def test_repeated_patch_keeps_one_relation(self):
+        url = reverse('userbookrelation-detail', args=(self.book1.id,))
+        self.client.force_login(self.user)
+        for rate in (3, 4):
+            response = self.client.patch(url, data=json.dumps({'rate': rate}), content_type='application/json')
+            self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual(4, UserBookRelation.objects.get(user=self.user, book=self.book1).rate)
+        self.book1.refresh_from_db()
+        self.assertEqual((1, 4), (self.book1.readers_count, self.book1.rating_sum))
+
+    def test_unique_user_book(self):
+        UserBookRelation.objects.create(user=self.user, book=self.book1)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            UserBookRelation.objects.create(user=self.user, book=self.book1, like=True)
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class UserBookRelationConcurrencyTestCase(TransactionTestCase):
+    threads = 8
+
+    def setUp(self):
+        self.user = User.objects.create(username='test_username')
+        self.book = Book.objects.create(name='Book1', price=11, author_name='author1')
+
+    def test_concurrent_patches(self):
+        url = reverse('userbookrelation-detail', args=(self.book.id,))
+        barrier = Barrier(self.threads)
+        statuses = []
+
+        def patch(rate):
+            try:
+                client = APIClient()
+                client.force_authenticate(self.user)
+                barrier.wait()
+                response = client.patch(url, data=json.dumps({'like': True, 'rate': rate}),
+                                        content_type='application/json')
+                statuses.append(response.status_code)
+            finally:
+                connections.close_all()
+
+        workers = [Thread(target=patch, args=(rate % 5 + 1,)) for rate in range(self.threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual([status.HTTP_200_OK] * self.threads, statuses)
+        relation = UserBookRelation.objects.get(user=self.user, book=self.book)
+        self.book.refresh_from_db()
+        self.assertEqual((1, 1, 1), (self.book.readers_count, self.book.likes_count, self.book.rating_count))
+        self.assertEqual(relation.rate, self.book.rating_sum)
+
+
+class UserBookRelationBulkTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='test_username')
+        self.user2 = User.objects.create(username='test_username2')
+        self.books = [Book.objects.create(name=f'Book{i}', price=i, author_name='author') for i in range(20)]
+        UserBookRelation.objects.create(user=self.user2, book=self.books[0], like=True, rate=2)
+        UserBookRelation.objects.create(user=self.user, book=self.books[1], in_bookmarks=True, rate=1)
+        self.url = reverse('userbookrelation-bulk')
+
+    def post(self, items):
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, data=json.dumps(items), content_type='application/json')
+        return response, len(queries)
+
+    def test_upsert(self):
+        items = [
+            {'book': self.books[0].pk, 'like': True, 'rate': 4},
+            {'book': self.books[1].pk, 'like': True},
+            {'book': self.books[2].pk, 'in_bookmarks': True},
+        ]
+        response, _ = self.post(items)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual([
+            {'book': self.books[0].pk, 'like': True, 'in_bookmarks': False, 'rate': 4},
+            {'book': self.books[1].pk, 'like': True, 'in_bookmarks': True, 'rate': 1},
+            {'book': self.books[2].pk, 'like': False, 'in_bookmarks': True, 'rate': None},
+        ], response.data)
+        self.assertEqual(4, UserBookRelation.objects.count())
+
+        self.books[0].refresh_from_db()
+        self.books[1].refresh_from_db()
+        self.assertEqual(('3.00', 2), (str(self.books[0].rating), self.books[0].likes_count))
+        self.assertEqual(('1.00', 1), (str(self.books[1].rating), self.books[1].likes_count))
+
+    @override_settings(BOOKS_QUERY_BUDGET_STRICT=False)
+    def test_lost_insert_race_keeps_unsent_fields(self):
+        select_for_update = UserBookRelation.objects.select_for_update
+        calls = []
+
+        def racing_select_for_update():
+            # The first lock ran before another request inserted its relation to books[2]
+            queryset = select_for_update()
+            if not calls:
+                queryset = queryset.exclude(book=self.books[2])
+            calls.append(queryset)
+            return queryset
+
+        UserBookRelation.objects.create(user=self.user, book=self.books[2], like=True, rate=2)
+        with mock.patch.object(UserBookRelation.objects, 'select_for_update', racing_select_for_update):
+            response, _ = self.post([{'book': self.books[2].pk, 'in_bookmarks': True}])
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual(2, len(calls))
+        self.assertEqual([{'book': self.books[2].pk, 'like': True, 'in_bookmarks': True, 'rate': 2}], response.data)
+        relation = UserBookRelation.objects.get(user=self.user, book=self.books[2])
+        self.assertEqual((True, True, 2), (relation.like, relation.in_bookmarks, relation.rate))
+        self.books[2].refresh_from_db()
+        self.assertEqual((1, 1, 2), (self.books[2].readers_count, self.books[2].likes_count, self.books[2].rating_sum))
+
+    def test_errors(self):
+        items = [
+            {'book': self.books[0].pk, 'rate': 123},
+            {'book': 0, 'like': True},
+            {'like': True},
+            {'book': self.books[3].pk, 'rate': 5},
+        ]
+        response, _ = self.post(items)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertIn('rate', response.data[0]['errors'])
+        self.assertEqual({'book': ['Book not found.']}, response.data[1]['errors'])
+        self.assertIn('book', response.data[2]['errors'])
+        self.assertEqual(5, response.data[3]['rate'])
+        self.assertEqual(3, UserBookRelation.objects.count())
+
+    def test_query_count_independent_of_batch_size(self):
+        _, small = self.post([{'book': book.pk, 'like': True} for book in self.books[:3]])
+        _, large = self.post([{'book': book.pk, 'like': True, 'rate': 3} for book in self.books])
+        self.assertEqual(small, large)
+        self.assertLessEqual(large, 11)
+        self.assertEqual(20, UserBookRelation.objects.filter(user=self.user, like=True).count())
+
+    def test_not_a_list(self):
+        response, _ = self.post({'book': self.books[0].pk})
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+
+    def test_anonymous(self):
+        response = self.client.post(self.url, data='[]', content_type='application/json')
+        self.assertEqual(status.HTTP_403_FORBIDDEN, response.status_code)
@@ -0,0 +1,136 @@
+import json
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+
+from store.cache import get_cache
+from store.models import Book, UserBookRelation
+
+
+class AsyncBookApiTestCase(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.user = User.objects.create(username='test_username', first_name='Ivan', last_name='Petrov')
+        self.book1 = Book.objects.create(name='Test book 1', price=25, author_name='Author 1', owner=self.user)
+        self.book2 = Book.objects.create(name='Test book 2', price=55, author_name='Author 5')
+        self.book3 = Book.objects.create(name='Test book Author 1', price=55, author_name='Author 2')
+        UserBookRelation.objects.create(user=self.user, book=self.book1, like=True, rate=5)
+
+    async def assertSameAsSync(self, sync_url, async_url, params=None):
+        sync_response = await self.async_client.get(sync_url, params or {})
+        async_response = await self.async_client.get(async_url, params or {})
+        self.assertEqual(sync_response.status_code, async_response.status_code)
+        self.assertEqual(sync_response['Content-Type'], async_response['Content-Type'])
+        sync_content = sync_response.content.decode().replace(sync_url, async_url)
+        self.assertEqual(json.loads(sync_content), json.loads(async_response.content))
+        return async_response
+
+    async def test_list(self):
+        for params in ({}, {'price': 55}, {'search': 'Author 1'}, {'ordering': '-price'},
+                       {'ordering': 'author_name', 'page_size': 1}):
+            with self.subTest(params=params):
+                await self.assertSameAsSync(reverse('book-list'), reverse('async-book-list'), params)
+
+    async def test_list_cursor(self):
+        response = await self.async_client.get(reverse('async-book-list'), {'page_size': 2, 'ordering': '-price'})
+        next_link = json.loads(response.content)['next']
+        self.assertIn(reverse('async-book-list'), next_link)
+        response = await self.async_client.get(next_link)
+        self.assertEqual([self.book1.pk], [book['pk'] for book in json.loads(response.content)['results']])
+
+    def test_list_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = async_to_sync(self.async_client.get)(reverse('async-book-list'))
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        # page, missing fragments, readers preview
+        self.assertEqual(3, len(queries))
+        self.assertEqual('MISS', response['X-Cache'])
+
+        with CaptureQueriesContext(connection) as queries:
+            cached = async_to_sync(self.async_client.get)(reverse('async-book-list'))
+        self.assertEqual(0, len(queries))
+        self.assertEqual('HIT', cached['X-Cache'])
+        self.assertEqual(response.content, cached.content)
+
+    def test_list_fragments(self):
+        self.async_client.force_login(self.user)
+        async_to_sync(self.async_client.get)(reverse('async-book-list'))
+        with CaptureQueriesContext(connection) as queries:
+            response = async_to_sync(self.async_client.get)(reverse('async-book-list'))
+        self.assertFalse(response.has_header('X-Cache'))
+        # session, user, page
+        self.assertEqual(3, len(queries))
+        self.assertEqual(5, json.loads(response.content)['results'][0]['my_rate'])
+
+    @override_settings(BOOKS_CACHE_TIMEOUT=0)
+    def test_list_conditional(self):
+        # The async test client of Django 4.1 drops HTTP_* extras, the sync one reaches the async view as well
+        for fragment_timeout in (3600, 0):
+            with self.subTest(fragment_timeout=fragment_timeout), override_settings(BOOKS_FRAGMENT_TIMEOUT=fragment_timeout):
+                sync_etag = self.client.get(reverse('book-list'))['ETag']
+                etag = self.client.get(reverse('async-book-list'))['ETag']
+                self.assertNotEqual(sync_etag, etag)
+                response = self.client.get(reverse('async-book-list'), HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(status.HTTP_304_NOT_MODIFIED, response.status_code)
+                self.assertEqual(b'', response.content)
+
+                Book.objects.filter(pk=self.book2.pk).update(name=f'Renamed {fragment_timeout}', updated_at=timezone.now())
+                response = self.client.get(reverse('async-book-list'), HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(status.HTTP_200_OK, response.status_code)
+                self.assertEqual(f'Renamed {fragment_timeout}', response.json()['results'][1]['name'])
+
+    async def test_list_bad_cursor(self):
+        await self.assertSameAsSync(reverse('book-list'), reverse('async-book-list'), {'cursor': 'bad'})
+
+    async def test_detail(self):
+        for pk in (self.book1.pk, 0, 'abc'):
+            with self.subTest(pk=pk):
+                await self.assertSameAsSync(reverse('book-detail', args=(pk,)),
+                                            reverse('async-book-detail', args=(pk,)))
+
+    async def test_readers(self):
+        await self.assertSameAsSync(reverse('book-readers', args=(self.book1.pk,)),
+                                    reverse('async-book-readers', args=(self.book1.pk,)))
+
+    def test_authenticated(self):
+        self.async_client.force_login(self.user)
+        sync_response = async_to_sync(self.async_client.get)(reverse('book-list'))
+        async_response = async_to_sync(self.async_client.get)(reverse('async-book-list'))
+        self.assertEqual(json.loads(sync_response.content), json.loads(async_response.content))
+        self.assertEqual(5, json.loads(async_response.content)['results'][0]['my_rate'])
+
+    async def test_method_not_allowed(self):
+        response = await self.async_client.post(reverse('async-book-list'), {'name': 'Book'})
+        self.assertEqual(status.HTTP_405_METHOD_NOT_ALLOWED, response.status_code)
+        self.assertEqual({'detail': 'Method "POST" not allowed.'}, json.loads(response.content))
+
+
+class AsyncUserBookRelationTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='test_username')
+        self.other = User.objects.create(username='other_username')
+        self.book = Book.objects.create(name='Test book 1', price=25, author_name='Author 1')
+        UserBookRelation.objects.create(user=self.user, book=self.book, like=True, rate=4)
+
+    async def test_anonymous(self):
+        response = await self.async_client.get(reverse('async-book-relation-detail', args=(self.book.pk,)))
+        self.assertEqual(status.HTTP_403_FORBIDDEN, response.status_code)
+
+    def test_get(self):
+        self.async_client.force_login(self.user)
+        response = async_to_sync(self.async_client.get)(reverse('async-book-relation-detail', args=(self.book.pk,)))
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        expected_data = {'book': self.book.pk, 'like': True, 'in_bookmarks': False, 'rate': 4}
+        self.assertEqual(expected_data, json.loads(response.content))
+
+    def test_missing(self):
+        self.async_client.force_login(self.other)
+        response = async_to_sync(self.async_client.get)(reverse('async-book-relation-detail', args=(self.book.pk,)))
+        self.assertEqual(status.HTTP_404_NOT_FOUND, response.status_code)
+        self.assertFalse(UserBookRelation.objects.filter(user=self.other).exists())
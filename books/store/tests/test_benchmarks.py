@@ -0,0 +1,68 @@
+from collections import Counter
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+
+from benchmarks.data import generate_catalog
+from benchmarks.runner import compare, percentile, run_benchmark
+from benchmarks.scenarios import SCENARIOS
+from store.models import Book, UserBookRelation
+
+
+def snapshot():
+    books = list(Book.objects.order_by('pk').values_list('name', 'price', 'author_name', 'owner__username'))
+    relations = sorted(UserBookRelation.objects.values_list('user__username', 'book__name', 'like', 'rate'))
+    return books, relations
+
+
+class GenerateCatalogTestCase(TestCase):
+    def test_counts(self):
+        generate_catalog(books=50, users=20, relations=300, seed=1)
+        self.assertEqual(50, Book.objects.count())
+        self.assertEqual(20, User.objects.count())
+        self.assertEqual(300, UserBookRelation.objects.count())
+        self.assertEqual(300, sum(Book.objects.values_list('readers_count', flat=True)))
+
+    def test_seeded(self):
+        generate_catalog(books=30, users=10, relations=100, seed=7)
+        first = snapshot()
+        User.objects.all().delete()
+        Book.objects.all().delete()
+        generate_catalog(books=30, users=10, relations=100, seed=7)
+        self.assertEqual(first, snapshot())
+
+    def test_skew(self):
+        generate_catalog(books=100, users=100, relations=1000, seed=3)
+        readers = Counter(UserBookRelation.objects.values_list('book_id', flat=True))
+        top_decile = sum(count for book_id, count in readers.most_common(10))
+        self.assertGreater(top_decile, 300)
+
+
+class RunBenchmarkTestCase(TestCase):
+    @override_settings(BOOKS_CACHE_TIMEOUT=0)
+    def test_run(self):
+        generate_catalog(books=30, users=10, relations=100, seed=0)
+        results = run_benchmark(SCENARIOS, count=3)
+        self.assertEqual([scenario.name for scenario in SCENARIOS], list(results))
+        for name, result in results.items():
+            with self.subTest(scenario=name):
+                self.assertEqual(0, result['errors'])
+                self.assertGreater(result['queries_per_request'], 0)
+                self.assertGreater(result['peak_memory_kb'], 0)
+        self.assertGreater(results['list']['fragment_hit_ratio'], 0)
+        self.assertIsNone(results['detail']['fragment_hit_ratio'])
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(50, percentile(values, 0.5))
+        self.assertEqual(95, percentile(values, 0.95))
+        self.assertEqual(7, percentile([7], 0.95))
+
+    def test_compare(self):
+        base = {'scenarios': {'list': {'p50_ms': 5, 'p95_ms': 10, 'queries_per_request': 2, 'peak_memory_kb': 100}}}
+        slower = {'scenarios': {'list': {'p50_ms': 5, 'p95_ms': 10.5, 'queries_per_request': 2, 'peak_memory_kb': 100}}}
+        more_queries = {'scenarios': {'list': {'p50_ms': 5, 'p95_ms': 10, 'queries_per_request': 3,
+                                               'peak_memory_kb': 100}}}
+        self.assertFalse(compare(base, slower)[1])
+        self.assertTrue(compare(base, slower, threshold=1)[1])
+        self.assertTrue(compare(base, more_queries)[1])
@@ -0,0 +1,177 @@
+import json
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from store.cache import cache_stats, fragment_stats, get_cache, get_generation
+from store.models import Book, UserBookRelation
+
+
+class BookResponseCacheTestCase(APITestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.user = User.objects.create(username='test_username')
+        self.book1 = Book.objects.create(name='Book1', price=11, author_name='author1', owner=self.user)
+        self.book2 = Book.objects.create(name='Book2', price=22, author_name='author2')
+
+    def test_list_hit(self):
+        url = reverse('book-list')
+        response = self.client.get(url, data={'price': 22, 'ordering': 'price'})
+        self.assertEqual('MISS', response['X-Cache'])
+        with CaptureQueriesContext(connection) as queries:
+            cached = self.client.get(url + '?ordering=price&price=22')
+        self.assertEqual(0, len(queries))
+        self.assertEqual('HIT', cached['X-Cache'])
+        self.assertEqual(response.data, cached.data)
+        self.assertEqual({'hits': 1, 'misses': 1}, cache_stats())
+
+    def test_different_params_miss(self):
+        url = reverse('book-list')
+        self.client.get(url, data={'price': 22})
+        response = self.client.get(url, data={'price': 11})
+        self.assertEqual('MISS', response['X-Cache'])
+        self.assertEqual([self.book1.pk], [book['pk'] for book in response.data['results']])
+
+    def test_rating_change_invalidates(self):
+        list_url = reverse('book-list')
+        detail_url = reverse('book-detail', args=(self.book1.pk,))
+        self.assertIsNone(self.client.get(list_url).data['results'][0]['rating'])
+        self.assertIsNone(self.client.get(detail_url).data['rating'])
+        generation = get_generation()
+
+        self.client.force_login(self.user)
+        relation_url = reverse('userbookrelation-detail', args=(self.book1.pk,))
+        response = self.client.patch(relation_url, data=json.dumps({'rate': 4}), content_type='application/json')
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.client.logout()
+
+        self.assertGreater(get_generation(), generation)
+        response = self.client.get(list_url)
+        self.assertEqual('MISS', response['X-Cache'])
+        self.assertEqual('4.00', response.data['results'][0]['rating'])
+        self.assertEqual('4.00', self.client.get(detail_url).data['rating'])
+
+    def test_like_and_book_edit_invalidate(self):
+        url = reverse('book-detail', args=(self.book2.pk,))
+        self.client.get(url)
+        UserBookRelation.objects.create(user=self.user, book=self.book2, like=True)
+        self.assertEqual(1, self.client.get(url).data['annotated_likes'])
+
+        self.book2.name = 'Renamed'
+        self.book2.save()
+        self.assertEqual('Renamed', self.client.get(url).data['name'])
+
+    def test_bookmark_keeps_cache(self):
+        url = reverse('book-list')
+        relation = UserBookRelation.objects.create(user=self.user, book=self.book1)
+        self.client.get(url)
+        relation.in_bookmarks = True
+        relation.save()
+        self.assertEqual('HIT', self.client.get(url)['X-Cache'])
+
+    def test_owner_rename_invalidates(self):
+        url = reverse('book-detail', args=(self.book1.pk,))
+        self.client.get(url)
+        self.user.username = 'renamed_username'
+        self.user.save()
+        response = self.client.get(url)
+        self.assertEqual('MISS', response['X-Cache'])
+        self.assertEqual('renamed_username', response.data['owner_name'])
+
+    def test_authenticated_not_cached(self):
+        url = reverse('book-list')
+        self.client.force_login(self.user)
+        self.client.get(url)
+        response = self.client.get(url)
+        self.assertFalse(response.has_header('X-Cache'))
+
+
+@override_settings(BOOKS_CACHE_TIMEOUT=0)
+class BookFragmentCacheTestCase(APITestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.user = User.objects.create(username='test_username', first_name='first')
+        self.other = User.objects.create(username='other_username')
+        self.books = [Book.objects.create(name=f'Book{i}', price=i, author_name='author', owner=self.user)
+                      for i in range(4)]
+        UserBookRelation.objects.create(user=self.user, book=self.books[0], like=True, rate=4)
+        self.url = reverse('book-list')
+
+    def test_warm_page(self):
+        cold = self.client.get(self.url)
+        with CaptureQueriesContext(connection) as queries:
+            warm = self.client.get(self.url)
+        self.assertEqual(1, len(queries))
+        self.assertEqual(cold.content, warm.content)
+        self.assertEqual({'hits': 4, 'misses': 4}, fragment_stats())
+
+    def test_write_refreshes_one_fragment(self):
+        self.client.get(self.url)
+        UserBookRelation.objects.create(user=self.other, book=self.books[2], like=True)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual(1, response.data['results'][2]['annotated_likes'])
+        self.assertEqual(1, response.data['results'][2]['readers_count'])
+        # page, the one missing fragment, its readers preview
+        self.assertEqual(3, len(queries))
+        self.assertIn(f'IN ({self.books[2].pk})', queries[1]['sql'])
+        self.assertEqual({'hits': 3, 'misses': 5}, fragment_stats())
+
+    def test_user_rename_refreshes_fragments(self):
+        UserBookRelation.objects.create(user=self.other, book=self.books[3])
+        self.client.get(self.url)
+        self.user.first_name = 'renamed'
+        self.user.save()
+        response = self.client.get(self.url)
+        self.assertEqual('renamed', response.data['results'][0]['readers'][0]['first_name'])
+        self.assertEqual({'hits': 0, 'misses': 8}, fragment_stats())
+
+        # Saves that leave the names alone keep the fragments
+        self.other.save(update_fields=['last_login'])
+        self.other.save()
+        self.client.get(self.url)
+        self.assertEqual({'hits': 4, 'misses': 8}, fragment_stats())
+
+        self.user.delete()
+        response = self.client.get(self.url)
+        self.assertEqual([''] * 4, [book['owner_name'] for book in response.data['results']])
+
+    def test_own_relation_not_cached(self):
+        self.client.get(self.url)
+        self.client.force_login(self.user)
+        response = self.client.get(self.url)
+        self.assertEqual([True, None, None, None], [book['my_like'] for book in response.data['results']])
+        self.client.force_login(self.other)
+        response = self.client.get(self.url)
+        self.assertEqual([None] * 4, [book['my_like'] for book in response.data['results']])
+        self.assertEqual({'hits': 8, 'misses': 4}, fragment_stats())
+
+    def test_same_as_uncached(self):
+        self.client.force_login(self.user)
+        params = {'ordering': '-price', 'page_size': 3}
+        self.client.get(self.url, data=params)
+        stitched = self.client.get(self.url, data=params)
+        with override_settings(BOOKS_FRAGMENT_TIMEOUT=0):
+            rendered = self.client.get(self.url, data=params)
+        self.assertEqual(rendered.content, stitched.content)
+
+    def test_fieldsets_cached_apart(self):
+        self.client.get(self.url, data={'fields': 'pk,name'})
+        response = self.client.get(self.url)
+        self.assertIn('price', response.data['results'][0])
+        self.assertEqual({'hits': 0, 'misses': 8}, fragment_stats())
+
+    def test_conditional_miss_fetches_page_once(self):
+        etag = self.client.get(self.url)['ETag']
+        self.books[1].name = 'Renamed'
+        self.books[1].save()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual('Renamed', response.data['results'][1]['name'])
+        self.assertEqual(3, len(queries))
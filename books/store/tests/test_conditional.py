@@ -0,0 +1,118 @@
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.http import http_date
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from store.cache import get_cache
+from store.models import Book, UserBookRelation
+
+
+class ConditionalGetTestCase(APITestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.user = User.objects.create(username='test_username')
+        self.book1 = Book.objects.create(name='Test book 1', price=25, author_name='Author 1', owner=self.user)
+        self.book2 = Book.objects.create(name='Test book 2', price=55, author_name='Author 5')
+        self.list_url = reverse('book-list')
+        self.detail_url = reverse('book-detail', args=(self.book1.pk,))
+
+    def get(self, url, **headers):
+        get_cache().clear()
+        return self.client.get(url, **headers)
+
+    def test_list_validators(self):
+        response = self.get(self.list_url)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertTrue(response['ETag'].startswith('W/"'))
+        self.book2.refresh_from_db()
+        self.assertEqual(http_date(self.book2.updated_at.timestamp()), response['Last-Modified'])
+
+    def test_list_not_modified(self):
+        etag = self.get(self.list_url)['ETag']
+        with CaptureQueriesContext(connection) as queries:
+            response = self.get(self.list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(status.HTTP_304_NOT_MODIFIED, response.status_code)
+        self.assertEqual(b'', response.content)
+        self.assertEqual(etag, response['ETag'])
+        self.assertEqual(1, len(queries))
+        self.assertNotIn('"name"', queries[0]['sql'])
+
+    def test_list_params_change_etag(self):
+        etag = self.get(self.list_url)['ETag']
+        response = self.get(self.list_url + '?price=55', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertNotEqual(etag, response['ETag'])
+
+    def test_list_modified(self):
+        etag = self.get(self.list_url)['ETag']
+        self.book2.price = 60
+        self.book2.save()
+        response = self.get(self.list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+
+    def test_list_deleted(self):
+        etag = self.get(self.list_url)['ETag']
+        self.book1.delete()
+        response = self.get(self.list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+
+    def test_list_ignores_if_modified_since(self):
+        last_modified = self.get(self.list_url)['Last-Modified']
+        self.book1.delete()
+        response = self.get(self.list_url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+
+    def test_detail_not_modified(self):
+        response = self.get(self.detail_url)
+        for headers in ({'HTTP_IF_NONE_MATCH': response['ETag']}, {'HTTP_IF_MODIFIED_SINCE': response['Last-Modified']}):
+            with self.subTest(headers=headers), CaptureQueriesContext(connection) as queries:
+                not_modified = self.get(self.detail_url, **headers)
+            self.assertEqual(status.HTTP_304_NOT_MODIFIED, not_modified.status_code)
+            self.assertEqual(response['ETag'], not_modified['ETag'])
+            self.assertEqual(1, len(queries))
+
+    def test_detail_relation_change(self):
+        etag = self.get(self.detail_url)['ETag']
+        UserBookRelation.objects.create(user=self.user, book=self.book1, like=True)
+        response = self.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual(1, response.data['annotated_likes'])
+
+    def test_detail_missing(self):
+        etag = self.get(self.detail_url)['ETag']
+        self.book1.delete()
+        response = self.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(status.HTTP_404_NOT_FOUND, response.status_code)
+
+    def test_cached_not_modified(self):
+        etag = self.client.get(self.list_url)['ETag']
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(status.HTTP_304_NOT_MODIFIED, response.status_code)
+        self.assertEqual('HIT', response['X-Cache'])
+        self.assertEqual(0, len(queries))
+
+    def test_cached_validators(self):
+        response = self.client.get(self.detail_url)
+        cached = self.client.get(self.detail_url)
+        self.assertEqual('HIT', cached['X-Cache'])
+        self.assertEqual(response['ETag'], cached['ETag'])
+        self.assertEqual(response['Last-Modified'], cached['Last-Modified'])
+
+    def test_own_relation_changes_etag(self):
+        self.client.force_login(self.user)
+        etag = self.client.get(self.list_url)['ETag']
+        self.client.patch(reverse('userbookrelation-detail', args=(self.book2.pk,)), {'in_bookmarks': True},
+                          format='json')
+        response = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertTrue(response.data['results'][1]['my_in_bookmarks'])
+
+    def test_authenticated(self):
+        self.client.force_login(self.user)
+        etag = self.client.get(self.list_url)['ETag']
+        response = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(status.HTTP_304_NOT_MODIFIED, response.status_code)
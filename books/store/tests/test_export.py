@@ -0,0 +1,85 @@
+import csv
+import json
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from store.models import Book, UserBookRelation
+
+
+class BookExportTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='test_username')
+        self.staff = User.objects.create(username='staff', is_staff=True)
+        self.book1 = Book.objects.create(name='Book1', price=11, author_name='author1', owner=self.user)
+        self.book2 = Book.objects.create(name='Book2', price=22, author_name='author2')
+        self.book3 = Book.objects.create(name='Book3', price=33, author_name='author3')
+        UserBookRelation.objects.create(user=self.user, book=self.book1, like=True, rate=4)
+        self.url = reverse('book-export')
+
+    def get_lines(self, **params):
+        self.client.force_login(self.staff)
+        response = self.client.get(self.url, data=params)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode().splitlines()
+
+    def test_ndjson(self):
+        rows = [json.loads(line) for line in self.get_lines()]
+        self.assertEqual([self.book1.pk, self.book2.pk, self.book3.pk], [row['pk'] for row in rows])
+        self.assertEqual({'likes': 1, 'rating': '4.00', 'owner': 'test_username', 'readers_count': 1},
+                         {key: rows[0][key] for key in ('likes', 'rating', 'owner', 'readers_count')})
+        self.assertIsNone(rows[1]['owner'])
+
+    def test_csv(self):
+        rows = list(csv.DictReader(self.get_lines(output='csv')))
+        self.assertEqual(3, len(rows))
+        self.assertEqual(('Book1', '1', '4.00'), (rows[0]['name'], rows[0]['likes'], rows[0]['rating']))
+        self.assertEqual('', rows[1]['rating'])
+
+    def test_after_pk(self):
+        rows = [json.loads(line) for line in self.get_lines(after_pk=self.book1.pk)]
+        self.assertEqual([self.book2.pk, self.book3.pk], [row['pk'] for row in rows])
+
+    def test_resume_within_shared_timestamp(self):
+        moment = timezone.now() - timedelta(minutes=1)
+        Book.objects.filter(pk__in=[self.book1.pk, self.book3.pk]).update(updated_at=moment)
+        Book.objects.filter(pk=self.book2.pk).update(updated_at=moment + timedelta(seconds=1))
+        since = (moment - timedelta(seconds=1)).isoformat()
+        rows = [json.loads(line) for line in self.get_lines(since=since)]
+        self.assertEqual([self.book1.pk, self.book3.pk, self.book2.pk], [row['pk'] for row in rows])
+
+        # Interrupted after the first row: the book sharing its timestamp and the later, lower pk one follow
+        first = rows[0]
+        resumed = [json.loads(line) for line in self.get_lines(since=first['updated_at'], after_pk=first['pk'])]
+        self.assertEqual([self.book3.pk, self.book2.pk], [row['pk'] for row in resumed])
+
+    def test_since_includes_relation_changes(self):
+        watermark = timezone.now()
+        Book.objects.filter(pk=self.book1.pk).update(updated_at=watermark - timedelta(minutes=1))
+        Book.objects.exclude(pk=self.book1.pk).update(updated_at=watermark - timedelta(minutes=1))
+        UserBookRelation.objects.create(user=self.staff, book=self.book3, like=True)
+
+        rows = [json.loads(line) for line in self.get_lines(since=watermark.isoformat())]
+        self.assertEqual([self.book3.pk], [row['pk'] for row in rows])
+
+    def test_invalid_params(self):
+        self.client.force_login(self.staff)
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, self.client.get(self.url, data={'output': 'xml'}).status_code)
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, self.client.get(self.url, data={'since': 'x'}).status_code)
+
+    def test_staff_only(self):
+        self.client.force_login(self.user)
+        self.assertEqual(status.HTTP_403_FORBIDDEN, self.client.get(self.url).status_code)
+
+    def test_command(self):
+        out = StringIO()
+        call_command('export_books', '--format=csv', f'--after-pk={self.book2.pk}', stdout=out)
+        rows = list(csv.DictReader(out.getvalue().splitlines()))
+        self.assertEqual([str(self.book3.pk)], [row['pk'] for row in rows])
@@ -0,0 +1,101 @@
+import json
+import os
+import tempfile
+from decimal import Decimal
+from io import StringIO
+from unittest import skipUnless
+
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+
+from store.importer import copy_field
+from store.models import Book, UserBookRelation
+
+
+class ImportBooksTestCase(TestCase):
+    def setUp(self):
+        self.user1 = User.objects.create(username='user1')
+        self.user2 = User.objects.create(username='user2')
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def write(self, name, content):
+        path = os.path.join(self.tmpdir.name, name)
+        with open(path, 'w', encoding='utf-8') as output:
+            output.write(content)
+        return path
+
+    def call(self, *args):
+        out = StringIO()
+        call_command('import_books', *args, stdout=out)
+        return out.getvalue()
+
+    def test_books_csv(self):
+        path = self.write('books.csv', 'name,price,author_name,owner\n'
+                                        'Book1,11,author1,user1\n'
+                                        'Book2,22,author2,\n'
+                                        'Book3,33,author3,unknown\n')
+        output = self.call(path, '--batch-size=2')
+        self.assertIn('3 rows imported', output)
+        self.assertIn('rows/s', output)
+        self.assertEqual([('Book1', 11, self.user1.pk), ('Book2', 22, None), ('Book3', 33, None)],
+                         list(Book.objects.order_by('pk').values_list('name', 'price', 'owner_id')))
+        self.assertFalse(os.path.exists(path + '.checkpoint'))
+
+    def test_relations_jsonl_recompute_counters(self):
+        book1 = Book.objects.create(name='Book1', price=11, author_name='author1')
+        book2 = Book.objects.create(name='Book2', price=22, author_name='author2')
+        lines = [
+            {'user': 'user1', 'book': book1.pk, 'like': True, 'rate': 5},
+            {'user': 'user2', 'book': book1.pk, 'like': 'false', 'rate': 2},
+            {'user': 'user2', 'book': book2.pk, 'in_bookmarks': True},
+            {'user': 'unknown', 'book': book2.pk, 'like': True},
+            {'user': 'user1', 'book': 0, 'like': True},
+        ]
+        path = self.write('relations.jsonl', '\n'.join(json.dumps(line) for line in lines))
+        self.call(path, '--model=relations')
+
+        self.assertEqual(3, UserBookRelation.objects.count())
+        book1.refresh_from_db()
+        book2.refresh_from_db()
+        self.assertEqual(('3.50', 1, 2), (str(book1.rating), book1.likes_count, book1.readers_count))
+        self.assertEqual((None, 0, 1), (book2.rating, book2.likes_count, book2.readers_count))
+
+        self.call(path, '--model=relations')
+        self.assertEqual(3, UserBookRelation.objects.count())
+
+    def test_resume_after_failure(self):
+        rows = [f'Book{i},{i},author{i}' for i in range(5)]
+        rows[3] = 'Book3,not-a-price,author3'
+        path = self.write('books.csv', 'name,price,author_name\n' + '\n'.join(rows) + '\n')
+
+        with self.assertRaises(CommandError):
+            self.call(path, '--batch-size=2')
+        self.assertEqual(2, Book.objects.count())
+        with open(path + '.checkpoint') as checkpoint:
+            self.assertEqual('2', checkpoint.read())
+
+        rows[3] = 'Book3,3,author3'
+        self.write('books.csv', 'name,price,author_name\n' + '\n'.join(rows) + '\n')
+        self.call(path, '--batch-size=2', '--resume')
+        self.assertEqual([f'Book{i}' for i in range(5)], list(Book.objects.order_by('pk').values_list('name', flat=True)))
+
+    @skipUnless(connection.vendor == 'postgresql', 'COPY requires PostgreSQL')
+    def test_copy_writes_nulls(self):
+        path = self.write('books.csv', 'name,price,author_name,owner\nBook1,11,author1,\n')
+        self.call(path)
+        book = Book.objects.get()
+        self.assertEqual((None, None, None), (book.owner_id, book.rating, book.top_rating))
+
+        path = self.write('relations.jsonl', json.dumps({'user': 'user1', 'book': book.pk, 'like': True}))
+        self.call(path, '--model=relations')
+        self.assertIsNone(UserBookRelation.objects.get().rate)
+
+
+class CopyFieldTestCase(SimpleTestCase):
+    def test_copy_field(self):
+        # Only NULL is unquoted and empty, a quoted empty string stays an empty string
+        self.assertEqual(['', '""', '"say ""hi"""', '"\\N"', '11', 'True', '4.50'],
+                         [copy_field(value) for value in (None, '', 'say "hi"', '\\N', 11, True, Decimal('4.50'))])
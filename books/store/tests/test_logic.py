@@ -1,7 +1,12 @@
+from io import StringIO
+
 from django.contrib.auth.models import User
-from django.test import TestCase
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 
-from store.logic import set_rating
+from store.logic import bayesian_average, set_rating
 from store.models import Book, UserBookRelation
 
 
@@ -21,3 +26,170 @@ class SetRatingTestCase(TestCase):
         set_rating(self.book_1)
         self.book_1.refresh_from_db()
         self.assertEqual('4.67', str(self.book_1.rating))
+
+
+class UpdateRatingTestCase(TestCase):
+    def setUp(self):
+        self.user1 = User.objects.create(username='user1')
+        self.user2 = User.objects.create(username='user2')
+        self.book_1 = Book.objects.create(name='Test book 1', price=25, author_name='Author 1', owner=self.user1)
+
+    def test_add_change_clear(self):
+        relation1 = UserBookRelation.objects.create(user=self.user1, book=self.book_1, rate=5)
+        relation2 = UserBookRelation.objects.create(user=self.user2, book=self.book_1, like=True)
+        self.book_1.refresh_from_db()
+        self.assertEqual((5, 1, '5.00'), (self.book_1.rating_sum, self.book_1.rating_count, str(self.book_1.rating)))
+
+        relation2.rate = 2
+        relation2.save()
+        self.book_1.refresh_from_db()
+        self.assertEqual((7, 2, '3.50'), (self.book_1.rating_sum, self.book_1.rating_count, str(self.book_1.rating)))
+
+        relation1 = UserBookRelation.objects.get(pk=relation1.pk)
+        relation1.rate = None
+        relation1.save()
+        self.book_1.refresh_from_db()
+        self.assertEqual((2, 1, '2.00'), (self.book_1.rating_sum, self.book_1.rating_count, str(self.book_1.rating)))
+
+        relation2.delete()
+        self.book_1.refresh_from_db()
+        self.assertEqual((0, 0, None), (self.book_1.rating_sum, self.book_1.rating_count, self.book_1.rating))
+
+    def test_refresh_from_db_after_concurrent_write(self):
+        relation = UserBookRelation.objects.create(user=self.user1, book=self.book_1, rate=5)
+        other = UserBookRelation.objects.get(pk=relation.pk)
+        other.rate = 3
+        other.save()
+
+        relation.refresh_from_db()
+        relation.rate = 4
+        relation.save()
+        self.book_1.refresh_from_db()
+        self.assertEqual((4, 1, '4.00'), (self.book_1.rating_sum, self.book_1.rating_count, str(self.book_1.rating)))
+
+    def test_deferred_rate_loaded_on_access(self):
+        relation = UserBookRelation.objects.create(user=self.user1, book=self.book_1, rate=5, like=True)
+        relation = UserBookRelation.objects.only('pk', 'like').get(pk=relation.pk)
+        self.assertEqual(5, relation.rate)
+        relation.rate = 2
+        relation.save()
+        self.book_1.refresh_from_db()
+        self.assertEqual((2, 1, 1), (self.book_1.rating_sum, self.book_1.rating_count, self.book_1.likes_count))
+
+    def test_stale_book_save_keeps_counters(self):
+        stale = Book.objects.get(pk=self.book_1.pk)
+        UserBookRelation.objects.create(user=self.user1, book=self.book_1, rate=5, like=True)
+        stale.price = 30
+        stale.save()
+        self.book_1.refresh_from_db()
+        self.assertEqual((30, 5, 1, '5.00', 1, 1), (
+            self.book_1.price, self.book_1.rating_sum, self.book_1.rating_count, str(self.book_1.rating),
+            self.book_1.likes_count, self.book_1.readers_count))
+
+    def test_single_update_query(self):
+        relation = UserBookRelation.objects.create(user=self.user1, book=self.book_1, rate=5)
+        relation.rate = 3
+        with CaptureQueriesContext(connection) as queries:
+            relation.save()
+        self.assertEqual(2, len(queries))
+        self.assertNotIn('AVG', queries.captured_queries[1]['sql'].upper())
+
+    def test_bookmark_only_does_not_touch_book(self):
+        relation = UserBookRelation.objects.create(user=self.user1, book=self.book_1, rate=5)
+        relation.in_bookmarks = True
+        with CaptureQueriesContext(connection) as queries:
+            relation.save()
+        self.assertEqual(1, len(queries))
+
+    def test_likes_count(self):
+        relation1 = UserBookRelation.objects.create(user=self.user1, book=self.book_1, like=True)
+        relation2 = UserBookRelation.objects.create(user=self.user2, book=self.book_1)
+        relation2.like = True
+        with CaptureQueriesContext(connection) as queries:
+            relation2.save()
+        self.assertEqual(2, len(queries))
+        self.book_1.refresh_from_db()
+        self.assertEqual(2, self.book_1.likes_count)
+
+        relation1.like = False
+        relation1.save()
+        relation2.delete()
+        self.book_1.refresh_from_db()
+        self.assertEqual(0, self.book_1.likes_count)
+
+    def test_deleted_user(self):
+        UserBookRelation.objects.create(user=self.user1, book=self.book_1, rate=5, like=True)
+        UserBookRelation.objects.create(user=self.user2, book=self.book_1, rate=3)
+        self.user1.delete()
+        self.book_1.refresh_from_db()
+        self.assertEqual((3, 1, '3.00', 0, 1), (
+            self.book_1.rating_sum, self.book_1.rating_count, str(self.book_1.rating),
+            self.book_1.likes_count, self.book_1.readers_count))
+
+    def test_rebuild_counters(self):
+        UserBookRelation.objects.create(user=self.user1, book=self.book_1, rate=5, like=True)
+        UserBookRelation.objects.create(user=self.user2, book=self.book_1, rate=4)
+        book_2 = Book.objects.create(name='Test book 2', price=25, author_name='Author 2')
+        Book.objects.update(rating_sum=100, rating_count=1, rating=1, likes_count=7)
+
+        out = StringIO()
+        call_command('rebuild_counters', stdout=out)
+        self.assertIn('2 books', out.getvalue())
+        self.book_1.refresh_from_db()
+        book_2.refresh_from_db()
+        self.assertEqual((9, 2, '4.50'), (self.book_1.rating_sum, self.book_1.rating_count, str(self.book_1.rating)))
+        self.assertEqual((0, 0, None), (book_2.rating_sum, book_2.rating_count, book_2.rating))
+        self.assertEqual((1, 0), (self.book_1.likes_count, book_2.likes_count))
+
+
+@override_settings(BOOKS_TOP_MIN_VOTES=2, BOOKS_TOP_PRIOR_RATING=3.0)
+class LeaderboardTestCase(TestCase):
+    def setUp(self):
+        self.users = [User.objects.create(username=f'user{i}') for i in range(3)]
+        self.book_1 = Book.objects.create(name='Test book 1', price=25, author_name='Author 1')
+
+    def test_bayesian_average(self):
+        self.assertIsNone(bayesian_average(5, 1))
+        self.assertEqual(4.0, bayesian_average(10, 2))
+
+    def test_incremental(self):
+        relation = UserBookRelation.objects.create(user=self.users[0], book=self.book_1, rate=5)
+        self.book_1.refresh_from_db()
+        self.assertIsNone(self.book_1.top_rating)
+
+        UserBookRelation.objects.create(user=self.users[1], book=self.book_1, rate=5)
+        self.book_1.refresh_from_db()
+        self.assertEqual(4.0, self.book_1.top_rating)
+
+        relation.rate = 1
+        relation.save()
+        self.book_1.refresh_from_db()
+        self.assertEqual(3.0, self.book_1.top_rating)
+
+        relation.delete()
+        self.book_1.refresh_from_db()
+        self.assertIsNone(self.book_1.top_rating)
+
+    def test_set_rating(self):
+        for user in self.users:
+            UserBookRelation.objects.create(user=user, book=self.book_1, rate=4)
+        Book.objects.update(top_rating=None)
+        set_rating(self.book_1)
+        self.book_1.refresh_from_db()
+        self.assertEqual(3.6, self.book_1.top_rating)
+
+    def test_rebuild_leaderboards(self):
+        for user in self.users[:2]:
+            UserBookRelation.objects.create(user=user, book=self.book_1, rate=5)
+
+        out = StringIO()
+        with override_settings(BOOKS_TOP_MIN_VOTES=3):
+            call_command('rebuild_leaderboards', stdout=out)
+        self.assertIn('1 books', out.getvalue())
+        self.book_1.refresh_from_db()
+        self.assertIsNone(self.book_1.top_rating)
+
+        Book.objects.update(rating_sum=0, rating_count=0)
+        call_command('rebuild_leaderboards', '--counters', stdout=out)
+        self.book_1.refresh_from_db()
+        self.assertEqual((10, 4.0), (self.book_1.rating_sum, self.book_1.top_rating))
@@ -0,0 +1,108 @@
+import json
+import time
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.serializers import Serializer
+from rest_framework.test import APITestCase
+
+from store.cache import get_cache
+from store.metrics import QueryBudgetExceeded, RequestMetrics, TimedJSONRenderer, time_serialization
+from store.models import Book
+
+
+class RequestMetricsTestCase(APITestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.user = User.objects.create(username='test_username')
+        self.book = Book.objects.create(name='Test book 1', price=25, author_name='Author 1', owner=self.user)
+
+    def test_server_timing(self):
+        response = self.client.get(reverse('book-list'))
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        metrics = dict(metric.split(';', 1) for metric in response['Server-Timing'].split(', '))
+        self.assertEqual(['db', 'view', 'serialize', 'total'], list(metrics))
+        self.assertIn('desc="3 queries"', metrics['db'])
+
+    def test_log_line(self):
+        with self.assertLogs('store.requests', 'INFO') as logs:
+            self.client.get(reverse('book-detail', args=(self.book.pk,)), data={'price': 25})
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record, logs.records[0].request_metrics)
+        self.assertEqual({'method': 'GET', 'path': f'/book/{self.book.pk}/', 'endpoint': 'book-detail',
+                          'status': 200, 'queries': 2},
+                         {key: record[key] for key in ('method', 'path', 'endpoint', 'status', 'queries')})
+        for key in ('db_ms', 'view_ms', 'serialize_ms', 'total_ms'):
+            self.assertGreaterEqual(record[key], 0)
+        self.assertGreaterEqual(record['total_ms'], record['db_ms'])
+
+    def test_serializer_time_counts_as_serialize(self):
+        to_representation = Serializer.to_representation
+
+        def slow_to_representation(serializer, instance):
+            time.sleep(0.05)
+            return to_representation(serializer, instance)
+
+        with mock.patch.object(Serializer, 'to_representation', slow_to_representation):
+            with self.assertLogs('store.requests', 'INFO') as logs:
+                self.client.get(reverse('book-detail', args=(self.book.pk,)))
+        record = json.loads(logs.records[0].getMessage())
+        self.assertGreaterEqual(record['serialize_ms'], 50)
+        self.assertLess(record['view_ms'], 50)
+
+    def test_cached_response_runs_no_queries(self):
+        self.client.get(reverse('book-list'))
+        response = self.client.get(reverse('book-list'))
+        self.assertEqual('HIT', response['X-Cache'])
+        self.assertIn('desc="0 queries"', response['Server-Timing'])
+
+    @override_settings(BOOKS_QUERY_BUDGETS={'book-list': 1})
+    def test_budget_exceeded_strict(self):
+        with self.assertRaisesMessage(QueryBudgetExceeded, 'GET /book/ (book-list) ran 3 queries, the budget is 1'):
+            self.client.get(reverse('book-list'))
+
+    @override_settings(BOOKS_QUERY_BUDGETS={'book-list': 1}, BOOKS_QUERY_BUDGET_STRICT=False)
+    def test_budget_exceeded_logged(self):
+        with self.assertLogs('store.requests', 'WARNING') as logs:
+            response = self.client.get(reverse('book-list'))
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual(['GET /book/ (book-list) ran 3 queries, the budget is 1'],
+                         [record.getMessage() for record in logs.records if record.levelname == 'WARNING'])
+
+    @override_settings(BOOKS_QUERY_BUDGETS={}, BOOKS_QUERY_BUDGET_DEFAULT=1)
+    def test_default_budget(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            self.client.get(reverse('book-list'))
+
+
+class AsyncRequestMetricsTestCase(TestCase):
+    def test_queries_in_worker_threads(self):
+        Book.objects.create(name='Test book 1', price=25, author_name='Author 1')
+        response = async_to_sync(self.async_client.get)(reverse('async-book-list'))
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        # page, missing fragments, readers preview
+        self.assertIn('desc="3 queries"', response['Server-Timing'])
+
+
+class TimedJSONRendererTestCase(TestCase):
+    def test_outside_request(self):
+        self.assertEqual(b'{"a":1}', TimedJSONRenderer().render({'a': 1}))
+
+
+class TimeSerializationTestCase(TestCase):
+    def test_nested_blocks_and_queries(self):
+        metrics = RequestMetrics()
+        with metrics.capture():
+            with time_serialization():
+                with time_serialization():
+                    time.sleep(0.02)
+                # A query run while serializing
+                started = time.perf_counter()
+                time.sleep(0.03)
+                metrics.db_time += time.perf_counter() - started
+        self.assertGreaterEqual(metrics.serialize_time, 0.02)
+        self.assertLessEqual(metrics.serialize_time, metrics.total_time - metrics.db_time)
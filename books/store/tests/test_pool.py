@@ -0,0 +1,255 @@
+import threading
+import time
+from unittest import mock, skipUnless
+
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+
+from store.backends.pool import ConnectionPool, PoolTimeout
+from store.metrics import RequestMetrics
+
+
+class FakeConnection:
+    def __init__(self, number):
+        self.number = number
+        self.closed = False
+        self.healthy = True
+        self.dirty = False
+
+    def __repr__(self):
+        return f'<FakeConnection {self.number}>'
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class ConnectionPoolTestCase(SimpleTestCase):
+    def make_pool(self, **options):
+        self.opened = []
+        self.clock = FakeClock()
+        return ConnectionPool(self.connect, self.close, check=lambda conn: conn.healthy,
+                              reset=lambda conn: not conn.dirty, clock=self.clock, **options)
+
+    def connect(self):
+        self.opened.append(FakeConnection(len(self.opened)))
+        return self.opened[-1]
+
+    def close(self, conn):
+        conn.closed = True
+
+    def test_reuses_returned_connection(self):
+        pool = self.make_pool()
+        first = pool.getconn()
+        pool.putconn(first)
+        self.assertIs(first, pool.getconn())
+        self.assertEqual(1, len(self.opened))
+        self.assertEqual({'size': 1, 'idle': 0, 'in_use': 1, 'checkouts': 2, 'connects': 1},
+                         {key: pool.stats()[key] for key in ('size', 'idle', 'in_use', 'checkouts', 'connects')})
+
+    def test_most_recently_returned_first(self):
+        pool = self.make_pool()
+        first, second = pool.getconn(), pool.getconn()
+        pool.putconn(first)
+        pool.putconn(second)
+        self.assertIs(second, pool.getconn())
+
+    def test_fill_opens_min_size(self):
+        pool = self.make_pool(min_size=2)
+        pool.fill()
+        self.assertEqual({'size': 2, 'idle': 2}, {key: pool.stats()[key] for key in ('size', 'idle')})
+        pool.getconn()
+        self.assertEqual(2, len(self.opened))
+
+    def test_refills_min_size_after_discards(self):
+        pool = self.make_pool(min_size=2, max_lifetime=60)
+        pool.fill()
+        pool.putconn(pool.getconn(), discard=True)
+        self.assertEqual({'size': 2, 'idle': 2}, {key: pool.stats()[key] for key in ('size', 'idle')})
+
+        self.clock.now = 60
+        conn = pool.getconn()
+        self.assertEqual({'size': 2, 'idle': 1, 'expired': 2},
+                         {key: pool.stats()[key] for key in ('size', 'idle', 'expired')})
+        self.assertFalse(conn.closed)
+
+    def test_failed_refill_does_not_fail_return(self):
+        pool = self.make_pool(min_size=1)
+        conn = pool.getconn()
+        pool.connect = lambda: 1 / 0
+        pool.putconn(conn, discard=True)
+        self.assertEqual(0, pool.stats()['size'])
+
+    def test_max_lifetime(self):
+        pool = self.make_pool(max_lifetime=60)
+        conn = pool.getconn()
+        pool.putconn(conn)
+        self.clock.now = 60
+        replacement = pool.getconn()
+        self.assertIsNot(conn, replacement)
+        self.assertTrue(conn.closed)
+        self.assertEqual(1, pool.stats()['expired'])
+
+        # A connection that expires while in use is closed when it is returned
+        self.clock.now = 120
+        pool.putconn(replacement)
+        self.assertTrue(replacement.closed)
+        self.assertEqual({'size': 0, 'idle': 0, 'discarded': 1},
+                         {key: pool.stats()[key] for key in ('size', 'idle', 'discarded')})
+
+    def test_failed_health_check_is_replaced(self):
+        pool = self.make_pool()
+        conn = pool.getconn()
+        pool.putconn(conn)
+        conn.healthy = False
+        replacement = pool.getconn()
+        self.assertIsNot(conn, replacement)
+        self.assertTrue(conn.closed)
+        self.assertEqual({'size': 1, 'failed_checks': 1},
+                         {key: pool.stats()[key] for key in ('size', 'failed_checks')})
+
+    def test_check_idle(self):
+        pool = self.make_pool(check_idle=30)
+        conn = pool.getconn()
+        pool.putconn(conn)
+        conn.healthy = False
+        self.clock.now = 10
+        # Returned 10 seconds ago, trusted without a check
+        self.assertIs(conn, pool.getconn())
+        pool.putconn(conn)
+        self.clock.now = 40
+        self.assertIsNot(conn, pool.getconn())
+
+    def test_failed_reset_and_discard(self):
+        pool = self.make_pool()
+        dirty, broken = pool.getconn(), pool.getconn()
+        dirty.dirty = True
+        pool.putconn(dirty)
+        pool.putconn(broken, discard=True)
+        self.assertTrue(dirty.closed and broken.closed)
+        self.assertEqual({'size': 0, 'discarded': 2}, {key: pool.stats()[key] for key in ('size', 'discarded')})
+
+    def test_timeout(self):
+        pool = self.make_pool(max_size=1, timeout=0)
+        pool.getconn()
+        with self.assertRaises(PoolTimeout):
+            pool.getconn()
+        self.assertEqual(1, pool.stats()['timeouts'])
+
+    def test_failed_connect_frees_slot(self):
+        pool = self.make_pool(max_size=1)
+        pool.connect = lambda: 1 / 0
+        with self.assertRaises(ZeroDivisionError):
+            pool.getconn()
+        pool.connect = self.connect
+        conn = pool.getconn()
+        self.assertEqual(self.opened, [conn])
+
+    def test_close(self):
+        pool = self.make_pool()
+        idle, in_use = pool.getconn(), pool.getconn()
+        pool.putconn(idle)
+        pool.close()
+        self.assertTrue(idle.closed)
+        self.assertFalse(in_use.closed)
+        self.assertEqual(1, pool.stats()['size'])
+
+    def test_invalid_sizes(self):
+        with self.assertRaises(ValueError):
+            self.make_pool(min_size=3, max_size=2)
+
+    def test_waits_for_returned_connection(self):
+        pool = ConnectionPool(lambda: FakeConnection(0), lambda conn: None, max_size=1, timeout=5)
+        conn = pool.getconn()
+        timer = threading.Timer(0.05, pool.putconn, (conn,))
+        timer.start()
+        metrics = RequestMetrics()
+        with metrics.capture():
+            self.assertIs(conn, pool.getconn())
+        timer.join()
+        stats = pool.stats()
+        self.assertEqual(1, stats['waits'])
+        self.assertGreater(stats['wait_ms'], 0)
+        self.assertEqual(stats['wait_ms'], stats['max_wait_ms'])
+        self.assertGreater(metrics.as_dict()['pool_wait_ms'], 0)
+
+    def test_concurrent_checkouts_stay_within_max_size(self):
+        pool = ConnectionPool(lambda: FakeConnection(0), lambda conn: None, max_size=3, timeout=5)
+        peak = []
+
+        def worker():
+            for _ in range(20):
+                conn = pool.getconn()
+                peak.append(pool.stats()['size'])
+                time.sleep(0.001)
+                pool.putconn(conn)
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertLessEqual(max(peak), 3)
+        self.assertEqual({'in_use': 0, 'checkouts': 160, 'timeouts': 0},
+                         {key: pool.stats()[key] for key in ('in_use', 'checkouts', 'timeouts')})
+
+
+class PoolRegistryTestCase(SimpleTestCase):
+    def test_new_pool_opens_min_size(self):
+        from store.backends.postgresql_pool import base
+
+        opened = []
+
+        def connect():
+            opened.append(FakeConnection(len(opened)))
+            return opened[-1]
+
+        with mock.patch.dict(base._pools, clear=True):
+            pool = base.get_pool('default', {'database': 'books'}, {'min_size': 2}, connect)
+            self.assertEqual({'size': 2, 'idle': 2}, {key: pool.stats()[key] for key in ('size', 'idle')})
+            self.assertIs(pool, base.get_pool('default', {'database': 'books'}, {'min_size': 2}, None))
+        self.assertEqual(2, len(opened))
+
+
+@skipUnless(connection.vendor == 'postgresql', 'the pooling backend needs PostgreSQL')
+class PostgresPoolBackendTestCase(TestCase):
+    def test_connection_is_reused(self):
+        from django.db import connections
+
+        from store.backends.postgresql_pool.base import DatabaseWrapper
+
+        wrapper = DatabaseWrapper({**connections['default'].settings_dict, 'CONN_MAX_AGE': 0}, alias='pool_test')
+        try:
+            wrapper.ensure_connection()
+            first = wrapper.connection
+            wrapper.close()
+            wrapper.ensure_connection()
+            self.assertIs(first, wrapper.connection)
+            with wrapper.cursor() as cursor:
+                cursor.execute('SELECT 1')
+                self.assertEqual((1,), cursor.fetchone())
+            self.assertEqual(1, wrapper.pool_stats()['connects'])
+        finally:
+            wrapper.close()
+            wrapper.pool.close()
+
+    def test_min_size(self):
+        from django.db import connections
+
+        from store.backends.postgresql_pool.base import DatabaseWrapper
+
+        settings_dict = connections['default'].settings_dict
+        wrapper = DatabaseWrapper({**settings_dict, 'CONN_MAX_AGE': 0,
+                                   'OPTIONS': {**settings_dict['OPTIONS'], 'pool': {'min_size': 2}}},
+                                  alias='pool_min_size_test')
+        try:
+            wrapper.ensure_connection()
+            self.assertEqual({'size': 2, 'idle': 1, 'in_use': 1},
+                             {key: wrapper.pool_stats()[key] for key in ('size', 'idle', 'in_use')})
+        finally:
+            wrapper.close()
+            wrapper.pool.close()
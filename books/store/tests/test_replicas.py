@@ -0,0 +1,147 @@
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.db import connections
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from store.cache import get_cache
+from store.models import Book, UserBookRelation
+from store.replicas import PRIMARY_COOKIE, ReplicaChooser
+
+
+class QueriesByAlias:
+    """Capture the queries of every database alias."""
+
+    def __enter__(self):
+        self.contexts = {alias: CaptureQueriesContext(connections[alias]) for alias in ('default', 'replica')}
+        for context in self.contexts.values():
+            context.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        for context in self.contexts.values():
+            context.__exit__(*exc_info)
+
+    def count(self, alias):
+        return len(self.contexts[alias])
+
+
+@override_settings(BOOKS_DB_REPLICAS={'replica': 1}, BOOKS_REPLICA_STICKY_SECONDS=10)
+class ReplicaRoutingTestCase(APITestCase):
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        get_cache().clear()
+        self.user = User.objects.create(username='test_username')
+        self.book = Book.objects.create(name='Primary book', price=10, author_name='author', owner=self.user)
+        # The replica database is not replicated, its rows show which alias answered
+        Book.objects.using('replica').create(pk=self.book.pk, name='Replica book', price=10, author_name='author')
+
+    def names(self, response):
+        return [book['name'] for book in response.data['results']]
+
+    def test_safe_requests_read_from_replica(self):
+        with QueriesByAlias() as queries:
+            response = self.client.get(reverse('book-list'))
+            detail = self.client.get(reverse('book-detail', args=(self.book.pk,)))
+        self.assertEqual(['Replica book'], self.names(response))
+        self.assertEqual('Replica book', detail.data['name'])
+        self.assertEqual(0, queries.count('default'))
+        self.assertGreater(queries.count('replica'), 0)
+
+    def test_async_view_reads_from_replica(self):
+        with QueriesByAlias() as queries:
+            response = async_to_sync(self.async_client.get)(reverse('async-book-list'))
+        self.assertEqual(['Replica book'], [book['name'] for book in response.json()['results']])
+        self.assertEqual(0, queries.count('default'))
+
+    def test_write_goes_to_primary_and_pins(self):
+        self.client.force_login(self.user)
+        with QueriesByAlias() as queries:
+            response = self.client.patch(reverse('userbookrelation-detail', args=(self.book.pk,)), {'like': True},
+                                         format='json')
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual(0, queries.count('replica'))
+        self.assertTrue(UserBookRelation.objects.filter(book=self.book, like=True).exists())
+        self.assertFalse(UserBookRelation.objects.using('replica').exists())
+        self.assertEqual(10, response.cookies[PRIMARY_COOKIE]['max-age'])
+
+        # The client reads its own write from the primary while the cookie lasts
+        with QueriesByAlias() as queries:
+            response = self.client.get(reverse('book-list'))
+        self.assertEqual(['Primary book'], self.names(response))
+        self.assertTrue(response.data['results'][0]['my_like'])
+        self.assertEqual(0, queries.count('replica'))
+
+        self.client.cookies.pop(PRIMARY_COOKIE)
+        self.assertEqual(['Replica book'], self.names(self.client.get(reverse('book-list'))))
+
+    def test_session_read_from_primary(self):
+        # The session and the user exist on the primary only
+        self.client.force_login(self.user)
+        with QueriesByAlias() as queries:
+            response = self.client.get(reverse('book-list'))
+        self.assertEqual(['Replica book'], self.names(response))
+        self.assertNotIn('X-Cache', response)
+        self.assertEqual(2, queries.count('default'))
+
+        # The logged in request did not fill the anonymous response cache
+        self.client.logout()
+        self.assertEqual('MISS', self.client.get(reverse('book-list'))['X-Cache'])
+
+    def test_book_update_goes_to_primary(self):
+        self.client.force_login(self.user)
+        response = self.client.patch(reverse('book-detail', args=(self.book.pk,)), {'price': 20}, format='json')
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual(20, Book.objects.get(pk=self.book.pk).price)
+        self.assertEqual(10, Book.objects.using('replica').get(pk=self.book.pk).price)
+
+    def test_failed_write_does_not_pin(self):
+        response = self.client.patch(reverse('userbookrelation-detail', args=(self.book.pk,)), {'like': True},
+                                     format='json')
+        self.assertEqual(status.HTTP_403_FORBIDDEN, response.status_code)
+        self.assertNotIn(PRIMARY_COOKIE, response.cookies)
+
+    def test_replica_responses_cached_for_sticky_window(self):
+        cache = get_cache()
+        with mock.patch.object(cache, 'set', wraps=cache.set) as cache_set:
+            self.client.get(reverse('book-list'))
+        self.assertEqual(10, cache_set.call_args.args[2])
+
+        with override_settings(BOOKS_REPLICA_STICKY_SECONDS=0):
+            get_cache().clear()
+            self.assertEqual('MISS', self.client.get(reverse('book-list'))['X-Cache'])
+            # The replica caught up, its data is served rather than the response cached before
+            Book.objects.using('replica').filter(pk=self.book.pk).update(name='Caught up book', updated_at=timezone.now())
+            response = self.client.get(reverse('book-list'))
+        self.assertEqual('MISS', response['X-Cache'])
+        self.assertEqual(['Caught up book'], self.names(response))
+
+    @override_settings(BOOKS_DB_REPLICAS={})
+    def test_primary_responses_cached_for_cache_timeout(self):
+        self.client.get(reverse('book-list'))
+        self.assertEqual('HIT', self.client.get(reverse('book-list'))['X-Cache'])
+
+    @override_settings(BOOKS_DB_REPLICAS={})
+    def test_without_replicas(self):
+        with QueriesByAlias() as queries:
+            response = self.client.get(reverse('book-list'))
+        self.assertEqual(['Primary book'], self.names(response))
+        self.assertEqual(0, queries.count('replica'))
+
+
+class ReplicaChooserTestCase(TestCase):
+    def test_weighted_round_robin(self):
+        choose = ReplicaChooser()
+        self.assertEqual(['a', 'a', 'b', 'a', 'a', 'b'], [choose({'a': 2, 'b': 1}) for _ in range(6)])
+
+    def test_setting_change(self):
+        choose = ReplicaChooser()
+        choose({'a': 1})
+        self.assertEqual(['b', 'c', 'b'], [choose({'b': 1, 'c': 1}) for _ in range(3)])
@@ -1,6 +1,9 @@
 from django.db.models import Count, Case, When, Avg
+from django.db import connection
 from django.test import TestCase
-from store.serializers import BooksSerializer
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+from store.serializers import BookRowSerializer, BooksSerializer
 from store.models import Book, UserBookRelation
 from django.contrib.auth.models import User
 
@@ -40,7 +43,11 @@ class BookSerializersTestCase(TestCase):
                         'first_name': 'first111',
                         'last_name': 'last222'
                     }
-                ]
+                ],
+                'readers_count': 2,
+                'my_like': None,
+                'my_in_bookmarks': None,
+                'my_rate': None,
             },
             {
                 'pk': self.book2.pk,
@@ -59,8 +66,69 @@ class BookSerializersTestCase(TestCase):
                         'first_name': 'first111',
                         'last_name': 'last222'
                     }
-                ]
+                ],
+                'readers_count': 2,
+                'my_like': None,
+                'my_in_bookmarks': None,
+                'my_rate': None,
             },
 
         ]
         self.assertEqual(expected_data, data)
+
+    def test_readers_preview(self):
+        books = Book.objects.all().select_related('owner').with_readers_preview(1).order_by('pk')
+        with CaptureQueriesContext(connection) as queries:
+            data = BooksSerializer(books, many=True).data
+        self.assertEqual(2, len(queries))
+        self.assertEqual([[{'first_name': 'first_name1', 'last_name': 'last_name2'}]] * 2,
+                         [book['readers'] for book in data])
+        self.assertEqual([2, 2], [book['readers_count'] for book in data])
+
+
+class BookRowSerializerTestCase(TestCase):
+    def setUp(self):
+        self.user1 = User.objects.create(username='user1', first_name='first_name1', last_name='last_name2')
+        self.user2 = User.objects.create(username='user2', first_name='first111', last_name='last222')
+        self.book1 = Book.objects.create(name='Book1', price=11, author_name='author1', owner=self.user1)
+        self.book2 = Book.objects.create(name='Book2', price=22, author_name='author2')
+        self.book3 = Book.objects.create(name='Book3', price=33, author_name='author3', owner=self.user2)
+
+        UserBookRelation.objects.create(user=self.user1, book=self.book1, like=True, rate=5)
+        UserBookRelation.objects.create(user=self.user2, book=self.book1, like=False, rate=4)
+        UserBookRelation.objects.create(user=self.user2, book=self.book2, like=True, rate=3)
+
+    def test_identical_to_books_serializer(self):
+        row_serializer = BookRowSerializer()
+        books = Book.objects.all().select_related('owner').with_readers_preview().order_by('pk')
+        rows = Book.objects.all().order_by('pk').values(*row_serializer.get_columns(Book.objects.all()))
+
+        expected = JSONRenderer().render(BooksSerializer(books, many=True).data)
+        with CaptureQueriesContext(connection) as queries:
+            data = row_serializer.to_representation(rows)
+        self.assertEqual(2, len(queries))
+        self.assertEqual(expected, JSONRenderer().render(data))
+        self.assertEqual('4.50', data[0]['rating'])
+        self.assertEqual('', data[1]['owner_name'])
+        self.assertEqual([], data[2]['readers'])
+
+    def test_empty(self):
+        self.assertEqual([], BookRowSerializer().to_representation([]))
+
+    def test_fieldset(self):
+        fields = ('pk', 'name', 'owner_name')
+        row_serializer = BookRowSerializer(fields=fields)
+        self.assertNotIn('price', row_serializer.columns)
+        self.assertEqual([], row_serializer.reader_columns)
+        rows = Book.objects.order_by('pk').values(*row_serializer.get_columns(Book.objects.all()))
+
+        expected = BooksSerializer(Book.objects.order_by('pk'), many=True, fields=fields).data
+        with CaptureQueriesContext(connection) as queries:
+            data = row_serializer.to_representation(rows)
+        self.assertEqual(1, len(queries))
+        self.assertEqual(expected, data)
+        self.assertEqual(list(fields), list(data[0]))
+        # Compiled once per fieldset, the full representation is unaffected
+        self.assertIs(row_serializer.row_to_dict, BookRowSerializer(fields=fields).row_to_dict)
+        self.assertIn('price', BookRowSerializer().columns)
+        self.assertNotEqual([], BookRowSerializer().reader_columns)
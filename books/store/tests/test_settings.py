@@ -0,0 +1,81 @@
+import importlib
+import os
+import sys
+from unittest import mock
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase, override_settings
+
+from store.checks import check_production_settings
+
+PROD_ENVIRON = {
+    'DJANGO_SECRET_KEY': 'secret',
+    'DJANGO_ALLOWED_HOSTS': 'books.example.com,api.books.example.com',
+    'DB_NAME': 'books',
+    'DB_USER': 'books',
+    'DB_PASS': 'pass',
+    'DB_HOST': 'db.internal',
+    'REDIS_URL': 'redis://cache.internal:6379/1',
+    'SOCIAL_AUTH_GITHUB_KEY': 'key',
+    'SOCIAL_AUTH_GITHUB_SECRET': 'secret',
+}
+
+
+def import_prod_settings(environ):
+    with mock.patch.dict(os.environ, environ, clear=True), mock.patch.dict(sys.modules):
+        sys.modules.pop('books.settings.prod', None)
+        return importlib.import_module('books.settings.prod')
+
+
+class ProductionSettingsTestCase(SimpleTestCase):
+    def test_prod_profile(self):
+        prod = import_prod_settings(PROD_ENVIRON)
+        self.assertFalse(prod.DEBUG)
+        self.assertEqual(['books.example.com', 'api.books.example.com'], prod.ALLOWED_HOSTS)
+        self.assertNotIn('debug_toolbar', prod.INSTALLED_APPS)
+        self.assertFalse([name for name in prod.MIDDLEWARE if name.startswith('debug_toolbar')])
+        self.assertEqual('db.internal', prod.DATABASES['default']['HOST'])
+        self.assertEqual(600, prod.DATABASES['default']['CONN_MAX_AGE'])
+        self.assertTrue(prod.DATABASES['default']['CONN_HEALTH_CHECKS'])
+        self.assertEqual('django.template.loaders.cached.Loader', prod.TEMPLATES[0]['OPTIONS']['loaders'][0][0])
+        self.assertEqual('redis://cache.internal:6379/1', prod.CACHES['default']['LOCATION'])
+
+    def test_prod_connection_pool(self):
+        prod = import_prod_settings({**PROD_ENVIRON, 'DB_POOL_MAX_SIZE': '20', 'DB_POOL_MIN_SIZE': '2'})
+        database = prod.DATABASES['default']
+        self.assertEqual('store.backends.postgresql_pool', database['ENGINE'])
+        self.assertEqual(0, database['CONN_MAX_AGE'])
+        self.assertEqual({'min_size': 2, 'max_size': 20, 'max_lifetime': 1800, 'timeout': 10.0},
+                         database['OPTIONS']['pool'])
+
+    def test_prod_profile_requires_environment(self):
+        environ = dict(PROD_ENVIRON)
+        del environ['DB_PASS']
+        with self.assertRaisesMessage(ImproperlyConfigured, 'DB_PASS'):
+            import_prod_settings(environ)
+
+    def test_prod_profile_keeps_base_untouched(self):
+        import_prod_settings(PROD_ENVIRON)
+        base = importlib.import_module('books.settings.base')
+        self.assertTrue(base.TEMPLATES[0]['APP_DIRS'])
+        self.assertNotIn('loaders', base.TEMPLATES[0]['OPTIONS'])
+
+    @override_settings(BOOKS_ENV='prod', MIDDLEWARE=settings.MIDDLEWARE + [
+        'debug_toolbar.middleware.DebugToolbarMiddleware'])
+    def test_refuses_debug_middleware(self):
+        with self.assertRaisesMessage(ImproperlyConfigured, 'debug_toolbar.middleware.DebugToolbarMiddleware'):
+            check_production_settings()
+
+    @override_settings(BOOKS_ENV='prod', DEBUG=True)
+    def test_refuses_debug(self):
+        with self.assertRaisesMessage(ImproperlyConfigured, 'DEBUG is on'):
+            check_production_settings()
+
+    @override_settings(BOOKS_ENV='prod')
+    def test_clean_prod(self):
+        check_production_settings()
+
+    @override_settings(MIDDLEWARE=settings.MIDDLEWARE + ['debug_toolbar.middleware.DebugToolbarMiddleware'])
+    def test_other_profiles_unchecked(self):
+        check_production_settings()
@@ -1,41 +1,225 @@
-from django.shortcuts import render
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404, render
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework.filters import SearchFilter, OrderingFilter
-from rest_framework.mixins import UpdateModelMixin
-from rest_framework.permissions import IsAuthenticated
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.mixins import ListModelMixin, UpdateModelMixin
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet, GenericViewSet
-from store.models import Book, UserBookRelation
+from store.cache import CachedResponseMixin, FragmentCachedListMixin
+from store.conditional import ConditionalResponseMixin
+from store.export import CONTENT_TYPES, EXPORT_FORMATS, export_queryset, iter_export, parse_since
+from store.fieldsets import SparseFieldsetMixin
+from store.filters import BookFilterSet, BookOrderingFilter, BookSearchFilter
+from store.logic import LEADERBOARDS, bulk_update_relations
+from store.models import USER_RELATION_FIELDS, Book, UserBookRelation
+from store.pagination import BookCursorPagination, LeaderboardCursorPagination, ReaderCursorPagination
 from store.permissoins import IsOwnerOrStaffOrReadOnly
-from store.serializers import BooksSerializer, UserBookRelationSerializer
-from django.db.models import Count, Case, When, Avg
+from store.replicas import ReplicaReadMixin
+from store.serializers import BookReaderSerializer, BookRowSerializer, BooksSerializer, UserBookRelationSerializer, UserBookRelationBulkItemSerializer
 
 
-class BookViewSet(ModelViewSet):
-    queryset = Book.objects.all().annotate(
-            annotated_likes=Count(Case(When(userbookrelation__like=True, then=1)))
-            ).select_related('owner').prefetch_related('readers').order_by('pk')
+class RowListModelMixin(ListModelMixin):
+    """List through `values()` rows and `row_serializer_class` instead of model instances."""
+    row_serializer_class = None
+
+    def list(self, request, *args, **kwargs):
+        row_serializer = self.get_row_serializer()
+        queryset = self.filter_queryset(self.get_queryset())
+        ordering = self.paginator.get_ordering(request, queryset, self) if self.paginator else ()
+        queryset = queryset.values(*self.get_row_columns(row_serializer, queryset, ordering))
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(row_serializer.to_representation(page))
+        return Response(row_serializer.to_representation(queryset))
+
+    def get_row_serializer(self):
+        return self.row_serializer_class()
+
+    def get_row_columns(self, row_serializer, queryset, ordering=()):
+        """The serializer columns plus the ordering keys the pagination cursor reads from the rows."""
+        columns = row_serializer.get_columns(queryset)
+        keys = [order.lstrip('-') for order in ordering]
+        return (*columns, *(key for key in dict.fromkeys(keys) if key not in columns))
+
+
+class BookViewSet(ReplicaReadMixin, CachedResponseMixin, ConditionalResponseMixin, FragmentCachedListMixin,
+                  SparseFieldsetMixin, RowListModelMixin, ModelViewSet):
+    queryset = Book.objects.all().select_related('owner').with_readers_preview().order_by('pk')
     serializer_class = BooksSerializer
+    row_serializer_class = BookRowSerializer
     permission_classes = (IsOwnerOrStaffOrReadOnly,)
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
-    filterset_fields = ('price',)
+    filter_backends = [DjangoFilterBackend, BookSearchFilter, BookOrderingFilter]
+    filterset_class = BookFilterSet
     search_fields = ('name', 'author_name')
     ordering_fields = ('price', 'author_name')
+    ordering = ('pk',)
+    pagination_class = BookCursorPagination
+
+    @property
+    def version_fields(self):
+        fieldset = self.get_fieldset()
+        return ('updated_at', *(name for name in USER_RELATION_FIELDS if fieldset is None or name in fieldset))
+
+    def get_version_rows(self, queryset):
+        return self.get_fragment_rows(queryset)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        fieldset = self.get_fieldset()
+        if fieldset is None:
+            return queryset.with_user_relation(self.request.user)
+        if 'owner_name' not in fieldset:
+            queryset = queryset.select_related(None)
+        if 'readers' not in fieldset:
+            queryset = queryset.with_readers_preview(None)
+        if USER_RELATION_FIELDS.keys() & set(fieldset):
+            queryset = queryset.with_user_relation(self.request.user)
+        return queryset
 
     def perform_create(self, serializer):
         serializer.validated_data['owner'] = self.request.user
         serializer.save()
 
+    @action(detail=True, methods=['get'])
+    def readers(self, request, pk=None):
+        book = get_object_or_404(Book.objects.only('pk'), pk=pk)
+        paginator = ReaderCursorPagination()
+        readers = User.objects.filter(userbookrelation__book=book).only('first_name', 'last_name')
+        page = paginator.paginate_queryset(readers, request, view=self)
+        return paginator.get_paginated_response(BookReaderSerializer(page, many=True).data)
+
+    @action(detail=False, methods=['get'])
+    def top(self, request):
+        return self.cached_response(self.top_page, request)
+
+    def top_page(self, request):
+        by = request.query_params.get('by', 'rating')
+        if by not in LEADERBOARDS:
+            raise ValidationError({'by': [f'Expected one of: {", ".join(LEADERBOARDS)}.']})
+        qualifies, ordering = LEADERBOARDS[by]
+        row_serializer = self.get_row_serializer()
+        queryset = self.get_queryset().filter(qualifies)
+        queryset = queryset.values(*self.get_row_columns(row_serializer, queryset, ordering))
+        paginator = LeaderboardCursorPagination(ordering)
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        return paginator.get_paginated_response(row_serializer.to_representation(page))
+
+    @action(detail=False, methods=['get'], permission_classes=[IsAdminUser])
+    def export(self, request):
+        export_format = request.query_params.get('output', 'ndjson')
+        if export_format not in EXPORT_FORMATS:
+            raise ValidationError({'output': [f'Expected one of: {", ".join(EXPORT_FORMATS)}.']})
+        since = request.query_params.get('since')
+        if since is not None:
+            try:
+                since = parse_since(since)
+            except ValueError:
+                raise ValidationError({'since': ['Expected an ISO 8601 timestamp.']})
+        after_pk = request.query_params.get('after_pk')
+        if after_pk is not None:
+            if not after_pk.isdigit():
+                raise ValidationError({'after_pk': ['Expected an integer.']})
+            after_pk = int(after_pk)
+
+        queryset = export_queryset(since=since, after_pk=after_pk)
+        response = StreamingHttpResponse(iter_export(export_format, queryset), content_type=CONTENT_TYPES[export_format])
+        response['Content-Disposition'] = f'attachment; filename="books.{export_format}"'
+        return response
+
+
+class UserBookListView(RowListModelMixin, GenericViewSet):
+    """
+    Books of the requesting user's relations with `relation_flag` set, e.g. `/me/likes/`. The page
+    is read through the partial (user, book) index of that flag, so its cost follows the size of
+    the user's own list rather than the catalog.
+    """
+    queryset = Book.objects.all().select_related('owner').with_readers_preview().order_by('pk')
+    serializer_class = BooksSerializer
+    row_serializer_class = BookRowSerializer
+    permission_classes = (IsAuthenticated,)
+    pagination_class = BookCursorPagination
+    relation_flag = None
+
+    def get_queryset(self):
+        user = self.request.user
+        book_ids = UserBookRelation.objects.filter(user=user, **{self.relation_flag: True}).values('book_id')
+        return super().get_queryset().filter(pk__in=book_ids).with_user_relation(user)
+
 
 class UserBookRelationView(UpdateModelMixin, GenericViewSet):
     queryset = UserBookRelation.objects.all()
     serializer_class = UserBookRelationSerializer
     permission_classes = (IsAuthenticated,)
     lookup_field = 'book'
+    bulk_max_items = 500
+
+    def update(self, request, *args, **kwargs):
+        partial = kwargs.pop('partial', False)
+        try:
+            return self.save_relation(request.data, partial)
+        except IntegrityError:
+            if not Book.objects.filter(pk=self.kwargs['book']).exists():
+                raise NotFound('Book not found.')
+            # A concurrent request inserted the relation first, the retry finds and locks it
+            return self.save_relation(request.data, partial)
+
+    def save_relation(self, data, partial):
+        with transaction.atomic():
+            instance = self.get_object()
+            serializer = self.get_serializer(instance, data=data, partial=partial)
+            if serializer.is_valid():
+                self.perform_update(serializer)
+                return Response(serializer.data)
+        raise ValidationError(serializer.errors)
 
     def get_object(self):
-        obj, created = UserBookRelation.objects.get_or_create(user=self.request.user, book_id=self.kwargs['book'])
-        # print('created', created)
-        return obj
+        """
+        The relation locked for the rest of the transaction, or a new unsaved one that the
+        serializer inserts in a single INSERT. The row lock keeps the counter deltas of concurrent
+        writes exact, the unique (user, book) constraint turns a lost insert race into an IntegrityError.
+        """
+        try:
+            user, book_id = self.request.user, int(self.kwargs['book'])
+        except ValueError:
+            raise NotFound('Book not found.')
+        try:
+            return UserBookRelation.objects.select_for_update().get(user=user, book_id=book_id)
+        except UserBookRelation.DoesNotExist:
+            return UserBookRelation(user=user, book_id=book_id)
+
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk(self, request):
+        items = request.data
+        if not isinstance(items, list):
+            raise ValidationError({'non_field_errors': ['Expected a list of items.']})
+        if len(items) > self.bulk_max_items:
+            raise ValidationError({'non_field_errors': [f'Ensure there are no more than {self.bulk_max_items} items.']})
+
+        results, valid = [], []
+        for item in items:
+            serializer = UserBookRelationBulkItemSerializer(data=item)
+            if serializer.is_valid():
+                valid.append(serializer.validated_data)
+                results.append(None)
+            else:
+                results.append({'errors': serializer.errors})
+
+        relations = iter(bulk_update_relations(request.user, valid))
+        for index, result in enumerate(results):
+            if result is not None:
+                continue
+            relation = next(relations)
+            if relation is None:
+                results[index] = {'errors': {'book': ['Book not found.']}}
+            else:
+                results[index] = UserBookRelationSerializer(relation).data
+        return Response(results, status=status.HTTP_200_OK)
 
 
 def auth(request):